@@ -6,14 +6,46 @@ from tempest_helper.analyse_trajectories import (
     count_hemispheric_trajectories,
     count_trajectories,
 )
-from tempest_helper.load_trajectories import get_trajectories
+from tempest_helper.load_trajectories import (
+    get_trajectories,
+    get_trajectories_many,
+    iter_trajectories,
+)
 from tempest_helper.plot_trajectories import plot_trajectories_cartopy
 from tempest_helper.save_trajectories import save_trajectories_netcdf
+from tempest_helper.time_axis import TimeAxis
+from tempest_helper.track_filter import TrackFilter
+from tempest_helper.track_files import (
+    copy_track_file,
+    detect_compression,
+    open_track_file,
+)
+from tempest_helper.track_index import (
+    TrackFileReader,
+    TrackIndex,
+    build_track_index,
+    load_track_index,
+)
+from tempest_helper.track_pipeline import DeduplicationPipeline
+from tempest_helper.track_tail import TrackFileTail
+from tempest_helper.track_writer import TrackFileWriter
 from tempest_helper.trajectory_manipulations import (
     convert_date_to_step,
+    convert_dates_to_steps,
     fill_trajectory_gaps,
+    fill_trajectory_set_gaps,
+    remove_duplicate_storms,
+    remove_duplicate_storms_many,
     remove_duplicates_from_track_files,
     storm_overlap_in_space,
     storms_overlap_in_time,
     write_track_line,
 )
+from tempest_helper.trajectory_cache import TrajectoryCache
+from tempest_helper.trajectory_matching import (
+    PointIndex,
+    TimeIntervalIndex,
+    great_circle_distance,
+    match_storms,
+)
+from tempest_helper.trajectory_set import TrajectorySet
@@ -1,5 +1,8 @@
 # (C) British Crown Copyright 2022, Met Office.
 # Please see LICENSE for license details.
+import numpy as np
+
+from .trajectory_set import TrajectorySet
 
 
 def count_hemispheric_trajectories(storms):
@@ -8,11 +11,18 @@ def count_hemispheric_trajectories(storms):
     in the southern hemisphere (latitude < 0.0) and those in the northern
     hemisphere (latitude >= 0.0).
 
-    :param list storms: The storm trajectories loaded from TempestExtremes.
+    :param storms: The storm trajectories loaded from TempestExtremes.
+    :type storms: list or :py:obj:`tempest_helper.TrajectorySet`
     :returns: Integer numbers of the trajectories in the southern and then
         northern hemispheres.
     :rtype: tuple
     """
+    if isinstance(storms, TrajectorySet):
+        if len(storms) == 0:
+            return 0, 0
+        southern_found = int(np.count_nonzero(storms.first_values("lat") < 0.0))
+        return southern_found, len(storms) - southern_found
+
     northern_found = 0
     southern_found = 0
     for storm in storms:
@@ -29,7 +39,8 @@ def count_trajectories(storms):
     """
     From a loaded trajectory count the number of storms.
 
-    :param list storms: The storm trajectories loaded from TempestExtremes.
+    :param storms: The storm trajectories loaded from TempestExtremes.
+    :type storms: list or :py:obj:`tempest_helper.TrajectorySet`
     :returns: The number of trajectories.
     :rtype: int
     """
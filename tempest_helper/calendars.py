@@ -0,0 +1,342 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+"""
+Vectorised date arithmetic for the CF calendars in `DATETIME_TYPES`.
+
+Dates are converted to and from whole numbers of days, hours or microseconds
+since an epoch using integer arithmetic on NumPy arrays, rather than by
+creating a `cftime` datetime for every point. The results are identical to
+those calculated by `cftime`.
+"""
+
+import logging
+
+import cftime
+import numpy as np
+
+from .time_axis import normalise_calendar
+
+logger = logging.getLogger(__name__)
+
+HOURS_IN_DAY = 24
+MICROSECONDS_IN_HOUR = 3600 * 10**6
+
+# The cumulative number of days before the start of each month in the
+# calendars where every year has the same length
+MONTH_STARTS = {
+    "noleap": np.array(
+        [0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334, 365], dtype=np.int64
+    ),
+    "all_leap": np.array(
+        [0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335, 366], dtype=np.int64
+    ),
+    "360_day": np.arange(0, 361, 30, dtype=np.int64),
+}
+
+# The calendars that follow the real world, of which all but the proleptic
+# Gregorian have no year zero and so the year before 1 is -1
+REAL_WORLD = {"julian", "gregorian", "standard", "proleptic_gregorian"}
+
+# The Julian day number of the first day of the Gregorian calendar, 15 October
+# 1582, in the mixed Julian/Gregorian standard calendar
+GREGORIAN_START = 2299161
+
+# The length of each unit that `cftime` allows in time units strings, in
+# microseconds
+UNIT_MICROSECONDS = {
+    "microseconds": 1,
+    "microsecond": 1,
+    "microsec": 1,
+    "microsecs": 1,
+    "milliseconds": 10**3,
+    "millisecond": 10**3,
+    "millisec": 10**3,
+    "millisecs": 10**3,
+    "msec": 10**3,
+    "msecs": 10**3,
+    "ms": 10**3,
+    "seconds": 10**6,
+    "second": 10**6,
+    "sec": 10**6,
+    "secs": 10**6,
+    "s": 10**6,
+    "minutes": 60 * 10**6,
+    "minute": 60 * 10**6,
+    "mins": 60 * 10**6,
+    "min": 60 * 10**6,
+    "hours": MICROSECONDS_IN_HOUR,
+    "hour": MICROSECONDS_IN_HOUR,
+    "hrs": MICROSECONDS_IN_HOUR,
+    "hr": MICROSECONDS_IN_HOUR,
+    "h": MICROSECONDS_IN_HOUR,
+    "days": HOURS_IN_DAY * MICROSECONDS_IN_HOUR,
+    "day": HOURS_IN_DAY * MICROSECONDS_IN_HOUR,
+    "d": HOURS_IN_DAY * MICROSECONDS_IN_HOUR,
+}
+
+# Units that are only allowed in one calendar
+CALENDAR_UNIT_DAYS = {
+    ("360_day", "months"): 30,
+    ("360_day", "month"): 30,
+    ("noleap", "common_years"): 365,
+    ("noleap", "common_year"): 365,
+}
+
+# The largest integer that can be converted exactly to a float
+MAX_EXACT_FLOAT = 2**53
+
+
+def date_to_days(calendar, year, month, day):
+    """
+    Calculate the number of days between an epoch and many dates at once. The
+    epoch depends on the calendar but is the same for all dates in a
+    calendar.
+
+    :param str calendar: The calendar of the dates.
+    :param numpy.ndarray year: The year of each date.
+    :param numpy.ndarray month: The month of each date.
+    :param numpy.ndarray day: The day of month of each date.
+    :returns: The number of days since the epoch of each date.
+    :rtype: numpy.ndarray
+    :raises ValueError: If the calendar is not supported or any of the dates
+        do not exist in the calendar.
+    """
+    calendar = _check_calendar(calendar)
+    year = np.asarray(year, dtype=np.int64)
+    month = np.asarray(month, dtype=np.int64)
+    day = np.asarray(day, dtype=np.int64)
+    if np.any((month < 1) | (month > 12)):
+        raise ValueError(f"Invalid month in the {calendar} calendar")
+    days = _date_to_days(calendar, year, month, day)
+    # a day that is past the end of its month gives a different date when
+    # converted back
+    check_year, check_month, check_day = _days_to_date(calendar, days)
+    invalid = (check_year != year) | (check_month != month) | (check_day != day)
+    if np.any(invalid):
+        index = np.flatnonzero(invalid)[0]
+        raise ValueError(
+            f"Invalid date {year.flat[index]:04d}-{month.flat[index]:02d}-"
+            f"{day.flat[index]:02d} in the {calendar} calendar"
+        )
+    return days
+
+
+def days_to_date(calendar, days):
+    """
+    Calculate the dates that are many numbers of days after the epoch used by
+    `date_to_days()`.
+
+    :param str calendar: The calendar of the dates.
+    :param numpy.ndarray days: The number of days since the epoch.
+    :returns: The year, month and day of each date.
+    :rtype: tuple
+    """
+    calendar = _check_calendar(calendar)
+    return _days_to_date(calendar, np.asarray(days, dtype=np.int64))
+
+
+def date_to_hours(calendar, year, month, day, hour):
+    """
+    Calculate the number of hours between the epoch used by `date_to_days()`
+    and many dates at once.
+
+    :param str calendar: The calendar of the dates.
+    :param numpy.ndarray year: The year of each date.
+    :param numpy.ndarray month: The month of each date.
+    :param numpy.ndarray day: The day of month of each date.
+    :param numpy.ndarray hour: The hour of each date.
+    :returns: The number of hours since the epoch of each date.
+    :rtype: numpy.ndarray
+    :raises ValueError: If any of the dates do not exist in the calendar.
+    """
+    hour = np.asarray(hour, dtype=np.int64)
+    if np.any((hour < 0) | (hour >= HOURS_IN_DAY)):
+        raise ValueError(f"Invalid hour in the {calendar} calendar")
+    return date_to_days(calendar, year, month, day) * HOURS_IN_DAY + hour
+
+
+def hours_to_date(calendar, hours):
+    """
+    Calculate the dates that are many numbers of hours after the epoch used by
+    `date_to_days()`.
+
+    :param str calendar: The calendar of the dates.
+    :param numpy.ndarray hours: The number of hours since the epoch.
+    :returns: The year, month, day and hour of each date.
+    :rtype: tuple
+    """
+    days, hour = np.divmod(np.asarray(hours, dtype=np.int64), HOURS_IN_DAY)
+    return days_to_date(calendar, days) + (hour,)
+
+
+def datetime_to_microseconds(date, calendar=None):
+    """
+    Calculate the number of microseconds between the epoch used by
+    `date_to_days()` and a single `cftime` or Python datetime.
+
+    :param date: The date.
+    :type date: :py:obj:`cftime.datetime`
+    :param str calendar: The calendar of the date, which defaults to the
+        calendar of `date`.
+    :returns: The number of microseconds since the epoch.
+    :rtype: int
+    """
+    if calendar is None:
+        calendar = getattr(date, "calendar", None) or "proleptic_gregorian"
+    days = int(date_to_days(calendar, date.year, date.month, date.day))
+    return (
+        (days * HOURS_IN_DAY + date.hour) * MICROSECONDS_IN_HOUR
+        + (date.minute * 60 + date.second) * 10**6
+        + date.microsecond
+    )
+
+
+def microseconds_since(calendar, origin, year, month, day, hour):
+    """
+    Calculate the time in microseconds between an origin and many dates at
+    once.
+
+    :param str calendar: The calendar of the dates.
+    :param origin: The origin.
+    :type origin: :py:obj:`cftime.datetime`
+    :param numpy.ndarray year: The year of each date.
+    :param numpy.ndarray month: The month of each date.
+    :param numpy.ndarray day: The day of month of each date.
+    :param numpy.ndarray hour: The hour of each date.
+    :returns: The number of microseconds between the origin and each date.
+    :rtype: numpy.ndarray
+    """
+    hours = date_to_hours(calendar, year, month, day, hour)
+    return hours * MICROSECONDS_IN_HOUR - datetime_to_microseconds(origin, calendar)
+
+
+def dates_to_num(year, month, day, hour, units, calendar):
+    """
+    Convert many dates at once to time values in a CF units string, giving
+    the same values as `cftime.date2num()`.
+
+    :param numpy.ndarray year: The year of each date.
+    :param numpy.ndarray month: The month of each date.
+    :param numpy.ndarray day: The day of month of each date.
+    :param numpy.ndarray hour: The hour of each date.
+    :param str units: The time units, for example `days since 1950-01-01`.
+    :param str calendar: The calendar of the dates.
+    :returns: The time values.
+    :rtype: numpy.ndarray
+    :raises ValueError: If the units are not supported in the calendar.
+    """
+    calendar = _check_calendar(calendar)
+    try:
+        unit, _since, _reference = units.split(None, 2)
+    except ValueError:
+        raise ValueError(f"Incorrectly formatted time units {units}")
+    unit = unit.lower()
+    if (calendar, unit) in CALENDAR_UNIT_DAYS:
+        unit_length = (
+            CALENDAR_UNIT_DAYS[(calendar, unit)] * HOURS_IN_DAY * MICROSECONDS_IN_HOUR
+        )
+    elif unit in UNIT_MICROSECONDS:
+        unit_length = UNIT_MICROSECONDS[unit]
+    else:
+        raise ValueError(f"Unsupported time units {unit} in the {calendar} calendar")
+    # cftime parses the reference time, including any time zone
+    reference = cftime.num2date(0, units, calendar=calendar)
+    offset = microseconds_since(calendar, reference, year, month, day, hour)
+
+    quotient, remainder = np.divmod(offset, unit_length)
+    if not np.any(remainder):
+        return quotient.astype(np.float64)
+    values = offset / unit_length
+    # float division is only correctly rounded for integers that can be
+    # converted to floats exactly
+    large = np.abs(offset) >= MAX_EXACT_FLOAT
+    if np.any(large):
+        values[large] = [value / unit_length for value in offset[large].tolist()]
+    return values
+
+
+def _check_calendar(calendar):
+    """
+    Normalise the name of a calendar and check that it is supported.
+
+    :param str calendar: The calendar name.
+    :returns: The standard name of the calendar.
+    :rtype: str
+    :raises ValueError: If the calendar is not supported.
+    """
+    name = normalise_calendar(calendar)
+    if name not in MONTH_STARTS and name not in REAL_WORLD:
+        raise ValueError(f"Unsupported calendar {calendar}")
+    return name
+
+
+def _date_to_days(calendar, year, month, day):
+    """
+    Calculate the number of days since the epoch without checking that the
+    dates exist. For the real world calendars the result is the Julian day
+    number.
+
+    :param str calendar: The standard name of the calendar.
+    :param numpy.ndarray year: The year of each date.
+    :param numpy.ndarray month: The month of each date.
+    :param numpy.ndarray day: The day of month of each date.
+    :returns: The number of days since the epoch.
+    :rtype: numpy.ndarray
+    """
+    if calendar in MONTH_STARTS:
+        month_starts = MONTH_STARTS[calendar]
+        return year * month_starts[-1] + month_starts[month - 1] + day - 1
+
+    if calendar != "proleptic_gregorian":
+        year = np.where(year < 0, year + 1, year)
+    # count years from March so that any leap day is at the end of the year
+    march_year = year + 4800 - (month <= 2)
+    march_month = (month + 9) % 12
+    days = day + (153 * march_month + 2) // 5 + 365 * march_year + march_year // 4
+    julian = days - 32083
+    if calendar == "julian":
+        return julian
+    gregorian = days - march_year // 100 + march_year // 400 - 32045
+    if calendar == "proleptic_gregorian":
+        return gregorian
+    return np.where(gregorian >= GREGORIAN_START, gregorian, julian)
+
+
+def _days_to_date(calendar, days):
+    """
+    Calculate the dates from the number of days since the epoch.
+
+    :param str calendar: The standard name of the calendar.
+    :param numpy.ndarray days: The number of days since the epoch.
+    :returns: The year, month and day of each date.
+    :rtype: tuple
+    """
+    if calendar in MONTH_STARTS:
+        month_starts = MONTH_STARTS[calendar]
+        year, day_of_year = np.divmod(days, month_starts[-1])
+        month = np.searchsorted(month_starts, day_of_year, side="right")
+        day = day_of_year - month_starts[month - 1] + 1
+        return year, month.astype(np.int64), day
+
+    julian_days = days + 32082
+    gregorian_days = days + 32044
+    centuries = (4 * gregorian_days + 3) // 146097
+    gregorian_days = gregorian_days - 146097 * centuries // 4
+    if calendar == "julian":
+        use_gregorian = np.zeros(days.shape, dtype=bool)
+    elif calendar == "proleptic_gregorian":
+        use_gregorian = np.ones(days.shape, dtype=bool)
+    else:
+        use_gregorian = days >= GREGORIAN_START
+    day_count = np.where(use_gregorian, gregorian_days, julian_days)
+    centuries = np.where(use_gregorian, centuries, 0)
+
+    quad_years = (4 * day_count + 3) // 1461
+    day_of_year = day_count - 1461 * quad_years // 4
+    march_month = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * march_month + 2) // 5 + 1
+    month = march_month + 3 - 12 * (march_month // 10)
+    year = 100 * centuries + quad_years - 4800 + march_month // 10
+    if calendar != "proleptic_gregorian":
+        year = np.where(year <= 0, year - 1, year)
+    return year, month, day
@@ -1,117 +1,511 @@
 # (C) British Crown Copyright 2022, Met Office.
 # Please see LICENSE for license details.
 import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 
-import iris
+import numpy as np
 
 from .trajectory_manipulations import (
-    convert_date_to_step,
-    fill_trajectory_gaps,
+    convert_dates_to_steps,
+    fill_trajectory_set_gaps,
+)
+from .time_axis import as_time_axis
+from .track_files import (
+    CHUNK_SIZE,
+    _find_headers,
+    _iter_track_blocks,
+    open_track_file,
+)
+from .trajectory_cache import as_trajectory_cache
+from .trajectory_set import (
+    COORDINATE_DTYPES,
+    VARIABLE_DTYPE,
+    TrajectorySet,
+    _offsets,
 )
 
 logger = logging.getLogger(__name__)
 
+# The columns that every TempestExtremes track file contains
+COORDINATE_NAMES = ["grid_x", "grid_y", "lon", "lat", "year", "month", "day", "hour"]
+
+# Translation table to turn the quoted profile values, e.g. "[1.0,2.0]", into
+# whitespace separated values that can be parsed with the other values
+_PROFILE_TABLE = bytes.maketrans(b'",[]', b"    ")
+
+_BLANK_LINE = re.compile(rb"\n[ \t\r]*\n")
+
 
-def get_trajectories(tracked_file, nc_file, time_period, column_names):
+def get_trajectories(
+    tracked_file,
+    nc_file,
+    time_period,
+    column_names,
+    as_trajectory_set=False,
+    cache=None,
+    variables=None,
+    track_filter=None,
+):
     """
-    Load the trajectories from the file output by TempestExtremes.
+    Load the trajectories from the file output by TempestExtremes. Memory and
+    time can be saved by loading only some of the variables and by selecting
+    the tracks to load with a :py:obj:`tempest_helper.TrackFilter`, which is
+    applied before the trajectories' gaps are filled.
 
-    :param str tracked_file: The path to the file produced by TempestExtremes.
-    :param nc_file: The path to a netCDF file that the tracking was run on.
+    :param str tracked_file: The path to the file produced by TempestExtremes,
+        which may be compressed with gzip, bzip2 or xz.
+    :param nc_file: The path to a netCDF file that the tracking was run on, or
+        a time axis describing it. Only the header of the file is read.
+    :type nc_file: str or :py:obj:`tempest_helper.TimeAxis`
     :param int time_period: The time period in hours between time points in the
         data.
     :param dict column_names: the names of the column variables within the
         tracked_file, to be used as storm[] keys
+    :param bool as_trajectory_set: If True then return the trajectories as a
+        columnar :py:obj:`tempest_helper.TrajectorySet` rather than a list of
+        dictionaries. Profile variables are then parsed straight into
+        two-dimensional masked arrays rather than lists.
+    :param cache: If specified then the trajectories are loaded from this
+        cache, or the cache in this directory, if they have been loaded before
+        and are otherwise added to it.
+    :type cache: str or :py:obj:`tempest_helper.TrajectoryCache`
+    :param list variables: The names of the variables in `column_names` to
+        load, in addition to the coordinates. Defaults to all of them.
+    :param track_filter: The criteria for the tracks to load. Defaults to
+        loading all of the tracks.
+    :type track_filter: :py:obj:`tempest_helper.TrackFilter`
     :returns: The loaded trajectories.
-    :rtype: list
+    :rtype: list or :py:obj:`tempest_helper.TrajectorySet`
     """
     logger.debug(f"Running get_trajectories on {tracked_file}")
 
-    # The text at the start of a header element in the TempestExtremes output
-    header_delim = "start"
-
-    coords_position = {
-        "grid_x": 0,
-        "grid_y": 1,
-        "lon": 2,
-        "lat": 3,
-        "year": -4,
-        "month": -3,
-        "day": -2,
-        "hour": -1,
+    time_axis = as_time_axis(nc_file)
+
+    if cache is not None:
+        cache = as_trajectory_cache(cache)
+        key = cache.key(
+            tracked_file,
+            time_axis,
+            time_period,
+            column_names,
+            variables,
+            track_filter,
+        )
+        trajectory_set = cache.load(key)
+        if trajectory_set is None:
+            trajectory_set = get_trajectories(
+                tracked_file,
+                time_axis,
+                time_period,
+                column_names,
+                as_trajectory_set=True,
+                variables=variables,
+                track_filter=track_filter,
+            )
+            cache.save(key, trajectory_set)
+        if as_trajectory_set:
+            return trajectory_set
+        return trajectory_set.to_storms()
+
+    with open_track_file(tracked_file, "rb") as file_handle:
+        text = file_handle.read()
+
+    return _load_tracks(
+        text,
+        column_names,
+        time_axis,
+        time_period,
+        as_trajectory_set,
+        variables,
+        track_filter,
+    )
+
+
+def get_trajectories_many(
+    tracked_files,
+    nc_files,
+    time_period,
+    column_names,
+    processes=None,
+    combine=False,
+    as_trajectory_set=False,
+    cache=None,
+    variables=None,
+    track_filter=None,
+):
+    """
+    Load the trajectories from many files output by TempestExtremes, for
+    example from different periods or ensemble members, in parallel. The
+    files are parsed by a pool of processes and the time axis of each data
+    file is read once and shared with the processes.
+
+    :param list tracked_files: The paths to the files produced by
+        TempestExtremes.
+    :param nc_files: The path to a netCDF file that the tracking was run on, or
+        a time axis describing it, either one for all of the tracked files or a
+        list with one for each tracked file.
+    :type nc_files: str, :py:obj:`tempest_helper.TimeAxis` or list
+    :param int time_period: The time period in hours between time points in the
+        data.
+    :param dict column_names: the names of the column variables within the
+        tracked_file, to be used as storm[] keys
+    :param int processes: The number of processes to use. Defaults to the
+        number of CPUs and if 1 then the files are loaded in this process.
+    :param bool combine: If True then return all of the trajectories in a
+        single :py:obj:`tempest_helper.TrajectorySet` in the order of
+        `tracked_files`.
+    :param bool as_trajectory_set: If True then return the trajectories from
+        each file as a :py:obj:`tempest_helper.TrajectorySet` rather than a list
+        of dictionaries.
+    :param cache: If specified then load the trajectories from, and add them
+        to, this cache or the cache in this directory.
+    :type cache: str or :py:obj:`tempest_helper.TrajectoryCache`
+    :param list variables: The names of the variables in `column_names` to
+        load, in addition to the coordinates. Defaults to all of them.
+    :param track_filter: The criteria for the tracks to load.
+    :type track_filter: :py:obj:`tempest_helper.TrackFilter`
+    :returns: The loaded trajectories from each file in the order of
+        `tracked_files`, or all of the trajectories if `combine` is True.
+    :rtype: list or :py:obj:`tempest_helper.TrajectorySet`
+    """
+    tracked_files = list(tracked_files)
+    if isinstance(nc_files, (list, tuple)):
+        if len(nc_files) != len(tracked_files):
+            raise ValueError(
+                f"{len(nc_files)} netCDF files were given for {len(tracked_files)} "
+                f"tracked files"
+            )
+        time_axes = [as_time_axis(nc_file) for nc_file in nc_files]
+    else:
+        time_axes = [as_time_axis(nc_files)] * len(tracked_files)
+
+    arguments = [
+        (
+            tracked_file,
+            time_axis,
+            time_period,
+            column_names,
+            combine or as_trajectory_set,
+            cache,
+            variables,
+            track_filter,
+        )
+        for tracked_file, time_axis in zip(tracked_files, time_axes)
+    ]
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(arguments))
+    logger.debug(f"Loading {len(arguments)} files with {processes} processes")
+    if processes <= 1:
+        results = [_get_trajectories_worker(argument) for argument in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_get_trajectories_worker, arguments))
+
+    if combine:
+        return TrajectorySet.concatenate(results)
+    return results
+
+
+def _get_trajectories_worker(arguments):
+    """
+    Call `get_trajectories()` with a tuple of arguments, for use with a
+    process pool.
+
+    :param tuple arguments: The positional arguments to `get_trajectories()`.
+    :returns: The loaded trajectories.
+    :rtype: list or :py:obj:`tempest_helper.TrajectorySet`
+    """
+    return get_trajectories(*arguments)
+
+
+def iter_trajectories(
+    tracked_file,
+    nc_file,
+    time_period,
+    column_names,
+    chunk_size=CHUNK_SIZE,
+    variables=None,
+    track_filter=None,
+):
+    """
+    Load the trajectories from the file output by TempestExtremes one at a
+    time. The file is read and parsed in chunks and so, unlike
+    `get_trajectories()`, the whole file is never held in memory. Any gaps in
+    the trajectories are filled before they are returned.
+
+    :param str tracked_file: The path to the file produced by TempestExtremes,
+        which may be compressed with gzip, bzip2 or xz.
+    :param nc_file: The path to a netCDF file that the tracking was run on, or
+        a time axis describing it. Only the header of the file is read.
+    :type nc_file: str or :py:obj:`tempest_helper.TimeAxis`
+    :param int time_period: The time period in hours between time points in the
+        data.
+    :param dict column_names: the names of the column variables within the
+        tracked_file, to be used as storm[] keys
+    :param int chunk_size: The number of bytes to read from the file at a time.
+    :param list variables: The names of the variables in `column_names` to
+        load, in addition to the coordinates. Defaults to all of them.
+    :param track_filter: The criteria for the tracks to load.
+    :type track_filter: :py:obj:`tempest_helper.TrackFilter`
+    :returns: A generator of the trajectories.
+    :rtype: generator
+    """
+    logger.debug(f"Running iter_trajectories on {tracked_file}")
+
+    time_axis = as_time_axis(nc_file)
+
+    with open_track_file(tracked_file, "rb") as file_handle:
+        for text in _iter_track_blocks(file_handle, chunk_size):
+            for storm in _load_tracks(
+                text,
+                column_names,
+                time_axis,
+                time_period,
+                variables=variables,
+                track_filter=track_filter,
+            ):
+                yield storm
+
+
+def _load_tracks(
+    text,
+    column_names,
+    time_axis,
+    time_period,
+    as_trajectory_set=False,
+    variables=None,
+    track_filter=None,
+):
+    """
+    Parse some complete tracks from a track file and convert them into storm
+    dictionaries or a `TrajectorySet`.
+
+    :param bytes text: The tracks from the track file.
+    :param dict column_names: the names of the column variables within the
+        tracked_file, to be used as storm[] keys
+    :param time_axis: The time axis of the data.
+    :type time_axis: :py:obj:`tempest_helper.TimeAxis`
+    :param int time_period: The time period in hours between time points in the
+        data.
+    :param bool as_trajectory_set: If True then return a
+        :py:obj:`tempest_helper.TrajectorySet`.
+    :param list variables: The names of the variables to load.
+    :param track_filter: The criteria for the tracks to load.
+    :type track_filter: :py:obj:`tempest_helper.TrackFilter`
+    :returns: The loaded trajectories.
+    :rtype: list or :py:obj:`tempest_helper.TrajectorySet`
+    """
+    track_length, num_rows, columns = _parse_tracks(
+        text, column_names, variables, track_filter
+    )
+    steps = convert_dates_to_steps(
+        time_axis,
+        columns["year"],
+        columns["month"],
+        columns["day"],
+        columns["hour"],
+        time_period,
+    )
+    columns["step"] = steps.astype(COORDINATE_DTYPES["step"])
+    trajectory_set = fill_trajectory_set_gaps(
+        TrajectorySet(columns, _offsets(num_rows), num_rows, track_length),
+        time_axis,
+        time_period,
+    )
+    if as_trajectory_set:
+        return trajectory_set
+    return trajectory_set.to_storms()
+
+
+def _count_rows(block):
+    """
+    Count the number of non-blank lines in a block of text.
+
+    :param bytes block: The text.
+    :returns: The number of lines that contain data.
+    :rtype: int
+    """
+    return sum(1 for line in block.split(b"\n") if line.strip())
+
+
+def _parse_tracks(text, column_names, variables=None, track_filter=None):
+    """
+    Parse the contents of a TempestExtremes track file in bulk. The header
+    lines are located first and then all of the data rows between them are
+    converted to typed NumPy columns in a single pass. The rows of tracks that
+    can be rejected by `track_filter` from their header and last row are
+    removed before any values are converted.
+
+    :param bytes text: The contents of the track file.
+    :param dict column_names: The names of the columns and their position in
+        each row.
+    :param list variables: The names of the variables to load, in addition to
+        the coordinates. Defaults to all of the variables in `column_names`.
+    :param track_filter: The criteria for the tracks to load.
+    :type track_filter: :py:obj:`tempest_helper.TrackFilter`
+    :returns: The length of each track given in its header, the number of data
+        rows following each header and a dictionary of the column arrays.
+    :rtype: tuple
+    """
+    selected_names = _select_columns(column_names, variables)
+    parsed_names = dict(selected_names)
+    if track_filter is not None:
+        unknown = set(track_filter.thresholds) - set(column_names)
+        if unknown:
+            raise ValueError(
+                f"Thresholds are given for {', '.join(sorted(unknown))}, which "
+                f"are not in column_names"
+            )
+        for name in track_filter.thresholds:
+            parsed_names[name] = column_names[name]
+
+    header_starts, header_ends = _find_headers(text)
+    headers = [
+        text[start:end].split() for start, end in zip(header_starts, header_ends)
+    ]
+    track_length = np.array([int(header[1]) for header in headers], dtype=np.int64)
+    blocks = [
+        text[start:end].strip()
+        for start, end in zip(header_ends, header_starts[1:] + [len(text)])
+    ]
+    if track_filter is not None:
+        keep = _select_headers(
+            track_filter, track_length, headers, blocks, column_names
+        )
+        blocks = [block for block, kept in zip(blocks, keep) if kept]
+        track_length = track_length[keep]
+
+    data = b"\n".join(blocks)
+    # Counting the newlines is much quicker than splitting the blocks into
+    # lines but is only correct if there are no blank lines
+    if _BLANK_LINE.search(data):
+        num_rows = np.array([_count_rows(block) for block in blocks], dtype=np.int64)
+    else:
+        num_rows = np.array(
+            [block.count(b"\n") + 1 if block else 0 for block in blocks],
+            dtype=np.int64,
+        )
+    columns = _parse_rows(data, int(num_rows.sum()), parsed_names)
+
+    if track_filter is not None and track_filter.uses_rows:
+        keep = track_filter.select_tracks(columns, num_rows)
+        rows = np.repeat(keep, num_rows)
+        columns = {name: values[rows] for name, values in columns.items()}
+        track_length = track_length[keep]
+        num_rows = num_rows[keep]
+    columns = {name: columns[name] for name in selected_names}
+    return track_length, num_rows, columns
+
+
+def _select_columns(column_names, variables):
+    """
+    Select the coordinate columns and some of the variable columns.
+
+    :param dict column_names: The names of the columns and their position in
+        each row.
+    :param list variables: The names of the variables to select, or None to
+        select all of them.
+    :returns: The names and positions of the selected columns.
+    :rtype: dict
+    """
+    if variables is None:
+        return dict(column_names)
+    unknown = set(variables) - set(column_names)
+    if unknown:
+        raise ValueError(
+            f"Variables {', '.join(sorted(unknown))} are not in column_names"
+        )
+    return {
+        name: position
+        for name, position in column_names.items()
+        if name in COORDINATE_NAMES or name in variables
     }
-    # derive a dictionary with only the variables (needed later)
-    coords_all = column_names
-    coords_variable = list(column_names.keys()).copy()
-    for pos in coords_position:
-        coords_variable.remove(pos)
-
-    # Initialize storms and line counter
-    storms = []
-    new_var = {}
-    line_of_traj = None
-
-    cube = iris.load_cube(nc_file)
-
-    with open(tracked_file) as file_handle:
-        for line in file_handle:
-            line_array = line.split()
-            if header_delim in line:  # check if header string is satisfied
-                line_of_traj = 0  # reset trajectory line to zero
-                track_length = int(line_array[1])
-                storm = {}
-                storms.append(storm)
-                storm["length"] = track_length
-                for coord in coords_all:
-                    storm[coord] = []
-                storm["step"] = []
+
+
+def _select_headers(track_filter, track_length, headers, blocks, column_names):
+    """
+    Apply the parts of a track filter that only need the header line and last
+    row of each track.
+
+    :param track_filter: The criteria for the tracks to load.
+    :type track_filter: :py:obj:`tempest_helper.TrackFilter`
+    :param numpy.ndarray track_length: The length of each track.
+    :param list headers: The split header line of each track.
+    :param list blocks: The data rows of each track.
+    :param dict column_names: The names of the columns and their position in
+        each row.
+    :returns: A boolean mask that is True for the tracks to keep.
+    :rtype: numpy.ndarray
+    """
+    first_date = [[int(value) for value in header[2:6]] for header in headers]
+    last_date = first_date
+    if track_filter.time_window is not None:
+        positions = [column_names[name] for name in ("year", "month", "day", "hour")]
+        last_date = []
+        for first, block in zip(first_date, blocks):
+            last_start = block.rfind(b"\n") + 1
+            last_row = block[last_start:].split()
+            if last_row:
+                last_date.append([int(last_row[position]) for position in positions])
             else:
-                if line_of_traj <= track_length:
-                    grid_x = int(line_array[coords_all["grid_x"]])
-                    grid_y = int(line_array[coords_all["grid_y"]])
-                    lon = float(line_array[coords_all["lon"]])
-                    lat = float(line_array[coords_all["lat"]])
-                    year = int(line_array[coords_all["year"]])
-                    month = int(line_array[coords_all["month"]])
-                    day = int(line_array[coords_all["day"]])
-                    hour = int(line_array[coords_all["hour"]])
-                    step = convert_date_to_step(
-                        cube,
-                        year,
-                        month,
-                        day,
-                        hour,
-                        time_period,
-                    )
-                    for var in coords_variable:
-                        if line_array[coords_all[var]][0] == '"':
-                            results = (
-                                line_array[coords_all[var]].strip('"[]"').split(",")
-                            )
-                            results = [float(i) for i in results]
-                            new_var[var] = results
-                        else:
-                            new_var[var] = float(line_array[coords_all[var]])
-                    # now check if there is a gap in the traj, if so fill it in
-                    if line_of_traj > 0:
-                        if (step - storm["step"][-1]) > 1:
-                            # add extra points before the next one
-                            fill_trajectory_gaps(
-                                storm,
-                                step,
-                                lon,
-                                lat,
-                                grid_x,
-                                grid_y,
-                                cube,
-                                time_period,
-                                new_var,
-                            )
-                    for coord in coords_position:
-                        storm[coord].append(eval(coord))
-                    for coord in coords_variable:
-                        storm[coord].append(new_var[coord])
-                    storm["step"].append(step)
-                line_of_traj += 1  # increment line
-
-    return storms
+                last_date.append(first)
+    return track_filter.select_headers(
+        track_length,
+        np.array(first_date, dtype=np.int64).reshape(-1, 4),
+        np.array(last_date, dtype=np.int64).reshape(-1, 4),
+    )
+
+
+def _parse_rows(data, n_rows, column_names):
+    """
+    Convert the data rows from a track file into a NumPy array for each column.
+    The column layout is determined from the first row and profile columns,
+    such as `"[1.0,2.0,3.0]"`, are returned as two-dimensional arrays of shape
+    (n_rows, number of profile bins).
+
+    :param bytes data: The data rows with all header lines removed.
+    :param int n_rows: The number of data rows.
+    :param dict column_names: The names of the columns and their position in
+        each row.
+    :returns: The column names and arrays of the values in each column.
+    :rtype: dict
+    """
+    first_row = data.lstrip().split(b"\n", 1)[0].split()
+    if n_rows == 0 or not first_row:
+        return {
+            name: np.empty(0, dtype=COORDINATE_DTYPES.get(name, VARIABLE_DTYPE))
+            for name in column_names
+        }
+    is_profile = [token[:1] == b'"' for token in first_row]
+    widths = [
+        token.count(b",") + 1 if profile else 1
+        for token, profile in zip(first_row, is_profile)
+    ]
+    offsets = np.cumsum([0] + widths[:-1])
+    row_width = sum(widths)
+    if any(is_profile):
+        data = data.translate(_PROFILE_TABLE)
+    try:
+        values = np.fromstring(data, sep=" ")
+    except ValueError:
+        values = np.zeros(0)
+    if values.size != n_rows * row_width:
+        raise ValueError(
+            f"Unable to parse the track file, {n_rows} rows of {row_width} values "
+            f"were expected but {values.size} values were read"
+        )
+    table = values.reshape(n_rows, row_width)
+
+    columns = {}
+    for name, position in column_names.items():
+        dtype = COORDINATE_DTYPES.get(name, VARIABLE_DTYPE)
+        start = offsets[position]
+        end = start + widths[position]
+        if is_profile[position]:
+            columns[name] = table[:, start:end].astype(dtype)
+        else:
+            columns[name] = table[:, start].astype(dtype)
+    return columns
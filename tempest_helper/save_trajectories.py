@@ -4,11 +4,22 @@ import os
 import numpy as np
 import logging
 
-from cftime import date2num, datetime
 from netCDF4 import Dataset
 
+from .calendars import dates_to_num
+from .time_axis import normalise_calendar
+from .trajectory_set import TrajectorySet, _offsets, _ranges
+
 logger = logging.getLogger(__name__)
 
+# The default number of points in each chunk of the record variables. Tracks
+# are read whole using FIRST_PT and NUM_PTS and so most tracks are contained
+# in a single chunk, which is large enough to compress well.
+RECORD_CHUNKSIZE = 2**14
+
+# The default number of tracks in each chunk of the track variables
+TRACKS_CHUNKSIZE = 2**12
+
 
 def define_netcdf_metadata(var_cmpt, variable_units):
     """
@@ -137,6 +148,12 @@ def save_trajectories_netcdf(
     column_names,
     startperiod="",
     endperiod="",
+    complevel=4,
+    shuffle=True,
+    record_chunksize=RECORD_CHUNKSIZE,
+    least_significant_digit=None,
+    significant_digits=None,
+    append=False,
 ):
 
     """
@@ -144,9 +161,14 @@ def save_trajectories_netcdf(
     May need metadata from a model nc file, so may need to create at a time when
     these are available
 
+    Each profile variable is written as a two-dimensional array with a
+    dimension for its bins named after the variable, for example
+    `rprof(record, rprof_bins)`.
+
     :param str directory: directory path
     :param str savefname: filename to save netcdf file to
-    :param list storms: The loaded trajectories.
+    :param storms: The loaded trajectories.
+    :type storms: list or :py:obj:`tempest_helper.TrajectorySet`
     :param str calendar: netcdf calendar type
     :param str time_units: units string for the time coordinate
     :param str variable_units: units for the different variables
@@ -158,59 +180,291 @@ def save_trajectories_netcdf(
     :param dict column_names: output variable names derived from the Tempest command
     :param str startperiod: An optional time string for the start of this data
     :param str endperiod: AN optional time string for the end of this data period
+    :param int complevel: The zlib compression level from 1 to 9, or 0 to
+        write the variables without compression.
+    :param bool shuffle: If True then apply the HDF5 shuffle filter before
+        compressing the variables.
+    :param int record_chunksize: The number of points in each chunk of the
+        record variables, or None to use the netCDF library's default chunks.
+    :param dict least_significant_digit: The number of decimal places to keep
+        in each variable, by variable name. The values are quantised before
+        they are compressed, which makes the file much smaller.
+    :param dict significant_digits: The number of significant digits to keep
+        in each variable, by variable name. This needs version 1.6 or later of
+        netCDF4.
+    :param bool append: If True then add the tracks to the end of the file if
+        it exists, numbering them after the tracks that are already in it, and
+        otherwise create the file with unlimited dimensions so that tracks can
+        be added to it later. The time values are written in the units of the
+        existing file and the metadata arguments are ignored, apart from
+        `endperiod`, which replaces the end date if it is given. The shape of
+        the profile variables is only known once there are some tracks, and
+        so the variables from the track file are not created until the first
+        tracks are written.
     """
-    logger.debug("making netCDF of outputs")
-    logger.debug(f"open nc file {os.path.join(directory, savefname)}")
-    nc = Dataset(os.path.join(directory, savefname), "w", format="NETCDF4")
-    nc.title = "Tempest TC tracks"
-    nc.directory = directory
-    nc.tracked_data_frequency = frequency
-    logger.debug(f"nc.title {nc.title}")
-
-    nc.mo_runid = um_suiteid
-    nc.grid = resolution_code
-    nc.start_date = startperiod
-    nc.end_date = endperiod
-    nc.institution_id = "MOHC"
-    nc.algorithm = "TempestExtremes_v2"
-    nc.algorithm_ref = (
-        "Ullrich and Zarzycki 2017; Zarzycki and Ullrich 2017; " + "Ullrich et al. 2020"
-    )
-    nc.detect_cmd = cmd_detect
-    nc.stitch_cmd = cmd_stitch
-
-    record_length = 0
-    tracks = 0
-    for storm in storms:
-        tracks += 1
-        storm_length = storm["length"]
-        record_length += storm_length
-
-    nc.createDimension("tracks", size=tracks)
-    nc.createDimension("record", size=record_length)
-
-    nc.createVariable("FIRST_PT", np.int32, ("tracks"))
-    nc.createVariable("NUM_PTS", np.int32, ("tracks"))
-    nc.createVariable("TRACK_ID", np.int32, ("tracks"))
-    nc.createVariable("index", np.int32, ("record"))
-    nc.createVariable("time", "f8", ("record"))
-    nc.createVariable("lon", "f4", ("record"))
-    nc.createVariable("lat", "f4", ("record"))
+    path = os.path.join(directory, savefname)
+
+    # the values of all of the points are gathered from a columnar copy of
+    # the storms, keeping only the first "length" points of each storm
+    trajectory_set = TrajectorySet.from_storms(storms)
+    if len(trajectory_set) == 0:
+        trajectory_set = TrajectorySet.empty(list(column_names))
+    num_pts = trajectory_set.length
+    points = _ranges(trajectory_set.first_pt, num_pts)
+    tracks = len(trajectory_set)
+    record_length = len(points)
+    first_pt = _offsets(num_pts)
 
     output_vars_all = list(column_names.keys()).copy()
     for pos in ["grid_x", "grid_y", "lon", "lat", "year", "month", "day", "hour"]:
         output_vars_all.remove(pos)
 
-    list_dim_created = False
+    digits = {
+        "least_significant_digit": least_significant_digit or {},
+        "significant_digits": significant_digits or {},
+    }
+    all_variables = ["index", "time", "lon", "lat"] + output_vars_all
+    for option, values in digits.items():
+        unknown = set(values) - set(all_variables)
+        if unknown:
+            raise ValueError(
+                f"{option} is given for {', '.join(sorted(unknown))}, which "
+                f"are not record variables"
+            )
+
+    if append and os.path.exists(path):
+        logger.debug(f"append to nc file {path}")
+        nc = Dataset(path, "a")
+        try:
+            _check_appendable(nc, path, trajectory_set, output_vars_all, calendar)
+        except ValueError:
+            nc.close()
+            raise
+        if endperiod:
+            nc.end_date = endperiod
+        time_units = nc.variables["time"].units
+        first_track = len(nc.dimensions["tracks"])
+        first_record = len(nc.dimensions["record"])
+        if first_track:
+            # the tracks are numbered in order and so only the last number
+            # needs to be read
+            first_track_id = int(nc.variables["TRACK_ID"][first_track - 1]) + 1
+        else:
+            first_track_id = 0
+        new_vars = [var for var in output_vars_all if var not in nc.variables]
+        if new_vars and tracks:
+            _define_variables(
+                nc,
+                trajectory_set,
+                new_vars,
+                calendar,
+                time_units,
+                variable_units,
+                complevel,
+                shuffle,
+                record_chunksize,
+                digits,
+                coordinates=False,
+            )
+    else:
+        logger.debug("making netCDF of outputs")
+        logger.debug(f"open nc file {path}")
+        nc = Dataset(path, "w", format="NETCDF4")
+        nc.title = "Tempest TC tracks"
+        nc.directory = directory
+        nc.tracked_data_frequency = frequency
+        logger.debug(f"nc.title {nc.title}")
+
+        nc.mo_runid = um_suiteid
+        nc.grid = resolution_code
+        nc.start_date = startperiod
+        nc.end_date = endperiod
+        nc.institution_id = "MOHC"
+        nc.algorithm = "TempestExtremes_v2"
+        nc.algorithm_ref = (
+            "Ullrich and Zarzycki 2017; Zarzycki and Ullrich 2017; "
+            + "Ullrich et al. 2020"
+        )
+        nc.detect_cmd = cmd_detect
+        nc.stitch_cmd = cmd_stitch
+
+        # unlimited dimensions allow tracks to be appended later
+        nc.createDimension("tracks", size=None if append else tracks)
+        nc.createDimension("record", size=None if append else record_length)
+        _define_variables(
+            nc,
+            trajectory_set,
+            # without any tracks the number of profile bins isn't known
+            output_vars_all if tracks or not append else [],
+            calendar,
+            time_units,
+            variable_units,
+            complevel,
+            shuffle,
+            record_chunksize,
+            digits,
+        )
+        first_track = 0
+        first_record = 0
+        first_track_id = 0
+
+    # write the values of the tracks and points to the file
+    # track: first_pt, num_pts, track_id
+    # record: lat, lon, time, psl, index(0:tracklen-1)
+    columns = {}
+    for name in ["lon", "lat", "year", "month", "day", "hour"] + output_vars_all:
+        values = trajectory_set.columns[name][points]
+        columns[name] = np.ma.filled(values)
+    time = dates_to_num(
+        columns["year"],
+        columns["month"],
+        columns["day"],
+        columns["hour"],
+        time_units,
+        calendar,
+    )
+    index = np.arange(record_length) - np.repeat(first_pt, num_pts)
+
+    logger.debug(f"tracks, record_length {tracks} {record_length} ")
+
+    track_slice = slice(first_track, first_track + tracks)
+    record_slice = slice(first_record, first_record + record_length)
+    nc.variables["FIRST_PT"][track_slice] = first_pt + first_record
+    nc.variables["NUM_PTS"][track_slice] = num_pts
+    nc.variables["TRACK_ID"][track_slice] = first_track_id + np.arange(tracks)
+    nc.variables["index"][record_slice] = index
+    nc.variables["lon"][record_slice] = columns["lon"]
+    nc.variables["lat"][record_slice] = columns["lat"]
+    nc.variables["time"][record_slice] = time
+    for var in output_vars_all:
+        if var not in nc.variables:
+            # an empty append to a file with no variables from the track file
+            continue
+        logger.debug(f"var {var} ")
+        # profiles are written as a (record, profile bin) array
+        nc.variables[var][record_slice] = columns[var]
+    logger.debug(f"written nc file {nc.variables}")
+
+    nc.close()
+
+
+def _define_variables(
+    nc,
+    trajectory_set,
+    output_vars_all,
+    calendar,
+    time_units,
+    variable_units,
+    complevel,
+    shuffle,
+    record_chunksize,
+    digits,
+    coordinates=True,
+):
+    """
+    Create the variables in a track file and their metadata.
+
+    :param nc: The file, in which the tracks and record dimensions have
+        been created.
+    :type nc: :py:obj:`netCDF4.Dataset`
+    :param trajectory_set: The trajectories that will be written to the file.
+    :type trajectory_set: :py:obj:`tempest_helper.TrajectorySet`
+    :param list output_vars_all: The names of the variables from the track
+        file to create.
+    :param str calendar: netcdf calendar type
+    :param str time_units: units string for the time coordinate
+    :param str variable_units: units for the different variables
+    :param int complevel: The zlib compression level, or 0 for no compression.
+    :param bool shuffle: If True then apply the HDF5 shuffle filter.
+    :param int record_chunksize: The number of points in each chunk of the
+        record variables, or None for the default chunks.
+    :param dict digits: The least_significant_digit and significant_digits
+        options of each variable.
+    :param bool coordinates: If True then also create the track, index, time,
+        longitude and latitude variables.
+    """
+
+    def create_variable(name, datatype, dimensions, chunksizes):
+        options = {}
+        if complevel:
+            options.update(zlib=True, complevel=complevel, shuffle=shuffle)
+        if chunksizes is not None:
+            options["chunksizes"] = []
+            for dimension, size in zip(dimensions, chunksizes):
+                # a chunk can't be empty or larger than a fixed size dimension
+                if not nc.dimensions[dimension].isunlimited():
+                    size = max(1, min(size, len(nc.dimensions[dimension])))
+                options["chunksizes"].append(size)
+        for option, values in digits.items():
+            if name in values:
+                options[option] = values[name]
+        nc.createVariable(name, datatype, dimensions, **options)
+
+    if record_chunksize is None:
+        tracks_chunks = None
+        record_chunks = None
+    else:
+        tracks_chunks = (TRACKS_CHUNKSIZE,)
+        record_chunks = (record_chunksize,)
+    if coordinates:
+        _define_coordinates(
+            nc, create_variable, tracks_chunks, record_chunks, calendar, time_units
+        )
+
     for var in output_vars_all:
-        if "list" in str(type(storm[var][0])):
-            list_size = len(storm[var][0])
-            if not list_dim_created:
-                nc.createDimension("record_profile", size=record_length * list_size)
-                list_dim_created = True
-            nc.createVariable(var, "f8", ("record_profile"))
+        if var in trajectory_set.profiles:
+            # each profile variable has its own dimension for its bins
+            n_bins = trajectory_set.columns[var].shape[1]
+            nc.createDimension(_bins_dimension(var), size=n_bins)
+            create_variable(
+                var,
+                "f8",
+                ("record", _bins_dimension(var)),
+                None if record_chunks is None else record_chunks + (n_bins,),
+            )
         else:
-            nc.createVariable(var, "f8", ("record"))
+            create_variable(var, "f8", ("record",), record_chunks)
+
+    if len(variable_units) == 0:
+        variable_units = guess_variable_units(output_vars_all)
+
+    for var in output_vars_all:
+        standard_name, long_name, description, v_units = define_netcdf_metadata(
+            var, variable_units
+        )
+        logger.debug(f"var, units {var} {v_units} ")
+        nc.variables[var].standard_name = standard_name
+        nc.variables[var].long_name = long_name
+        nc.variables[var].description = description
+        nc.variables[var].units = str(v_units)
+
+
+def _define_coordinates(
+    nc, create_variable, tracks_chunks, record_chunks, calendar, time_units
+):
+    """
+    Create the track, index, time, longitude and latitude variables in a new
+    track file and their metadata.
+
+    :param nc: The new file, in which the tracks and record dimensions have
+        been created.
+    :type nc: :py:obj:`netCDF4.Dataset`
+    :param create_variable: The function to create a variable with its
+        compression and chunking options.
+    :param tuple tracks_chunks: The chunk shape of the track variables, or
+        None for the default chunks.
+    :param tuple record_chunks: The chunk shape of the record variables, or
+        None for the default chunks.
+    :param str calendar: netcdf calendar type
+    :param str time_units: units string for the time coordinate
+    """
+    create_variable("FIRST_PT", np.int32, ("tracks",), tracks_chunks)
+    create_variable("NUM_PTS", np.int32, ("tracks",), tracks_chunks)
+    create_variable("TRACK_ID", np.int32, ("tracks",), tracks_chunks)
+    create_variable("index", np.int32, ("record",), record_chunks)
+    create_variable("time", "f8", ("record",), record_chunks)
+    create_variable("lon", "f4", ("record",), record_chunks)
+    create_variable("lat", "f4", ("record",), record_chunks)
 
     nc.variables["FIRST_PT"].units = "ordinal"
     nc.variables["FIRST_PT"].long_name = "first_pt"
@@ -247,79 +501,53 @@ def save_trajectories_netcdf(
     nc.variables["time"].standard_name = "time"
     nc.variables["time"].long_name = "time"
 
-    if len(variable_units) == 0:
-        variable_units = guess_variable_units(output_vars_all)
 
-    for var in output_vars_all:
-        standard_name, long_name, description, v_units = define_netcdf_metadata(
-            var, variable_units
+def _check_appendable(nc, path, trajectory_set, output_vars_all, calendar):
+    """
+    Check that tracks can be appended to an existing track file.
+
+    :param nc: The open track file.
+    :type nc: :py:obj:`netCDF4.Dataset`
+    :param str path: The path to the track file.
+    :param trajectory_set: The trajectories to write.
+    :type trajectory_set: :py:obj:`tempest_helper.TrajectorySet`
+    :param list output_vars_all: The names of the variables to write.
+    :param str calendar: The calendar of the tracks to write.
+    :raises ValueError: If the file does not have unlimited dimensions, or is
+        missing variables that can't be added because it already contains
+        tracks, or has a different calendar or number of profile bins.
+    """
+    if not nc.dimensions["record"].isunlimited():
+        raise ValueError(
+            f"Tracks can't be appended to {path} because it was not created "
+            f"with append=True"
         )
-        logger.debug(f"var, units {var} {v_units} ")
-        nc.variables[var].standard_name = standard_name
-        nc.variables[var].long_name = long_name
-        nc.variables[var].description = description
-        nc.variables[var].units = str(v_units)
-
-    # read the storms and write the values to the file
-    # track: first_pt, num_pts, track_id
-    # record: lat, lon, time, psl, index(0:tracklen-1)
-    first_pt = []
-    num_pts = []
-    track_id = []
-    lon = []
-    lat = []
-    time = []
-    index = []
-
-    variables_to_write = {}
-    for var in output_vars_all:
-        variables_to_write[var] = []
-
-    first_pt_index = 0
-    for ist, storm in enumerate(storms):
-        first_pt.append(first_pt_index)
-        num_pts.append(storm["length"])
-        track_id.append(ist)
-        first_pt_index += storm["length"]
-
-        for ipt in range(storm["length"]):
-            t1 = date2num(
-                datetime(
-                    storm["year"][ipt],
-                    storm["month"][ipt],
-                    storm["day"][ipt],
-                    storm["hour"][ipt],
-                    calendar=calendar,
-                ),
-                time_units,
-                calendar=calendar,
+    missing = [var for var in output_vars_all if var not in nc.variables]
+    if missing and len(nc.dimensions["record"]):
+        raise ValueError(f"{path} does not contain variables {', '.join(missing)}")
+    for var in trajectory_set.profiles:
+        if var not in nc.variables:
+            continue
+        shape = trajectory_set.columns[var].shape[1:]
+        if nc.variables[var].shape[1:] != shape:
+            raise ValueError(
+                f"{var} in {path} has shape {nc.variables[var].shape[1:]} for "
+                f"each point but the tracks have shape {shape}"
             )
-            time.append(t1)
-            index.append(ipt)
-            lon.append(storm["lon"][ipt])
-            lat.append(storm["lat"][ipt])
-            for var in output_vars_all:
-                if "rprof" in var:
-                    variables_to_write[var].append(storm[var][ipt][:])
-                else:
-                    variables_to_write[var].append(storm[var][ipt])
-
-    logger.debug(f"first_pt {first_pt} ")
-    logger.debug(f"tracks, record_length {tracks} {record_length} ")
-    logger.debug(f"len(first_pt) {len(first_pt)} ")
-    logger.debug(f"len(lon) {len(lon)} ")
-
-    # now write variables to netcdf
-    nc.variables["FIRST_PT"][:] = first_pt
-    nc.variables["NUM_PTS"][:] = num_pts
-    nc.variables["TRACK_ID"][:] = track_id
-    nc.variables["index"][:] = index
-    nc.variables["lon"][:] = lon
-    nc.variables["lat"][:] = lat
-    nc.variables["time"][:] = time
-    for var in output_vars_all:
-        logger.debug(f"var {var} ")
-        nc.variables[var][:] = variables_to_write[var]
-    logger.debug(f"written nc file {nc.variables}")
+    file_calendar = nc.variables["time"].calendar
+    if normalise_calendar(file_calendar) != normalise_calendar(calendar):
+        raise ValueError(
+            f"{path} uses the {file_calendar} calendar but the tracks use the "
+            f"{calendar} calendar"
+        )
 
-    nc.close()
+
+def _bins_dimension(var):
+    """
+    The name of the dimension of the bins of a profile variable.
+
+    :param str var: The name of the profile variable.
+    :returns: The name of the dimension.
+    :rtype: str
+    """
+    return f"{var}_bins"
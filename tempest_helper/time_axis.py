@@ -0,0 +1,181 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import functools
+import logging
+import os
+
+import cftime
+from netCDF4 import Dataset
+
+logger = logging.getLogger(__name__)
+
+# Alternative names for calendars that are not keys in DATETIME_TYPES
+CALENDAR_ALIASES = {
+    "365_day": "noleap",
+    "366_day": "all_leap",
+}
+
+
+class TimeAxis:
+    """
+    A lightweight description of the time axis of the data that the tracking
+    was run on. It holds just the metadata that is needed to load and
+    manipulate trajectories and so can be used in place of a cube loaded from
+    a full model output file. The time period between time points isn't
+    part of the time axis and is passed separately to the functions that
+    need it.
+
+    :param origin: The first time point in the data, either as a `cftime`
+        datetime or a tuple of the year, month, day and hour.
+    :param str calendar: The calendar of the data.
+    :param int nx: The number of points along the longitude (x) axis of the
+        data.
+    """
+
+    def __init__(self, origin, calendar, nx=None):
+        self.calendar = normalise_calendar(calendar)
+        if isinstance(origin, tuple):
+            origin = cftime.datetime(*origin, calendar=self.calendar)
+        self.origin = origin
+        self.nx = nx
+
+    @classmethod
+    def from_cube(cls, cube):
+        """
+        Create a `TimeAxis` from the time coordinate and shape of a cube.
+
+        :param cube: A cube loaded from a data file from the current period.
+        :type cube: :py:obj:`iris.cube.Cube`
+        :returns: The time axis of the cube.
+        :rtype: :py:obj:`tempest_helper.TimeAxis`
+        """
+        time_coord = cube.coord("time")
+        origin = time_coord.units.num2date(time_coord.points[0])
+        return cls(origin, time_coord.units.calendar, cube.shape[-1])
+
+    @classmethod
+    def from_netcdf(cls, nc_file):
+        """
+        Create a `TimeAxis` from the header of a netCDF file. Only the first
+        value of the time variable is read from the file and the result is
+        cached until the file is modified.
+
+        :param str nc_file: The path to a netCDF file that the tracking was run
+            on.
+        :returns: The time axis of the file.
+        :rtype: :py:obj:`tempest_helper.TimeAxis`
+        """
+        nc_file = os.path.abspath(nc_file)
+        file_stat = os.stat(nc_file)
+        origin, calendar, nx = _read_netcdf_time_axis(
+            nc_file, file_stat.st_mtime_ns, file_stat.st_size
+        )
+        return cls(origin, calendar, nx)
+
+    def __eq__(self, other):
+        if not isinstance(other, TimeAxis):
+            return NotImplemented
+        return (
+            self.origin == other.origin
+            and self.calendar == other.calendar
+            and self.nx == other.nx
+        )
+
+    def __repr__(self):
+        return (
+            f"TimeAxis({self.origin!r}, {self.calendar!r}, nx={self.nx!r})"
+        )
+
+
+def as_time_axis(source):
+    """
+    Get a `TimeAxis` from either an existing `TimeAxis`, a cube or the path to
+    a netCDF file.
+
+    :param source: The time axis, cube or path.
+    :returns: The time axis.
+    :rtype: :py:obj:`tempest_helper.TimeAxis`
+    """
+    if isinstance(source, TimeAxis):
+        return source
+    elif isinstance(source, str) or hasattr(source, "__fspath__"):
+        return TimeAxis.from_netcdf(source)
+    else:
+        return TimeAxis.from_cube(source)
+
+
+def normalise_calendar(calendar):
+    """
+    Convert a calendar name into the name used as the key in
+    `DATETIME_TYPES`.
+
+    :param str calendar: The calendar name.
+    :returns: The standard name for this calendar.
+    :rtype: str
+    """
+    calendar = calendar.lower()
+    return CALENDAR_ALIASES.get(calendar, calendar)
+
+
+@functools.lru_cache(maxsize=64)
+def _read_netcdf_time_axis(nc_file, modification_time, file_size):
+    """
+    Read the time origin, calendar and number of longitudes from a netCDF file.
+    The modification time and size of the file are included in the arguments
+    so that the cached values are not used if the file changes.
+
+    :param str nc_file: The absolute path to the netCDF file.
+    :param int modification_time: The modification time of the file in
+        nanoseconds.
+    :param int file_size: The size of the file in bytes.
+    :returns: The origin, calendar and number of longitudes.
+    :rtype: tuple
+    """
+    logger.debug(f"Reading time axis from {nc_file}")
+    with Dataset(nc_file) as dataset:
+        time_var = _find_time_variable(dataset)
+        calendar = getattr(time_var, "calendar", "standard")
+        origin = cftime.num2date(time_var[0], time_var.units, calendar=calendar)
+        data_var = _find_data_variable(dataset)
+        nx = data_var.shape[-1] if data_var is not None else None
+    return origin, calendar, nx
+
+
+def _find_time_variable(dataset):
+    """
+    Find the time coordinate variable in a netCDF dataset.
+
+    :param dataset: The open netCDF dataset.
+    :type dataset: :py:obj:`netCDF4.Dataset`
+    :returns: The time variable.
+    :rtype: :py:obj:`netCDF4.Variable`
+    """
+    for variable in dataset.variables.values():
+        if getattr(variable, "standard_name", None) == "time":
+            return variable
+    if "time" in dataset.variables:
+        return dataset.variables["time"]
+    raise ValueError(f"Unable to find a time variable in {dataset.filepath()}")
+
+
+def _find_data_variable(dataset):
+    """
+    Find the data variable in a netCDF dataset, which is the variable with the
+    most dimensions that is not a coordinate or bounds variable.
+
+    :param dataset: The open netCDF dataset.
+    :type dataset: :py:obj:`netCDF4.Dataset`
+    :returns: The data variable, or None if there is none.
+    :rtype: :py:obj:`netCDF4.Variable`
+    """
+    auxiliary = set()
+    for variable in dataset.variables.values():
+        for attribute in ("bounds", "coordinates", "grid_mapping", "cell_measures"):
+            auxiliary.update(getattr(variable, attribute, "").replace(":", " ").split())
+    data_var = None
+    for name, variable in dataset.variables.items():
+        if name in dataset.dimensions or name in auxiliary:
+            continue
+        if data_var is None or variable.ndim > data_var.ndim:
+            data_var = variable
+    return data_var
@@ -0,0 +1,152 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import bz2
+import gzip
+import logging
+import lzma
+import os
+from shutil import copyfile, copyfileobj
+
+logger = logging.getLogger(__name__)
+
+# The text at the start of a header element in the TempestExtremes output
+HEADER_DELIM = b"start"
+
+# The default number of bytes read at a time when streaming a track file
+CHUNK_SIZE = 2**24
+
+# The functions to open each type of compressed file
+COMPRESSION_OPENERS = {
+    "gzip": gzip.open,
+    "bz2": bz2.open,
+    "xz": lzma.open,
+}
+
+# The file extensions of each type of compressed file
+COMPRESSION_EXTENSIONS = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".lzma": "xz",
+}
+
+# The bytes at the start of each type of compressed file
+COMPRESSION_MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"\xfd7zXZ\x00": "xz",
+}
+
+
+def detect_compression(path, mode="r"):
+    """
+    Determine the type of compression used for a track file. Files being read
+    are identified from their first few bytes and files being written from
+    their extension.
+
+    :param str path: The path to the file.
+    :param str mode: The mode that the file will be opened with.
+    :returns: The name of the compression, or None if the file is not
+        compressed.
+    :rtype: str
+    """
+    if "r" in mode and os.path.exists(path):
+        with open(path, "rb") as file_handle:
+            start = file_handle.read(6)
+        for magic, compression in COMPRESSION_MAGIC.items():
+            if start.startswith(magic):
+                return compression
+        return None
+    extension = os.path.splitext(str(path))[1].lower()
+    return COMPRESSION_EXTENSIONS.get(extension)
+
+
+def open_track_file(path, mode="r"):
+    """
+    Open a track file, which may be compressed with gzip, bzip2 or xz, for
+    streaming. The compression is detected automatically.
+
+    :param str path: The path to the file.
+    :param str mode: The mode to open the file with, as for the built-in
+        `open()` function.
+    :returns: The open file.
+    :rtype: file object
+    """
+    compression = detect_compression(path, mode)
+    if compression is None:
+        return open(path, mode)
+    logger.debug(f"Opening {compression} compressed file {path}")
+    if "b" not in mode and "t" not in mode:
+        mode += "t"
+    return COMPRESSION_OPENERS[compression](path, mode)
+
+
+def copy_track_file(source, destination):
+    """
+    Copy a track file, decompressing or compressing it as required by the
+    two paths.
+
+    :param str source: The path to the file to copy.
+    :param str destination: The path to copy the file to.
+    """
+    if (
+        detect_compression(source) is None
+        and detect_compression(destination, "w") is None
+    ):
+        copyfile(source, destination)
+        return
+    with open_track_file(source, "rb") as file_input:
+        with open_track_file(destination, "wb") as file_output:
+            copyfileobj(file_input, file_output)
+
+
+def _iter_track_blocks(file_handle, chunk_size):
+    """
+    Read a track file in chunks, yielding blocks of text that each contain
+    only complete tracks. A block is only longer than `chunk_size` if a single
+    track is longer than this.
+
+    :param file_handle: The track file opened in binary mode.
+    :param int chunk_size: The number of bytes to read at a time.
+    :returns: A generator of the blocks of text.
+    :rtype: generator
+    """
+    buffer = b""
+    while True:
+        chunk = file_handle.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        # Split before the last header in the buffer, as the track that it
+        # starts may continue in the next chunk
+        split = buffer.rfind(HEADER_DELIM)
+        split = buffer.rfind(b"\n", 0, split) + 1 if split > 0 else 0
+        if split > 0:
+            yield buffer[:split]
+            buffer = buffer[split:]
+    if buffer.strip():
+        yield buffer
+
+
+def _find_headers(text):
+    """
+    Find the header line at the start of each track in the contents of a
+    TempestExtremes track file.
+
+    :param bytes text: The contents of the track file.
+    :returns: The byte offsets of the start of each header line and of the
+        start of the line after each header.
+    :rtype: tuple
+    """
+    header_starts = []
+    header_ends = []
+    position = text.find(HEADER_DELIM)
+    while position != -1:
+        line_start = text.rfind(b"\n", 0, position) + 1
+        line_end = text.find(b"\n", position)
+        line_end = len(text) if line_end == -1 else line_end + 1
+        header_starts.append(line_start)
+        header_ends.append(line_end)
+        position = text.find(HEADER_DELIM, line_end)
+    return header_starts, header_ends
@@ -0,0 +1,144 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class TrackFilter:
+    """
+    Criteria for selecting the tracks to load from a TempestExtremes track
+    file. The criteria are applied while the file is parsed so that the
+    rejected tracks are never gap filled or converted into trajectories.
+    Tracks that can be rejected from their header line and their last row,
+    because they are too short or are outside the time window, are skipped
+    before any of their values are converted to numbers.
+
+    A track is kept only if it meets all of the criteria that are specified.
+
+    :param int min_length: The minimum length of a track, as given in its
+        header line in the track file.
+    :param tuple time_window: The earliest and latest times, each as a tuple of
+        the year, month, day and hour. Tracks are kept if any part of them is
+        within the window.
+    :param tuple bbox: The minimum longitude, maximum longitude, minimum
+        latitude and maximum latitude of a box in degrees. Tracks are kept if
+        any of their points is inside the box. If the minimum longitude is
+        greater than the maximum then the box crosses the 0/360 degree
+        meridian.
+    :param dict thresholds: The names of variables and a tuple of the minimum
+        and maximum values allowed, either of which may be None. Tracks are
+        kept if any of their points has a value in this range, for example
+        `{"psl_min": (None, 99000.0)}` keeps tracks whose central pressure
+        falls below 990 hPa. A point of a profile variable is in the range if
+        any of its bins is.
+    """
+
+    def __init__(self, min_length=None, time_window=None, bbox=None, thresholds=None):
+        self.min_length = min_length
+        self.time_window = time_window
+        self.bbox = bbox
+        self.thresholds = dict(thresholds or {})
+
+    @property
+    def uses_rows(self):
+        """True if the filter needs the values of the points in each track."""
+        return self.bbox is not None or bool(self.thresholds)
+
+    def select_headers(self, length, first_date, last_date):
+        """
+        Select the tracks that meet the criteria that only need each track's
+        length and its first and last times.
+
+        :param numpy.ndarray length: The length of each track.
+        :param numpy.ndarray first_date: The year, month, day and hour of the
+            first point of each track, with shape (number of tracks, 4).
+        :param numpy.ndarray last_date: The year, month, day and hour of the
+            last point of each track, with shape (number of tracks, 4).
+        :returns: A boolean mask that is True for the tracks to keep.
+        :rtype: numpy.ndarray
+        """
+        keep = np.ones(len(length), dtype=bool)
+        if self.min_length is not None:
+            keep &= np.asarray(length) >= self.min_length
+        if self.time_window is not None:
+            start, end = (_date_key(*np.asarray(date).T) for date in self.time_window)
+            keep &= _date_key(*np.asarray(first_date).reshape(-1, 4).T) <= end
+            keep &= _date_key(*np.asarray(last_date).reshape(-1, 4).T) >= start
+        return keep
+
+    def select_tracks(self, columns, num_rows):
+        """
+        Select the tracks with at least one point inside the bounding box and
+        meeting each of the thresholds.
+
+        :param dict columns: The column arrays containing the points of all of
+            the tracks.
+        :param numpy.ndarray num_rows: The number of points in each track.
+        :returns: A boolean mask that is True for the tracks to keep.
+        :rtype: numpy.ndarray
+        """
+        keep = np.ones(len(num_rows), dtype=bool)
+        if self.bbox is not None:
+            lon_min, lon_max, lat_min, lat_max = self.bbox
+            if lon_max - lon_min >= 360:
+                inside = np.ones(len(columns["lon"]), dtype=bool)
+            else:
+                # the longitude east of lon_min, which handles boxes that
+                # cross the 0/360 degree meridian
+                inside = (columns["lon"] - lon_min) % 360 <= (lon_max - lon_min) % 360
+            inside &= (columns["lat"] >= lat_min) & (columns["lat"] <= lat_max)
+            keep &= _any_in_track(inside, num_rows)
+        for name, (minimum, maximum) in self.thresholds.items():
+            values = columns[name]
+            inside = np.ones(values.shape, dtype=bool)
+            if minimum is not None:
+                inside &= np.ma.filled(values >= minimum, False)
+            if maximum is not None:
+                inside &= np.ma.filled(values <= maximum, False)
+            if inside.ndim > 1:
+                # a profile is in the range if any of its bins is
+                inside = inside.reshape(len(inside), -1).any(axis=1)
+            keep &= _any_in_track(inside, num_rows)
+        return keep
+
+    def __repr__(self):
+        return (
+            f"TrackFilter(min_length={self.min_length!r}, "
+            f"time_window={self.time_window!r}, bbox={self.bbox!r}, "
+            f"thresholds={sorted(self.thresholds.items())!r})"
+        )
+
+
+def _date_key(year, month, day, hour):
+    """
+    Combine the components of dates into integers that sort in the same order
+    as the dates, in any calendar. The keys count hours as if every month had
+    31 days and so the difference between two keys is close to the number of
+    hours between the dates.
+
+    :param year: The years.
+    :param month: The months.
+    :param day: The days.
+    :param hour: The hours.
+    :returns: The combined dates.
+    :rtype: numpy.ndarray
+    """
+    months = np.asarray(year, dtype=np.int64) * 12 + np.asarray(month) - 1
+    days = months * 31 + np.asarray(day) - 1
+    return days * 24 + np.asarray(hour)
+
+
+def _any_in_track(points, num_rows):
+    """
+    Determine whether any point in each track is True.
+
+    :param numpy.ndarray points: A boolean value for each point.
+    :param numpy.ndarray num_rows: The number of points in each track.
+    :returns: A boolean value for each track.
+    :rtype: numpy.ndarray
+    """
+    track = np.repeat(np.arange(len(num_rows)), num_rows)
+    return np.bincount(track[points], minlength=len(num_rows)) > 0
@@ -0,0 +1,248 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import logging
+import mmap
+import os
+
+import numpy as np
+
+from .load_trajectories import _load_tracks
+from .time_axis import as_time_axis
+from .track_files import _find_headers, detect_compression
+
+logger = logging.getLogger(__name__)
+
+# The suffix added to the track file's path to make the sidecar index's path
+INDEX_SUFFIX = ".idx.npz"
+
+
+class TrackIndex:
+    """
+    An index of the tracks in a TempestExtremes track file, recording the byte
+    offset of each track's header line, the number of bytes in the track, its
+    length and its start date. The size and modification time of the track
+    file are also recorded so that an out of date index can be detected.
+
+    :param numpy.ndarray offsets: The byte offset of each track's header line.
+    :param numpy.ndarray nbytes: The number of bytes in each track, including
+        the header line.
+    :param numpy.ndarray length: The length of each track from its header.
+    :param numpy.ndarray start_date: The year, month, day and hour from each
+        track's header, with shape (number of tracks, 4).
+    :param int file_size: The size of the track file in bytes.
+    :param int file_mtime: The modification time of the track file in
+        nanoseconds.
+    """
+
+    def __init__(self, offsets, nbytes, length, start_date, file_size, file_mtime):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.nbytes = np.asarray(nbytes, dtype=np.int64)
+        self.length = np.asarray(length, dtype=np.int64)
+        self.start_date = np.asarray(start_date, dtype=np.int32).reshape(-1, 4)
+        self.file_size = int(file_size)
+        self.file_mtime = int(file_mtime)
+
+    @classmethod
+    def load(cls, index_file):
+        """
+        Load an index from a sidecar file.
+
+        :param str index_file: The path to the index file.
+        :returns: The index.
+        :rtype: :py:obj:`tempest_helper.TrackIndex`
+        """
+        with np.load(index_file) as arrays:
+            return cls(
+                arrays["offsets"],
+                arrays["nbytes"],
+                arrays["length"],
+                arrays["start_date"],
+                arrays["file_size"],
+                arrays["file_mtime"],
+            )
+
+    def save(self, index_file):
+        """
+        Save the index to a sidecar file.
+
+        :param str index_file: The path to save the index to.
+        """
+        with open(index_file, "wb") as file_handle:
+            np.savez(
+                file_handle,
+                offsets=self.offsets,
+                nbytes=self.nbytes,
+                length=self.length,
+                start_date=self.start_date,
+                file_size=self.file_size,
+                file_mtime=self.file_mtime,
+            )
+
+    def is_current(self, tracked_file):
+        """
+        Check whether the index matches the current version of a track file.
+
+        :param str tracked_file: The path to the track file.
+        :returns: True if the file's size and modification time are unchanged.
+        :rtype: bool
+        """
+        file_stat = os.stat(tracked_file)
+        return (
+            file_stat.st_size == self.file_size
+            and file_stat.st_mtime_ns == self.file_mtime
+        )
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+def build_track_index(tracked_file, index_file=None):
+    """
+    Build an index of the tracks in a TempestExtremes track file in a single
+    scan of the file, which is memory-mapped rather than read. Compressed files
+    cannot be memory-mapped and so cannot be indexed.
+
+    :param str tracked_file: The path to the file produced by TempestExtremes.
+    :param str index_file: If specified then save the index to this path.
+    :returns: The index.
+    :rtype: :py:obj:`tempest_helper.TrackIndex`
+    """
+    logger.debug(f"Building track index for {tracked_file}")
+    compression = detect_compression(tracked_file)
+    if compression is not None:
+        raise ValueError(
+            f"{tracked_file} is {compression} compressed and so cannot be indexed"
+        )
+    file_stat = os.stat(tracked_file)
+    with open(tracked_file, "rb") as file_handle:
+        if file_stat.st_size == 0:
+            header_starts, header_ends, headers = [], [], []
+        else:
+            with mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as text:
+                header_starts, header_ends = _find_headers(text)
+                headers = [
+                    text[start:end].split()
+                    for start, end in zip(header_starts, header_ends)
+                ]
+    offsets = np.array(header_starts, dtype=np.int64)
+    nbytes = np.diff(np.append(offsets, file_stat.st_size))
+    length = [int(header[1]) for header in headers]
+    start_date = [[int(value) for value in header[2:6]] for header in headers]
+    index = TrackIndex(
+        offsets,
+        nbytes,
+        length,
+        start_date,
+        file_stat.st_size,
+        file_stat.st_mtime_ns,
+    )
+    if index_file:
+        index.save(index_file)
+    return index
+
+
+def load_track_index(tracked_file, index_file=None):
+    """
+    Load the sidecar index for a track file, building and saving a new index
+    if the sidecar does not exist or is out of date.
+
+    :param str tracked_file: The path to the file produced by TempestExtremes.
+    :param str index_file: The path to the index file. Defaults to the path of
+        the track file with `INDEX_SUFFIX` appended.
+    :returns: The index.
+    :rtype: :py:obj:`tempest_helper.TrackIndex`
+    """
+    if index_file is None:
+        index_file = str(tracked_file) + INDEX_SUFFIX
+    if os.path.exists(index_file):
+        index = TrackIndex.load(index_file)
+        if index.is_current(tracked_file):
+            return index
+        logger.debug(f"Track index {index_file} is out of date")
+    return build_track_index(tracked_file, index_file)
+
+
+class TrackFileReader:
+    """
+    Random access to the tracks in a TempestExtremes track file. The file is
+    memory-mapped and only the tracks that are requested are parsed, using an
+    index of the tracks' byte offsets.
+
+    Indexing the reader with an integer returns a single storm dictionary and
+    indexing with a slice, or a sequence of integers, returns a list of them.
+    The reader should be closed after use, or used as a context manager.
+
+    :param str tracked_file: The path to the file produced by TempestExtremes.
+    :param nc_file: The path to a netCDF file that the tracking was run on, or
+        a time axis describing it.
+    :type nc_file: str or :py:obj:`tempest_helper.TimeAxis`
+    :param int time_period: The time period in hours between time points in the
+        data.
+    :param dict column_names: the names of the column variables within the
+        tracked_file, to be used as storm[] keys
+    :param index: The index of the track file. If not specified then the
+        sidecar index is loaded, or built if necessary.
+    :type index: :py:obj:`tempest_helper.TrackIndex`
+    """
+
+    def __init__(self, tracked_file, nc_file, time_period, column_names, index=None):
+        self.tracked_file = tracked_file
+        self.time_axis = as_time_axis(nc_file)
+        self.time_period = time_period
+        self.column_names = column_names
+        self.index = index if index is not None else load_track_index(tracked_file)
+        if not self.index.is_current(tracked_file):
+            raise ValueError(f"The index does not match {tracked_file}")
+        self._file_handle = open(tracked_file, "rb")
+        if self.index.file_size:
+            self._text = mmap.mmap(
+                self._file_handle.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        else:
+            self._text = b""
+
+    def read(self, tracks):
+        """
+        Parse some of the tracks in the file.
+
+        :param tracks: The numbers of the tracks to read, as a slice or a
+            sequence of integers.
+        :returns: The trajectories in the order requested.
+        :rtype: list
+        """
+        numbers = np.arange(len(self.index))[tracks]
+        if len(numbers) == 0:
+            return []
+        if np.all(np.diff(numbers) == 1):
+            # consecutive tracks are contiguous in the file
+            start = self.index.offsets[numbers[0]]
+            end = self.index.offsets[numbers[-1]] + self.index.nbytes[numbers[-1]]
+            text = self._text[start:end]
+        else:
+            starts = self.index.offsets[numbers]
+            ends = starts + self.index.nbytes[numbers]
+            text = b"".join(
+                self._text[start:end]
+                for start, end in zip(starts.tolist(), ends.tolist())
+            )
+        return _load_tracks(text, self.column_names, self.time_axis, self.time_period)
+
+    def close(self):
+        """Close the memory map and the track file."""
+        if isinstance(self._text, mmap.mmap):
+            self._text.close()
+        self._file_handle.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, tracks):
+        if isinstance(tracks, (int, np.integer)):
+            return self.read([tracks])[0]
+        return self.read(tracks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
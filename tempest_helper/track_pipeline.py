@@ -0,0 +1,292 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from .load_trajectories import get_trajectories
+from .time_axis import as_time_axis
+from .track_files import copy_track_file
+from .trajectory_manipulations import (
+    remove_duplicate_storms,
+    remove_duplicates_from_track_files,
+)
+from .trajectory_matching import match_storms
+from .trajectory_set import COORDINATE_DTYPES
+
+logger = logging.getLogger(__name__)
+
+# The suffix added to the path of an output file while it is waiting to be
+# compared with the next period
+PENDING_SUFFIX = ".pending"
+
+
+class DeduplicationPipeline:
+    """
+    Remove the storms that are duplicated between each pair of consecutive
+    periods in a sequence of TempestExtremes track files, in the same way as
+    loading each pair of files, matching their storms with `match_storms()`
+    and then calling `remove_duplicates_from_track_files()`.
+
+    Each track file is only parsed once. The storms from the current period
+    are kept in memory, with any storms that were extended from the previous
+    period updated, and are compared with the next period while the period
+    after that is read in the background.
+
+    The adjusted track file of each period is written to the corresponding
+    output file. Until a period has been compared with the next one, its
+    adjusted tracks are written to a file with `PENDING_SUFFIX` appended to
+    its output path. If a checkpoint file is specified then the progress is
+    recorded in it after each pair of periods, so that if the pipeline is
+    interrupted then running it again continues from the last pair that was
+    completed. The checkpoint file is deleted once every period is complete.
+
+    :param list tracked_files: The paths to the track files of each period,
+        in time order.
+    :param list nc_files: The path to a netCDF file that the tracking was run
+        on, or a time axis describing it, for each period.
+    :param int time_period: The time period in hours between time points in the
+        data.
+    :param dict column_names: the names of the column variables within the
+        tracked files, to be used as storm[] keys
+    :param list output_files: The paths to write the adjusted track file of
+        each period to.
+    :param str checkpoint_file: The path to record the progress in.
+    :param float distance_threshold: The maximum distance for storms to be
+        apart but identified as overlapping in space.
+    :param str units: The units of distance_threshold, either "degrees" of arc
+        or "km".
+    """
+
+    def __init__(
+        self,
+        tracked_files,
+        nc_files,
+        time_period,
+        column_names,
+        output_files,
+        checkpoint_file=None,
+        distance_threshold=0.5,
+        units="degrees",
+    ):
+        if not len(tracked_files) == len(nc_files) == len(output_files):
+            raise ValueError(
+                "tracked_files, nc_files and output_files must have the same "
+                "number of periods"
+            )
+        self.tracked_files = list(tracked_files)
+        self.time_axes = [as_time_axis(nc_file) for nc_file in nc_files]
+        self.time_period = time_period
+        self.column_names = column_names
+        self.output_files = list(output_files)
+        self.checkpoint_file = checkpoint_file
+        self.distance_threshold = distance_threshold
+        self.units = units
+
+    def run(self):
+        """
+        Remove the duplicated storms from all of the periods.
+
+        :returns: The paths to the adjusted track files.
+        :rtype: list
+        """
+        n_periods = len(self.tracked_files)
+        if n_periods == 0:
+            return []
+        completed = self._read_checkpoint()
+        if completed == 0:
+            # the first period has no previous period to be compared with
+            copy_track_file(self.tracked_files[0], self._pending_file(0))
+        else:
+            logger.info(f"Resuming after {completed} of {n_periods - 1} pairs")
+            # the pipeline may have stopped before the pending file of the
+            # last completed pair was removed
+            self._remove_pending(completed - 1)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            previous = executor.submit(
+                self._load, self._pending_file(completed), completed
+            )
+            if completed + 1 < n_periods:
+                current = executor.submit(
+                    self._load, self.tracked_files[completed + 1], completed + 1
+                )
+            for period in range(completed + 1, n_periods):
+                previous_storms = previous.result()
+                current_storms = current.result()
+                # read the next period while this pair is compared
+                if period + 1 < n_periods:
+                    current = executor.submit(
+                        self._load, self.tracked_files[period + 1], period + 1
+                    )
+                matches = self._remove_duplicates(
+                    period, previous_storms, current_storms
+                )
+                previous = executor.submit(
+                    _extend_storms,
+                    current_storms,
+                    matches,
+                    self.time_axes[period],
+                    self.time_period,
+                )
+                # the pending file of the previous period is only removed
+                # once the checkpoint no longer refers to it
+                self._write_checkpoint(period)
+                self._remove_pending(period - 1)
+
+        last = n_periods - 1
+        copy_track_file(self._pending_file(last), self.output_files[last])
+        self._remove_pending(last)
+        if self.checkpoint_file is not None and os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+        return self.output_files
+
+    def _remove_duplicates(self, period, previous_storms, current_storms):
+        """
+        Match the storms in a period with those in the previous period and
+        write the adjusted track files.
+
+        :param int period: The number of the current period.
+        :param list previous_storms: The storms from the previous period,
+            including any that were extended from the period before.
+        :param list current_storms: The storms from the current period.
+        :returns: The matches between the two periods.
+        :rtype: list
+        """
+        matches = match_storms(
+            previous_storms, current_storms, self.distance_threshold, self.units
+        )
+        logger.debug(
+            f"Found {len(matches)} storms in {self.tracked_files[period - 1]} that "
+            f"are also in {self.tracked_files[period]}"
+        )
+        if matches:
+            remove_duplicates_from_track_files(
+                self._pending_file(period - 1),
+                self.tracked_files[period],
+                self.output_files[period - 1],
+                self._pending_file(period),
+                matches,
+                self.column_names,
+            )
+        else:
+            copy_track_file(
+                self._pending_file(period - 1), self.output_files[period - 1]
+            )
+            copy_track_file(self.tracked_files[period], self._pending_file(period))
+        return matches
+
+    def _load(self, tracked_file, period):
+        """
+        Load the storms from a track file of a period.
+
+        :param str tracked_file: The path to the track file.
+        :param int period: The number of the period.
+        :returns: The storms.
+        :rtype: list
+        """
+        return get_trajectories(
+            tracked_file, self.time_axes[period], self.time_period, self.column_names
+        )
+
+    def _pending_file(self, period):
+        """The path to the adjusted track file of a period that is not complete."""
+        return self.output_files[period] + PENDING_SUFFIX
+
+    def _remove_pending(self, period):
+        """Remove the pending file of a period, if it exists."""
+        pending_file = self._pending_file(period)
+        if os.path.exists(pending_file):
+            os.remove(pending_file)
+
+    def _read_checkpoint(self):
+        """
+        Read the number of pairs of periods that have been completed from the
+        checkpoint file.
+
+        :returns: The number of completed pairs.
+        :rtype: int
+        """
+        if self.checkpoint_file is None or not os.path.exists(self.checkpoint_file):
+            return 0
+        with open(self.checkpoint_file) as file_handle:
+            checkpoint = json.load(file_handle)
+        if checkpoint["tracked_files"] != self.tracked_files:
+            raise ValueError(
+                f"The checkpoint {self.checkpoint_file} is for different track files"
+            )
+        return checkpoint["completed"]
+
+    def _write_checkpoint(self, completed):
+        """
+        Record the number of pairs of periods that have been completed.
+
+        :param int completed: The number of completed pairs.
+        """
+        if self.checkpoint_file is None:
+            return
+        checkpoint = {"tracked_files": self.tracked_files, "completed": completed}
+        # write to a temporary file first so that the checkpoint is never
+        # partially written
+        directory = os.path.dirname(os.path.abspath(self.checkpoint_file))
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as file_handle:
+                json.dump(checkpoint, file_handle)
+            os.replace(temp_path, self.checkpoint_file)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+def _extend_storms(storms, matches, time_axis, time_period):
+    """
+    Update the storms from a period to match the adjusted track file written
+    by `remove_duplicates_from_track_files()`, in which the storms that were
+    extended have the points from the previous period before their first
+    point in common prepended.
+
+    :param list storms: The storms from the period.
+    :param list matches: The matches with the previous period.
+    :param time_axis: The time axis of the period.
+    :type time_axis: :py:obj:`tempest_helper.TimeAxis`
+    :param int time_period: The time period in hours between time points in the
+        data.
+    :returns: The updated storms.
+    :rtype: list
+    """
+    # the points that are added are rounded as they are in the track file
+    written_matches = []
+    for match in matches:
+        early = {
+            name: (
+                [_written_value(name, value) for value in values]
+                if isinstance(values, list)
+                else values
+            )
+            for name, values in match["early"].items()
+        }
+        written_matches.append(dict(match, early=early))
+    return remove_duplicate_storms([], storms, written_matches, time_axis, time_period)[
+        1
+    ]
+
+
+def _written_value(name, value):
+    """
+    Round a value from a storm to the precision that `write_track_line()`
+    writes it to a track file with.
+
+    :param str name: The name of the column.
+    :param value: The value.
+    :returns: The value as it would be read back from the track file.
+    """
+    if name in ("lon", "lat"):
+        return float("{:.6f}".format(float(value)))
+    if name in COORDINATE_DTYPES:
+        return value
+    if isinstance(value, list):
+        return [float("{:.6e}".format(float(item))) for item in value]
+    return float("{:.6e}".format(float(value)))
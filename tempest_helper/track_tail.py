@@ -0,0 +1,112 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import logging
+import os
+
+from .load_trajectories import _count_rows, _load_tracks
+from .time_axis import as_time_axis
+from .track_files import _find_headers, detect_compression
+
+logger = logging.getLogger(__name__)
+
+
+class TrackFileTail:
+    """
+    Incrementally load a TempestExtremes track file that is still being
+    written to, for example by StitchNodes during a forecast cycle. Each call
+    to `read()` parses only the data that has been appended since the
+    previous call, along with the track that was still being written at the
+    time, and returns just the tracks that are new or have been extended.
+
+    A track is complete once it has as many rows as the length in its header.
+    Lines are only read once their terminating newline has been written. If
+    the file becomes shorter than the data already read then it is assumed to
+    have been replaced and is read again from the start.
+
+    :param str tracked_file: The path to the file produced by TempestExtremes.
+        Compressed files are not supported.
+    :param nc_file: The path to a netCDF file that the tracking was run on, or
+        a time axis describing it.
+    :type nc_file: str or :py:obj:`tempest_helper.TimeAxis`
+    :param int time_period: The time period in hours between time points in the
+        data.
+    :param dict column_names: the names of the column variables within the
+        tracked_file, to be used as storm[] keys
+    """
+
+    def __init__(self, tracked_file, nc_file, time_period, column_names):
+        self.tracked_file = tracked_file
+        self.time_axis = as_time_axis(nc_file)
+        self.time_period = time_period
+        self.column_names = column_names
+        # the byte offset of the first track that is not yet complete
+        self.offset = 0
+        # the number of complete tracks before offset
+        self.n_complete = 0
+        # the number of bytes of the incomplete track already returned
+        self._pending_bytes = 0
+
+    def read(self):
+        """
+        Load the tracks that are new or have been extended since the last
+        call.
+
+        :returns: The number of each track in the file, counting from zero,
+            and its trajectory. An extended track has the same number as when
+            it was previously returned and contains all of its points so far.
+        :rtype: dict
+        """
+        compression = detect_compression(self.tracked_file)
+        if compression is not None:
+            raise ValueError(
+                f"{self.tracked_file} is {compression} compressed and so cannot "
+                f"be read incrementally"
+            )
+        file_size = os.path.getsize(self.tracked_file)
+        if file_size < self.offset + self._pending_bytes:
+            logger.warning(
+                f"{self.tracked_file} is shorter than when it was last read and "
+                f"so is being read from the start"
+            )
+            self.offset = 0
+            self.n_complete = 0
+            self._pending_bytes = 0
+        with open(self.tracked_file, "rb") as file_handle:
+            file_handle.seek(self.offset)
+            text = file_handle.read(file_size - self.offset)
+        # ignore any line that is only partly written
+        text = text[: text.rfind(b"\n") + 1]
+        if len(text) <= self._pending_bytes:
+            return {}
+        header_starts, header_ends = _find_headers(text)
+        if not header_starts:
+            return {}
+
+        last_start = header_starts[-1]
+        last_end = header_ends[-1]
+        last_rows = _count_rows(text[last_end:])
+        complete = last_rows >= int(text[last_start:last_end].split()[1])
+        end = len(text) if complete else last_start
+        # don't return a track that has no points yet
+        parse_end = len(text) if last_rows else end
+        first = header_starts[0]
+        storms = _load_tracks(
+            text[first:parse_end],
+            self.column_names,
+            self.time_axis,
+            self.time_period,
+        )
+        tracks = {
+            self.n_complete + number: storm for number, storm in enumerate(storms)
+        }
+        # the track that was incomplete at the last read may not have changed
+        first_size = header_starts[1] if len(header_starts) > 1 else len(text)
+        if self._pending_bytes and first_size == self._pending_bytes:
+            tracks.pop(self.n_complete, None)
+        self.n_complete += len(header_starts) if complete else len(header_starts) - 1
+        self.offset += end
+        self._pending_bytes = 0 if complete else len(text) - end
+        logger.debug(
+            f"Read {len(tracks)} new or extended tracks from {self.tracked_file}"
+        )
+        return tracks
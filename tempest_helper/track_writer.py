@@ -0,0 +1,224 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import logging
+from itertools import chain
+
+import numpy as np
+
+from .track_files import CHUNK_SIZE, open_track_file
+from .trajectory_set import TrajectorySet, _ranges
+
+logger = logging.getLogger(__name__)
+
+# The layout of the lines in a TempestExtremes track file, as %-format strings
+HEADER_FORMAT = "start   %s      %s    %s       %s      %s\n"
+ROW_START_FORMAT = "        %s     %s     %.6f      %.6f   "
+ROW_END_FORMAT = "   %s    %s       %s      %s \n"
+VARIABLE_FORMAT = "    %.6e"
+PROFILE_VALUE_FORMAT = "%.6e"
+
+# The names of the columns at the start and end of each row
+ROW_START_NAMES = ("grid_x", "grid_y", "lon", "lat")
+ROW_END_NAMES = ("year", "month", "day", "hour")
+
+# The approximate number of rows formatted at a time
+ROWS_PER_BLOCK = 2**16
+
+
+class TrackFileWriter:
+    """
+    Write trajectories to a file in the TempestExtremes track file format,
+    producing the same lines as `write_track_line()`. The values of many
+    tracks are formatted in a single operation and the output is written in
+    large blocks, which may be compressed with gzip, bzip2 or xz depending on
+    the extension of the file. The writer should be closed after use, or used
+    as a context manager.
+
+    :param str path: The path to the file to write.
+    :param dict column_names: the names of the column variables within the
+        tracked file, to be used as storm[] keys
+    :param int buffer_size: The number of bytes to collect before writing them
+        to the file.
+    """
+
+    def __init__(self, path, column_names, buffer_size=CHUNK_SIZE):
+        self.path = path
+        self.column_names = column_names
+        self.buffer_size = buffer_size
+        self.variables = _variable_names(column_names)
+        self._file_handle = open_track_file(path, "wb")
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, trajectories):
+        """
+        Write some trajectories to the end of the file. All of the points of
+        each track are written, including any that were added to fill gaps,
+        and the header line of each track gives the number of points written
+        so that the file can be read back.
+
+        :param trajectories: The trajectories to write.
+        :type trajectories: list or :py:obj:`tempest_helper.TrajectorySet`
+        """
+        if len(trajectories) == 0:
+            return
+        trajectory_set = TrajectorySet.from_storms(trajectories)
+        missing = [
+            name
+            for name in ROW_START_NAMES + tuple(self.variables) + ROW_END_NAMES
+            if name not in trajectory_set.columns
+        ]
+        if missing:
+            raise ValueError(
+                f"The trajectories do not have the columns {', '.join(missing)}"
+            )
+        # split the tracks into blocks of roughly ROWS_PER_BLOCK rows
+        block = np.cumsum(trajectory_set.num_pts) // ROWS_PER_BLOCK
+        ends = np.flatnonzero(np.diff(block)) + 1
+        starts = [0] + ends.tolist()
+        for start, end in zip(starts, ends.tolist() + [len(trajectory_set)]):
+            self._write_bytes(
+                _format_tracks(trajectory_set, self.variables, start, end)
+            )
+
+    def flush(self):
+        """Write any buffered output to the file."""
+        if self._buffer:
+            self._file_handle.write(b"".join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+
+    def close(self):
+        """Write any buffered output and close the file."""
+        if self._file_handle.closed:
+            return
+        self.flush()
+        self._file_handle.close()
+
+    def _write_bytes(self, text):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _format_rows(storm, n_rows, variables):
+    """
+    Format the first rows of a storm as lines of a TempestExtremes track
+    file.
+
+    :param dict storm: Storm dictionary.
+    :param int n_rows: The number of rows to format.
+    :param list variables: The names of the variable columns in the order
+        that they are written.
+    :returns: The lines.
+    :rtype: list
+    """
+    columns = [storm[name][:n_rows] for name in ROW_START_NAMES]
+    n_bins = []
+    for name in variables:
+        values = storm[name][:n_rows]
+        if n_rows and isinstance(values[0], list):
+            n_bins.append(len(values[0]))
+            columns.extend(zip(*values))
+        else:
+            n_bins.append(None)
+            columns.append(values)
+    columns.extend(storm[name][:n_rows] for name in ROW_END_NAMES)
+    row_format = _row_format(n_bins)
+    return [row_format % row for row in zip(*columns)]
+
+
+def _format_tracks(trajectory_set, variables, start, end):
+    """
+    Format some of the tracks in a trajectory set as the contents of a
+    TempestExtremes track file.
+
+    :param trajectory_set: The trajectories.
+    :type trajectory_set: :py:obj:`tempest_helper.TrajectorySet`
+    :param list variables: The names of the variable columns in the order
+        that they are written.
+    :param int start: The number of the first track to format.
+    :param int end: The number after the number of the last track to format.
+    :returns: The formatted tracks.
+    :rtype: bytes
+    """
+    num_pts = trajectory_set.num_pts[start:end].tolist()
+    points = _ranges(trajectory_set.first_pt[start:end], num_pts)
+    columns = []
+    n_bins = []
+    for name in ROW_START_NAMES + tuple(variables) + ROW_END_NAMES:
+        values = trajectory_set.columns[name][points]
+        if isinstance(values, np.ma.MaskedArray):
+            values = values.filled()
+        if values.ndim == 2:
+            n_bins.append(values.shape[1])
+            columns.extend(values.T.tolist())
+        else:
+            n_bins.append(None)
+            columns.append(values.tolist())
+    n_start = len(ROW_START_NAMES)
+    n_end = len(ROW_END_NAMES)
+    row_format = _row_format(n_bins[n_start:-n_end])
+    n_columns = len(columns)
+    row_values = list(chain.from_iterable(zip(*columns)))
+    dates = columns[-n_end:]
+
+    text_format = []
+    values = []
+    offset = 0
+    for count in num_pts:
+        if count == 0:
+            # a header without any lines is not written
+            continue
+        text_format.append(HEADER_FORMAT + row_format * count)
+        values.append(count)
+        values.extend(date[offset] for date in dates)
+        first = offset * n_columns
+        offset += count
+        last = offset * n_columns
+        values.extend(row_values[first:last])
+    return ("".join(text_format) % tuple(values)).encode()
+
+
+def _row_format(n_bins):
+    """
+    Make the %-format string for a row of a track file.
+
+    :param list n_bins: The number of bins in each variable, or None for the
+        variables that are not profiles.
+    :returns: The format string.
+    :rtype: str
+    """
+    variable_formats = []
+    for bins in n_bins:
+        if bins is None:
+            variable_formats.append(VARIABLE_FORMAT)
+        else:
+            variable_formats.append(
+                '    "[' + ",".join([PROFILE_VALUE_FORMAT] * bins) + ']"'
+            )
+    return ROW_START_FORMAT + "".join(variable_formats) + ROW_END_FORMAT
+
+
+def _variable_names(column_names):
+    """
+    Find the names of the variable columns from the names of all of the
+    columns.
+
+    :param dict column_names: The names of the columns and their position in
+        each row.
+    :returns: The names of the variable columns in the order that they are
+        written.
+    :rtype: list
+    """
+    ordered = sorted(column_names, key=column_names.get)
+    n_start = len(ROW_START_NAMES)
+    n_end = len(ROW_END_NAMES)
+    return ordered[n_start:-n_end]
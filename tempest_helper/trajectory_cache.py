@@ -0,0 +1,272 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import zipfile
+
+from .trajectory_set import TrajectorySet
+
+logger = logging.getLogger(__name__)
+
+# Increase this if the parsing changes so that existing cache entries are
+# no longer used
+CACHE_VERSION = 1
+
+# The default maximum total size of the cache in bytes
+MAX_CACHE_SIZE = 2**30
+
+# The suffix of the files in the cache directory
+CACHE_SUFFIX = ".npz"
+
+# The name of the file in the cache directory that records the hash of each
+# track file, so that track files that haven't changed aren't hashed again
+FILE_HASHES_NAME = "file_hashes.json"
+
+# The errors raised when loading an entry that has been truncated or
+# corrupted
+_CORRUPT_ENTRY_ERRORS = (zipfile.BadZipFile, ValueError, EOFError, KeyError)
+
+# The number of bytes read at a time when hashing a track file
+_HASH_CHUNK_SIZE = 2**20
+
+
+class TrajectoryCache:
+    """
+    An on-disk cache of loaded trajectories. Each entry is a
+    :py:obj:`tempest_helper.TrajectorySet` saved in NumPy's binary `.npz`
+    format and is keyed by a hash of the contents of the track file, the time
+    axis, the column names and any selection of variables or tracks, so that
+    an entry is never used if any of these change. When the total size of the
+    entries exceeds `max_size` the least recently used entries are deleted.
+    The hash of each track file is recorded in the cache directory along with
+    the file's size and modification time, and the file is only hashed again
+    if either of these change, so loading a file that is in the cache doesn't
+    need to read it.
+
+    :param str directory: The directory to store the cache entries in, which
+        is created if it does not exist.
+    :param int max_size: The maximum total size of the entries in bytes.
+    """
+
+    def __init__(self, directory, max_size=MAX_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+        # the last read copy of the hashes recorded in the cache directory
+        self._file_hashes = {}
+
+    def key(
+        self,
+        tracked_file,
+        time_axis,
+        time_period,
+        column_names,
+        variables=None,
+        track_filter=None,
+    ):
+        """
+        Calculate the cache key for loading a track file.
+
+        :param str tracked_file: The path to the file produced by
+            TempestExtremes.
+        :param time_axis: The time axis of the data.
+        :type time_axis: :py:obj:`tempest_helper.TimeAxis`
+        :param int time_period: The time period in hours between time points in
+            the data.
+        :param dict column_names: the names of the column variables within the
+            tracked_file
+        :param list variables: The names of the variables that are loaded.
+        :param track_filter: The criteria for the tracks that are loaded.
+        :type track_filter: :py:obj:`tempest_helper.TrackFilter`
+        :returns: The key.
+        :rtype: str
+        """
+        key_hash = hashlib.blake2b(digest_size=20)
+        key_hash.update(self._hash_file(tracked_file).encode())
+        key_hash.update(
+            repr(
+                (
+                    CACHE_VERSION,
+                    str(time_axis.origin),
+                    time_axis.calendar,
+                    time_axis.nx,
+                    time_period,
+                    sorted(column_names.items()),
+                    None if variables is None else sorted(variables),
+                    repr(track_filter),
+                )
+            ).encode()
+        )
+        return key_hash.hexdigest()
+
+    def load(self, key):
+        """
+        Load an entry from the cache, marking it as recently used.
+
+        :param str key: The cache key.
+        :returns: The cached trajectories, or None if there is no entry.
+        :rtype: :py:obj:`tempest_helper.TrajectorySet`
+        """
+        path = self._path(key)
+        try:
+            trajectory_set = TrajectorySet.load(path)
+        except FileNotFoundError:
+            logger.debug(f"Trajectory cache miss {key}")
+            return None
+        except _CORRUPT_ENTRY_ERRORS as error:
+            logger.warning(f"Removing corrupt trajectory cache entry {path}: {error}")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # another process has evicted the entry
+            pass
+        logger.debug(f"Trajectory cache hit {key}")
+        return trajectory_set
+
+    def save(self, key, trajectory_set):
+        """
+        Add an entry to the cache and then evict the least recently used
+        entries if the cache is larger than its maximum size.
+
+        :param str key: The cache key.
+        :param trajectory_set: The trajectories to cache.
+        :type trajectory_set: :py:obj:`tempest_helper.TrajectorySet`
+        """
+        self._replace(self._path(key), trajectory_set.save)
+        logger.debug(f"Saved trajectory cache entry {key}")
+        self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the total size of the
+        cache is no more than its maximum size.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(CACHE_SUFFIX):
+                try:
+                    entry_stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry_stat.st_mtime_ns, entry_stat.st_size, entry))
+        entries.sort(key=lambda item: item[0])
+        total_size = sum(size for _mtime, size, _entry in entries)
+        for _mtime, size, entry in entries:
+            if total_size <= self.max_size:
+                break
+            logger.debug(f"Evicting trajectory cache entry {entry.name}")
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def clear(self):
+        """Delete all of the entries in the cache."""
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(CACHE_SUFFIX) or entry.name == FILE_HASHES_NAME:
+                os.remove(entry.path)
+        self._file_hashes = {}
+
+    def _path(self, key):
+        """
+        The path of the file that holds an entry.
+
+        :param str key: The cache key.
+        :returns: The path.
+        :rtype: str
+        """
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def _replace(self, path, write):
+        """
+        Write a file in the cache directory to a temporary file first and then
+        rename it, so that other processes never see it partially written.
+
+        :param str path: The path to the file.
+        :param write: The function that writes the contents of the file to
+            the open binary file object that it is passed.
+        """
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as file_handle:
+                write(file_handle)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def _hash_file(self, tracked_file):
+        """
+        Hash the contents of a track file. The hash is recorded in the cache
+        directory and is used until the file's size or modification time
+        changes.
+
+        :param str tracked_file: The path to the track file.
+        :returns: The hexadecimal digest of the file's contents.
+        :rtype: str
+        """
+        file_stat = os.stat(tracked_file)
+        path = os.path.abspath(tracked_file)
+        file_id = [file_stat.st_size, file_stat.st_mtime_ns]
+        if path not in self._file_hashes or self._file_hashes[path][0] != file_id:
+            self._file_hashes = self._read_file_hashes()
+        if path in self._file_hashes and self._file_hashes[path][0] == file_id:
+            return self._file_hashes[path][1]
+
+        file_hash = hashlib.blake2b(digest_size=20)
+        with open(tracked_file, "rb") as file_handle:
+            for chunk in iter(lambda: file_handle.read(_HASH_CHUNK_SIZE), b""):
+                file_hash.update(chunk)
+        digest = file_hash.hexdigest()
+        # re-read the hashes in case another process has added some
+        file_hashes = self._read_file_hashes()
+        file_hashes[path] = [file_id, digest]
+        self._replace(
+            os.path.join(self.directory, FILE_HASHES_NAME),
+            lambda file_handle: file_handle.write(json.dumps(file_hashes).encode()),
+        )
+        self._file_hashes = file_hashes
+        return digest
+
+    def _read_file_hashes(self):
+        """
+        Read the recorded hashes of the track files.
+
+        :returns: The size and modification time and the hash of each track
+            file, keyed by its absolute path.
+        :rtype: dict
+        """
+        try:
+            with open(os.path.join(self.directory, FILE_HASHES_NAME)) as file_handle:
+                return json.load(file_handle)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning(
+                f"Ignoring the corrupt {FILE_HASHES_NAME} in {self.directory}"
+            )
+            return {}
+
+
+def as_trajectory_cache(cache):
+    """
+    Get a `TrajectoryCache` from either an existing cache or the path to its
+    directory.
+
+    :param cache: The cache or its directory.
+    :type cache: str or :py:obj:`tempest_helper.TrajectoryCache`
+    :returns: The cache.
+    :rtype: :py:obj:`tempest_helper.TrajectoryCache`
+    """
+    if isinstance(cache, TrajectoryCache):
+        return cache
+    return TrajectoryCache(cache)
@@ -1,12 +1,34 @@
 # (C) British Crown Copyright 2022, Met Office.
 # Please see LICENSE for license details.
-import datetime
 import logging
-from shutil import copyfile
 
 import cftime
 import numpy as np
 
+from . import calendars
+from .time_axis import as_time_axis
+from .track_files import (
+    CHUNK_SIZE,
+    _find_headers,
+    _iter_track_blocks,
+    copy_track_file,
+    open_track_file,
+)
+from .track_writer import HEADER_FORMAT, _format_rows, _variable_names
+from .trajectory_matching import (
+    TimeIntervalIndex,
+    great_circle_distance,
+    match_storms,
+    time_keys,
+)
+from .trajectory_set import (
+    COORDINATE_DTYPES,
+    TrajectorySet,
+    _masked_profile,
+    _offsets,
+    _ranges,
+)
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,8 +51,9 @@ def convert_date_to_step(cube, year, month, day, hour, time_period):
     Calculate the step number, with the first time in a file have a step number
     of one. All calendars are handled.
 
-    :param cube: A cube loaded from a data file from the current period.
-    :type cube: :py:obj:`iris.cube.Cube`
+    :param cube: A cube loaded from a data file from the current period, or
+        a time axis describing it.
+    :type cube: :py:obj:`iris.cube.Cube` or :py:obj:`tempest_helper.TimeAxis`
     :param int year: The current year.
     :param int month: The current month.
     :param int day: The current day of month.
@@ -40,13 +63,38 @@ def convert_date_to_step(cube, year, month, day, hour, time_period):
     :returns: The time index at the specified time point.
     :rtype: int
     """
-    calendar = cube.coord("time").units.calendar
+    return int(convert_dates_to_steps(cube, year, month, day, hour, time_period))
+
 
-    current_datetime = DATETIME_TYPES[calendar](year, month, day, hour)
-    first_point = cube.coord("time").units.num2date(cube.coord("time").points[0])
-    time_delta = current_datetime - first_point
-    seconds_in_hour = 60**2
-    return round(time_delta.total_seconds() / (time_period * seconds_in_hour)) + 1
+def convert_dates_to_steps(cube, year, month, day, hour, time_period):
+    """
+    Calculate the step number of many points at once, with the first time in a
+    file having a step number of one. This is the vectorised equivalent of
+    `convert_date_to_step()` and all calendars are handled. The dates are
+    converted with integer arithmetic rather than by creating a `cftime`
+    datetime for each point.
+
+    :param cube: A cube loaded from a data file from the current period, or
+        a time axis describing it.
+    :type cube: :py:obj:`iris.cube.Cube` or :py:obj:`tempest_helper.TimeAxis`
+    :param numpy.ndarray year: The year of each point.
+    :param numpy.ndarray month: The month of each point.
+    :param numpy.ndarray day: The day of month of each point.
+    :param numpy.ndarray hour: The hour of each point.
+    :param int time_period: The time period in hours between time points in the
+        data.
+    :returns: The time index of each point.
+    :rtype: numpy.ndarray
+    """
+    time_axis = as_time_axis(cube)
+    offset = calendars.microseconds_since(
+        time_axis.calendar, time_axis.origin, year, month, day, hour
+    )
+    period = int(time_period * calendars.MICROSECONDS_IN_HOUR)
+    steps, remainder = np.divmod(offset, period)
+    # round to the nearest step, with halves rounded to even like round()
+    round_up = (2 * remainder > period) | ((2 * remainder == period) & (steps % 2 == 1))
+    return steps + round_up + 1
 
 
 def fill_trajectory_gaps(
@@ -69,20 +117,24 @@ def fill_trajectory_gaps(
         degrees.
     :param int grid_x: The i index of the current point in the storm
     :param int grid_y: The j index of the current point in the storm
-    :param cube: A cube loaded from a data file from the current period.
-    :type cube: :py:obj:`iris.cube.Cube`
+    :param cube: A cube loaded from a data file from the current period, or
+        a time axis describing it.
+    :type cube: :py:obj:`iris.cube.Cube` or :py:obj:`tempest_helper.TimeAxis`
     :param int time_period: The time period in hours between time points in the
         data.
     :param dict new_var: The other variables contained in the storm at the
         current point.
     :param int miss_val: value used for missing data
+    :raises ValueError: If the number of points along the longitude axis of
+        the data isn't known.
     """
+    time_axis = as_time_axis(cube)
+    nx = _grid_nx(time_axis)
     gap_length = step - storm["step"][-1]
     # Using technique at https://stackoverflow.com/a/14498790 to handle
     # longitudes wrapping around 0/360
     dlon = (((lon - storm["lon"][-1]) + 180) % 360 - 180) / gap_length
     dlat = (lat - storm["lat"][-1]) / gap_length
-    nx = cube.shape[-1]
     dx = (grid_x - storm["grid_x"][-1]) / gap_length
     dy = (grid_y - storm["grid_y"][-1]) / gap_length
     for gap_index in range(1, gap_length):
@@ -97,7 +149,7 @@ def fill_trajectory_gaps(
         storm["step"].append(storm["step"][-1] + 1)
         # interpolate the time too
         step_time_components = _calculate_gap_time(
-            cube,
+            time_axis,
             storm["year"][-1],
             storm["month"][-1],
             storm["day"][-1],
@@ -126,12 +178,195 @@ def fill_trajectory_gaps(
                 storm[var].append(var1)
 
 
+def fill_trajectory_set_gaps(trajectory_set, cube, time_period, miss_val=-99):
+    """
+    Fill all of the gaps in all of the trajectories in a `TrajectorySet` at
+    once. This is the vectorised equivalent of calling
+    `fill_trajectory_gaps()` for each gap and gives identical values. The
+    positions, times and variables are linearly interpolated across each gap,
+    with longitudes and the grid x index wrapping around, and profile
+    variables are set to `miss_val` and masked at the added points. The
+    masked profile values have `miss_val` as their fill value, so that it is
+    also the value of these points in storm dictionaries and when the
+    trajectories are written to a file.
+
+    The interpolation loops over the position within a gap, rather than
+    over the gaps, and so the number of iterations is just the length of the
+    longest gap.
+
+    :param trajectory_set: The trajectories, which must contain a step
+        column.
+    :type trajectory_set: :py:obj:`tempest_helper.TrajectorySet`
+    :param cube: A cube loaded from a data file from the current period, or
+        a time axis describing it.
+    :type cube: :py:obj:`iris.cube.Cube` or :py:obj:`tempest_helper.TimeAxis`
+    :param int time_period: The time period in hours between time points in the
+        data.
+    :param int miss_val: value used for missing profile data
+    :returns: The trajectories with their gaps filled.
+    :rtype: :py:obj:`tempest_helper.TrajectorySet`
+    :raises ValueError: If there are gaps but the number of points along the
+        longitude axis of the data isn't known.
+    """
+    time_axis = as_time_axis(cube)
+    columns = trajectory_set.columns
+    profiles = trajectory_set.profiles
+    steps = columns["step"].astype(np.int64)
+    track = trajectory_set.track_index
+    step_diff = np.diff(steps)
+    # the index of the last point before each gap
+    last = np.nonzero((step_diff > 1) & (track[1:] == track[:-1]))[0]
+    if len(last) == 0:
+        filled_columns = dict(columns)
+        for name in profiles:
+            filled_columns[name] = _masked_profile(
+                np.ma.getdata(columns[name]),
+                np.ma.getmaskarray(columns[name]),
+                miss_val,
+            )
+        return TrajectorySet(
+            filled_columns,
+            trajectory_set.first_pt,
+            trajectory_set.num_pts,
+            trajectory_set.length,
+        )
+    nx = _grid_nx(time_axis)
+    after = last + 1
+    gap_length = step_diff[last]
+    n_new = gap_length - 1
+
+    # the positions of the existing and new points in the filled columns
+    extra = np.zeros(trajectory_set.n_points, dtype=np.int64)
+    extra[last] = n_new
+    old_index = np.arange(trajectory_set.n_points, dtype=np.int64)
+    old_index[1:] += np.cumsum(extra)[:-1]
+    gap_start = old_index[last] + 1
+    new_index = _ranges(gap_start, n_new)
+    n_points = trajectory_set.n_points + int(n_new.sum())
+    # the number of steps since the point before the gap of each new point
+    new_offset = _ranges(np.ones(len(last), dtype=np.int64), n_new)
+    new_start = _offsets(n_new)
+
+    def interpolate(name, delta, update):
+        # Add the increment one point at a time, as fill_trajectory_gaps()
+        # does, so that the rounding is identical
+        values = columns[name][last].astype(np.float64)
+        new_values = np.empty(len(new_index), dtype=np.float64)
+        for offset in range(1, int(n_new.max()) + 1):
+            active = np.nonzero(n_new >= offset)[0]
+            values[active] = update(values[active], delta[active])
+            new_values[new_start[active] + offset - 1] = values[active]
+        return new_values
+
+    lon = columns["lon"]
+    dlon = (((lon[after] - lon[last]) + 180) % 360 - 180) / gap_length
+    dlat = (columns["lat"][after] - columns["lat"][last]) / gap_length
+    dx = (
+        columns["grid_x"][after].astype(np.int64)
+        - columns["grid_x"][last].astype(np.int64)
+    ) / gap_length
+    dy = (
+        columns["grid_y"][after].astype(np.int64)
+        - columns["grid_y"][last].astype(np.int64)
+    ) / gap_length
+    new_columns = {
+        "lon": interpolate("lon", dlon, lambda value, delta: (value + delta) % 360),
+        "lat": interpolate("lat", dlat, lambda value, delta: value + delta),
+        "grid_x": interpolate(
+            "grid_x", dx, lambda value, delta: np.trunc((value + delta) % nx)
+        ),
+        "grid_y": interpolate(
+            "grid_y", dy, lambda value, delta: np.trunc(value + delta)
+        ),
+        "step": np.repeat(steps[last], n_new) + new_offset,
+    }
+    new_dates = _add_hours(
+        time_axis,
+        np.repeat(columns["year"][last], n_new),
+        np.repeat(columns["month"][last], n_new),
+        np.repeat(columns["day"][last], n_new),
+        np.repeat(columns["hour"][last], n_new),
+        new_offset * time_period,
+    )
+    for name, values in zip(("year", "month", "day", "hour"), new_dates):
+        new_columns[name] = values
+    for name, values in columns.items():
+        if name in new_columns or name in profiles:
+            continue
+        delta = (values[after] - values[last]) / gap_length
+        new_columns[name] = interpolate(name, delta, lambda value, delta: value + delta)
+
+    filled_columns = {}
+    for name, values in columns.items():
+        filled = np.empty((n_points,) + values.shape[1:], dtype=values.dtype)
+        filled[old_index] = np.ma.getdata(values)
+        if name in profiles:
+            filled[new_index] = miss_val
+            mask = np.zeros(filled.shape, dtype=bool)
+            mask[old_index] = np.ma.getmaskarray(values)
+            mask[new_index] = True
+            filled = _masked_profile(filled, mask, miss_val)
+        else:
+            filled[new_index] = new_columns[name].astype(
+                COORDINATE_DTYPES.get(name, values.dtype)
+            )
+        filled_columns[name] = filled
+
+    num_pts = trajectory_set.num_pts + np.bincount(
+        track[last], weights=n_new, minlength=len(trajectory_set)
+    ).astype(np.int64)
+    return TrajectorySet(
+        filled_columns, _offsets(num_pts), num_pts, trajectory_set.length
+    )
+
+
+def _grid_nx(time_axis):
+    """
+    Get the number of points along the longitude axis of the data, which is
+    needed to wrap the grid x index of the points that fill a gap.
+
+    :param time_axis: The time axis of the data.
+    :type time_axis: :py:obj:`tempest_helper.TimeAxis`
+    :returns: The number of points along the longitude axis.
+    :rtype: int
+    :raises ValueError: If the time axis doesn't give the number of points.
+    """
+    if time_axis.nx is None:
+        raise ValueError(
+            "The gaps in trajectories can only be filled if the number of "
+            "points along the longitude axis of the data is known, but the "
+            f"nx of {time_axis!r} is None"
+        )
+    return time_axis.nx
+
+
+def _add_hours(cube, year, month, day, hour, hours):
+    """
+    Add a number of hours to many dates at once in the calendar of the data.
+
+    :param cube: A cube loaded from a data file from the current period, or
+        a time axis describing it.
+    :type cube: :py:obj:`iris.cube.Cube` or :py:obj:`tempest_helper.TimeAxis`
+    :param numpy.ndarray year: The year of each date.
+    :param numpy.ndarray month: The month of each date.
+    :param numpy.ndarray day: The day of month of each date.
+    :param numpy.ndarray hour: The hour of each date.
+    :param numpy.ndarray hours: The number of hours to add to each date.
+    :returns: The year, month, day and hour of each new date.
+    :rtype: tuple
+    """
+    calendar = as_time_axis(cube).calendar
+    new_hours = calendars.date_to_hours(calendar, year, month, day, hour) + hours
+    return calendars.hours_to_date(calendar, new_hours)
+
+
 def _calculate_gap_time(cube, year, month, day, hour, time_period):
     """
     Calculate the date and time for the next interpolated time point.
 
-    :param iris.cube.Cube cube: A cube loaded from a data file from the
-        current period.
+    :param cube: A cube loaded from a data file from the current period, or
+        a time axis describing it.
+    :type cube: :py:obj:`iris.cube.Cube` or :py:obj:`tempest_helper.TimeAxis`
     :param int year: The year of the last time point.
     :param int month: The month of the last time point.
     :param int day: The day of the month of the last time point.
@@ -141,18 +376,9 @@ def _calculate_gap_time(cube, year, month, day, hour, time_period):
     :returns: The year, month, day and hour of the interpolated time point.
     :rtype: tuple
     """
-    calendar = cube.coord("time").units.calendar
-
-    last_datetime = DATETIME_TYPES[calendar](year, month, day, hour)
-    time_delta = datetime.timedelta(hours=time_period)
-    this_datetime = last_datetime + time_delta
-    this_datetime_tuple = (
-        this_datetime.year,
-        this_datetime.month,
-        this_datetime.day,
-        this_datetime.hour,
+    return tuple(
+        int(value) for value in _add_hours(cube, year, month, day, hour, time_period)
     )
-    return this_datetime_tuple
 
 
 def _storm_dates(storm):
@@ -176,34 +402,42 @@ def _storm_dates(storm):
 
 def storms_overlap_in_time(storm_x, storms_y):
     """
-    Find the subset of list storms_y that have some overlap in time with storm_x
+    Find the subset of list storms_y that have some overlap in time with storm_x,
+    which is that they have at least one point at the same time. The storms
+    whose first and last times overlap those of storm_x are found with a
+    `tempest_helper.TimeIntervalIndex` and then only these are checked for a
+    time in common, which they may not have if either storm has gaps.
 
     :param dict storm_x: Storm dictionary.
     :param list storms_y: List of storm dictionaries
     :returns: The list of storms that overlap in time with storm_x.
     :rtype: list
     """
+    start, end = time_keys([storm_x])
+    index = TimeIntervalIndex.from_storms(storms_y)
     set_x = set(_storm_dates(storm_x))
     storms_overlap = []
-    for storm in storms_y:
-        set_y = set(_storm_dates(storm))
-        overlap = set_x.intersection(set_y)
-        if len(overlap) >= 1:
-            storms_overlap.append(storm)
-
+    for number in index.overlapping(start[0], end[0]):
+        if not set_x.isdisjoint(_storm_dates(storms_y[number])):
+            storms_overlap.append(storms_y[number])
     return storms_overlap
 
 
-def storm_overlap_in_space(storm_c, storms_y, distance_threshold=0.5):
+def storm_overlap_in_space(storm_c, storms_y, distance_threshold=0.5, units="degrees"):
     """
     Find if any of the storms that have any overlap in space with storm_c. Expect at
     most one.
-    There is some overlap in time already determined.
+    There is some overlap in time already determined. The distance between the
+    storms is measured along a great circle at their first time in common. To
+    find the points of many storms that are close use a
+    `tempest_helper.PointIndex`.
 
     :param dict storm_c: Storm dictionary.
     :param list storms_y: List of storm dictionaries which overlap storm_c in time
-    :param float distance_threshold: maximum distance (degrees) for storms to
+    :param float distance_threshold: maximum distance for storms to
        be apart but identified as overlapping in space
+    :param str units: the units of distance_threshold, either "degrees" of arc
+       or "km"
     :returns: Either None, or a dictionary including storm information about the
        overlap.
     :rtype: None or dict
@@ -215,6 +449,9 @@ def storm_overlap_in_space(storm_c, storms_y, distance_threshold=0.5):
         set_p = _storm_dates(storm_p)
         # overlapping times
         overlap = sorted(list(set(set_c).intersection(set_p)))
+        if not overlap:
+            # the storms are interleaved but have no times in common
+            continue
 
         time_c = set_c.index(overlap[0])
         time_p = set_p.index(overlap[0])
@@ -226,9 +463,10 @@ def storm_overlap_in_space(storm_c, storms_y, distance_threshold=0.5):
         it = 0
         timec = time_c + it
         timep = time_p + it
-        dist_lat = np.abs(lat_c[timec] - lat_p[timep])
-        dist_lon = np.abs(lon_c[timec] - lon_p[timep])
-        if dist_lat < distance_threshold and dist_lon < distance_threshold:
+        distance = great_circle_distance(
+            lon_c[timec], lat_c[timec], lon_p[timep], lat_p[timep], units
+        )
+        if distance < distance_threshold:
             n_pts_overlap += 1
 
         # now find out how much time-space overlap
@@ -286,60 +524,14 @@ def write_track_line(storm, no_lines, new_length, column_names):
         storm the second is a list of lines to be written to the track txt file
     :rtype: str, list
     """
-    track_line_date = (
-        "start   {}      {}    {}       {}      {}".format(
-            str(new_length),
-            str(storm["year"][0]),
-            str(storm["month"][0]),
-            str(storm["day"][0]),
-            str(storm["hour"][0]),
-        )
-        + "\n"
-    )
-
-    # need to derive the ordered list of variables to write to correct columns
-    # formatting is different for position values and variables
-    reversed_name_key = dict(map(reversed, column_names.items()))
-    column_ordered = []
-    for iv in range(len(column_names)):
-        column_ordered.append(reversed_name_key[iv])
-
-    track_lines = []
-    track_line_start = "        {}     {}     {}      {}   "
-    track_line_end = "   {}    {}       {}      {} \n"
-
-    logger.debug(
-        f"no_lines, len(storm[grid_x]), len(storm[year])",
-        f"{no_lines} {len(storm['grid_x'])} {len(storm['year'])} ",
-        f"{storm['year']} {storm['month']} {storm['day']} {storm['hour']}",
+    track_line_date = HEADER_FORMAT % (
+        new_length,
+        storm["year"][0],
+        storm["month"][0],
+        storm["day"][0],
+        storm["hour"][0],
     )
-    for it in range(no_lines):
-        grid_x = str(storm["grid_x"][it])
-        grid_y = str(storm["grid_y"][it])
-        lat = "{:.6f}".format(float(storm["lat"][it]))
-        lon = "{:.6f}".format(float(storm["lon"][it]))
-        year = str(storm["year"][it])
-        month = str(storm["month"][it])
-        day = str(storm["day"][it])
-        hour = str(storm["hour"][it])
-
-        line_start = track_line_start.format(grid_x, grid_y, lon, lat)
-        line_end = track_line_end.format(year, month, day, hour)
-        line_vars = ""
-        for var in column_ordered[4:-4]:
-            if "list" in str(type(storm[var][it])):
-                logger.debug(f"storm[var][it] {var} {storm[var][it]}")
-                line_list = []
-                for i in range(len(storm[var][it])):
-                    val = "{:.6e}".format((float(storm[var][it][i])))
-                    line_list.append(val)
-                line_list = '"[' + ",".join(line_list) + ']"'
-                line_vars += "    " + line_list
-                logger.debug(f"line_list {line_list}")
-            else:
-                line_vars += "    " + "{:.6e}".format((float(storm[var][it])))
-        track_lines.append(line_start + line_vars + line_end)
-
+    track_lines = _format_rows(storm, no_lines, _variable_names(column_names))
     return track_line_date, track_lines
 
 
@@ -355,7 +547,9 @@ def remove_duplicates_from_track_files(
     """
     Rewrite the .txt track files, removing the matching storms from the
     previous timestep which have been found in the current timestep and
-    adding them to this current timestep
+    adding them to this current timestep. Any of the files may be compressed
+    with gzip, bzip2 or xz, which is detected from the contents of the input
+    files and the extension of the output files.
 
     :param str tracked_file_Tm1: The path to the track file from the previous timestep.
     :param str tracked_file_T: The path to the track file from the current timestep.
@@ -367,115 +561,240 @@ def remove_duplicates_from_track_files(
         with a later time
     :param dict column_names: the keys for the storm columns in the output file
     """
-    header_delim = "start"
-
     if len(storms_match) == 0:
-        copyfile(tracked_file_Tm1, tracked_file_Tm1_adjust)
+        copy_track_file(tracked_file_Tm1, tracked_file_Tm1_adjust)
         return
 
-    with open(tracked_file_Tm1) as file_input:
-        with open(tracked_file_Tm1_adjust, "w") as file_output:
-            for line in file_input:
-                line_array = line.split()
-                if header_delim in line:
-                    line_of_traj = 0  # reset trajectory line to zero
-                    matching_track = False
-                    line_header = line
-                    track_length = int(line_array[1])
-                    start_date = (
-                        line_array[2]
-                        + line_array[3].zfill(2)
-                        + line_array[4].zfill(2)
-                        + line_array[5].zfill(2)
-                    )
-                else:
-                    if line_of_traj <= track_length:
-                        lon = float(line_array[2])
-                        lat = float(line_array[3])
-                        if line_of_traj == 0:
-                            for storm in storms_match:
-                                storm_old = storm["early"]
-                                date = _storm_dates(storm_old)[0]
-                                if (
-                                    date == start_date
-                                    and track_length == storm_old["length"]
-                                ):
-                                    if (
-                                        lon == storm_old["lon"][0]
-                                        and lat == storm_old["lat"][0]
-                                    ):
-                                        matching_track = True
-                            if not matching_track:
-                                file_output.write(line_header)
-                                file_output.write(line)
-                        else:
-                            if not matching_track:
-                                file_output.write(line)
-                        line_of_traj += 1
-
-    with open(tracked_file_T) as file_input:
-        with open(tracked_file_T_adjust, "w") as file_output:
-            for line in file_input:
-                line_array = line.split()
-                if header_delim in line:
-                    line_of_traj = 0  # reset trajectory line to zero
-                    matching_track = False
-                    line_header = line
-                    track_length = int(line_array[1])
-                    start_date = (
-                        line_array[2]
-                        + line_array[3].zfill(2)
-                        + line_array[4].zfill(2)
-                        + line_array[5].zfill(2)
-                    )
-                else:
-                    if line_of_traj <= track_length:
-                        lon = float(line_array[2])
-                        lat = float(line_array[3])
-                        if line_of_traj == 0:
-                            match_type = ""
-                            for storm in storms_match:
-                                storm_old = storm["early"]
-                                storm_new = storm["late"]
-                                date = _storm_dates(storm_new)[0]
-                                if (
-                                    date == start_date
-                                    and track_length == storm_new["length"]
-                                ):
-                                    if (
-                                        lon == storm_new["lon"][0]
-                                        and lat == storm_new["lat"][0]
-                                    ):
-                                        matching_track = True
-                                        match_type = storm["method"]
-                                        storm_old_match = storm_old
-                                        match_offset = storm["offset"]
-                            if not matching_track:
-                                file_output.write(line_header)
-                                file_output.write(line)
-                            else:
-                                if match_type == "extend":
-                                    line_extra = ""
-                                    new_length = track_length + match_offset
-                                    new_date_line, new_track_lines = write_track_line(
-                                        storm_old_match,
-                                        match_offset,
-                                        new_length,
-                                        column_names,
-                                    )
-                                    line_header = new_date_line
-
-                                    for new_line in new_track_lines:
-                                        line_extra += new_line
-
-                                elif match_type == "remove":
-                                    line_extra = ""
-                                else:
-                                    line_extra = ""
-                                file_output.write(line_header)
-                                file_output.write(line_extra)
-                                file_output.write(line)
-
-                        else:
-                            file_output.write(line)
-                        line_of_traj += 1
+    # index the matches by the start of each storm so that each track in the
+    # files can be looked up directly, with later matches taking precedence
+    early_matches = {_match_key(storm["early"]): storm for storm in storms_match}
+    late_matches = {_match_key(storm["late"]): storm for storm in storms_match}
+
+    with open_track_file(tracked_file_Tm1, "rb") as file_input:
+        with open_track_file(tracked_file_Tm1_adjust, "wb") as file_output:
+            # the matching tracks are removed from the previous timestep
+            _rewrite_track_file(
+                file_input, file_output, early_matches, lambda header, match: None
+            )
+
+    def matched_lines(header, match):
+        if match["method"] == "extend":
+            # prepend the start of the storm from the previous timestep
+            new_length = int(header.split()[1]) + match["offset"]
+            new_date_line, new_track_lines = write_track_line(
+                match["early"], match["offset"], new_length, column_names
+            )
+            return [new_date_line] + new_track_lines
+        return [header]
+
+    with open_track_file(tracked_file_T, "rb") as file_input:
+        with open_track_file(tracked_file_T_adjust, "wb") as file_output:
+            _rewrite_track_file(file_input, file_output, late_matches, matched_lines)
+
+
+def remove_duplicate_storms(
+    storms_previous, storms_current, storms_match, cube, time_period
+):
+    """
+    Remove the matching storms from the previous timestep which have been
+    found in the current timestep and add them to this current timestep. This
+    makes the same changes to loaded trajectories that
+    `remove_duplicates_from_track_files()` makes to the track files, without
+    writing and reading the tracks again, and the results can be passed
+    straight to `save_trajectories_netcdf()`.
+
+    :param list storms_previous: The storms from the previous timestep.
+    :param list storms_current: The storms from the current timestep.
+    :param list storms_match: The storms which have been found to match
+        with a later time
+    :param cube: A cube or time axis of the data that the current timestep
+        was tracked on, used to calculate the steps of the points added to
+        the extended storms.
+    :type cube: :py:obj:`iris.cube.Cube` or :py:obj:`tempest_helper.TimeAxis`
+    :param int time_period: The time period in hours between time points in the
+        data.
+    :returns: The adjusted storms from the previous and current timesteps.
+    :rtype: tuple
+    """
+    if len(storms_match) == 0:
+        return list(storms_previous), list(storms_current)
+
+    # index the matches in the same way as remove_duplicates_from_track_files()
+    early_matches = {_match_key(storm["early"]): storm for storm in storms_match}
+    late_matches = {_match_key(storm["late"]): storm for storm in storms_match}
+
+    previous = [
+        storm for storm in storms_previous if _match_key(storm) not in early_matches
+    ]
+    current = []
+    for storm in storms_current:
+        match = late_matches.get(_match_key(storm))
+        if match is not None and match["method"] == "extend":
+            storm = _extend_storm(
+                match["early"], storm, match["offset"], cube, time_period
+            )
+        current.append(storm)
+    return previous, current
+
+
+def remove_duplicate_storms_many(
+    storms_periods, cubes, time_period, distance_threshold=0.5, units="degrees"
+):
+    """
+    Remove the storms that are duplicated between each pair of consecutive
+    periods of loaded trajectories. The storms in each period are matched
+    with those in the adjusted previous period using `match_storms()` and
+    the duplicates are removed with `remove_duplicate_storms()`, so that each
+    storm that continues across the end of a period is only in the last period
+    that it is found in, extended back to its start.
+
+    :param list storms_periods: The storms from each period, in time order.
+    :param list cubes: A cube or time axis of the data that each period was
+        tracked on.
+    :param int time_period: The time period in hours between time points in the
+        data.
+    :param float distance_threshold: The maximum distance for storms to be
+        apart but identified as overlapping in space.
+    :param str units: The units of distance_threshold, either "degrees" of arc
+        or "km".
+    :returns: The adjusted storms from each period.
+    :rtype: list
+    """
+    if len(storms_periods) != len(cubes):
+        raise ValueError("storms_periods and cubes must have the same length")
+    adjusted = [list(storms) for storms in storms_periods[:1]]
+    for storms, cube in zip(storms_periods[1:], cubes[1:]):
+        matches = match_storms(adjusted[-1], storms, distance_threshold, units)
+        logger.debug(f"Found {len(matches)} storms that continue into the next period")
+        adjusted[-1], current = remove_duplicate_storms(
+            adjusted[-1], storms, matches, cube, time_period
+        )
+        adjusted.append(current)
+    return adjusted
+
+
+def _extend_storm(storm_early, storm_late, offset, cube, time_period):
+    """
+    Add the points of a storm from the previous timestep before its first
+    point in common with the current timestep to the start of the storm from
+    the current timestep.
+
+    :param dict storm_early: Storm dictionary from the previous timestep.
+    :param dict storm_late: Storm dictionary from the current timestep.
+    :param int offset: The number of points to add.
+    :param cube: A cube or time axis of the data of the current timestep.
+    :type cube: :py:obj:`iris.cube.Cube` or :py:obj:`tempest_helper.TimeAxis`
+    :param int time_period: The time period in hours between time points in the
+        data.
+    :returns: The extended storm.
+    :rtype: dict
+    """
+    storm = {"length": storm_late["length"] + offset}
+    for name, values in storm_late.items():
+        if name == "length":
+            continue
+        if name == "step":
+            # the steps are relative to the start of the current timestep
+            steps = convert_dates_to_steps(
+                cube,
+                storm_early["year"][:offset],
+                storm_early["month"][:offset],
+                storm_early["day"][:offset],
+                storm_early["hour"][:offset],
+                time_period,
+            )
+            storm[name] = steps.tolist() + list(values)
+        else:
+            storm[name] = list(storm_early[name][:offset]) + list(values)
+    return storm
+
+
+def _match_key(storm):
+    """
+    Make the key used to find a storm in a track file, from its start time,
+    length in the file and first position.
+
+    :param dict storm: Storm dictionary.
+    :returns: The key.
+    :rtype: tuple
+    """
+    return (
+        int(storm["year"][0]),
+        int(storm["month"][0]),
+        int(storm["day"][0]),
+        int(storm["hour"][0]),
+        int(storm["length"]),
+        float(storm["lon"][0]),
+        float(storm["lat"][0]),
+    )
+
+
+def _rewrite_track_file(file_input, file_output, matches, matched_lines):
+    """
+    Copy the tracks from one track file to another, replacing the header
+    line of the tracks that are in `matches`. The file is read and written in
+    large blocks of whole tracks and only the header and first line of each
+    track are parsed.
+
+    :param file_input: The track file to read, opened in binary mode.
+    :param file_output: The track file to write, opened in binary mode.
+    :param dict matches: The matches, indexed by the key returned by
+        `_match_key()`.
+    :param matched_lines: A function that is passed the header line of a
+        matching track and its match, and returns the lines to write in place
+        of the header, or None to remove the track.
+    """
+    for text in _iter_track_blocks(file_input, CHUNK_SIZE):
+        header_starts, header_ends = _find_headers(text)
+        track_ends = header_starts[1:] + [len(text)]
+        output = []
+        # any lines before the first header are not part of a track
+        for start, end, track_end in zip(header_starts, header_ends, track_ends):
+            if end == track_end:
+                # a header without any lines is not written
+                continue
+            header = text[start:end]
+            header_array = header.split()
+            track_length = int(header_array[1])
+            first_line_end = text.find(b"\n", end, track_end)
+            if first_line_end == -1:
+                first_line_end = track_end
+            line_array = text[end:first_line_end].split()
+            key = (
+                int(header_array[2]),
+                int(header_array[3]),
+                int(header_array[4]),
+                int(header_array[5]),
+                track_length,
+                float(line_array[2]),
+                float(line_array[3]),
+            )
+            track_end = _track_lines_end(text, end, track_end, track_length + 1)
+            match = matches.get(key)
+            if match is None:
+                output.append(text[start:track_end])
+                continue
+            new_lines = matched_lines(header.decode(), match)
+            if new_lines is not None:
+                output.append("".join(new_lines).encode())
+                output.append(text[end:track_end])
+        file_output.write(b"".join(output))
+
+
+def _track_lines_end(text, start, end, max_lines):
+    """
+    Find the end of the lines of a track that are copied when rewriting a
+    track file, which are at most `max_lines` lines.
+
+    :param bytes text: The contents of the track file.
+    :param int start: The offset of the first line of the track.
+    :param int end: The offset of the end of the track.
+    :param int max_lines: The maximum number of lines.
+    :returns: The offset of the end of the lines to copy.
+    :rtype: int
+    """
+    if text.count(b"\n", start, end) < max_lines:
+        return end
+    for _line in range(max_lines):
+        start = text.find(b"\n", start, end) + 1
+    return start
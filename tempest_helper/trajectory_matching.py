@@ -0,0 +1,670 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import logging
+
+import numpy as np
+
+from .track_filter import _date_key
+from .trajectory_set import TrajectorySet, _ranges
+
+logger = logging.getLogger(__name__)
+
+# The mean radius of the Earth in km
+EARTH_RADIUS = 6371.0
+
+# The length of one radian along a great circle in each of the units that
+# distances can be given in
+DISTANCE_UNITS = {"degrees": np.degrees(1.0), "km": EARTH_RADIUS}
+
+# The smallest cell in the point index, which limits the number of cells so
+# that their keys fit in 64-bit integers
+MIN_CELL_SIZE = 1e-3
+
+# The offsets of a cell and all of its neighbours along each axis
+NEIGHBOUR_OFFSETS = [
+    (x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)
+]
+
+
+class TimeIntervalIndex:
+    """
+    An index of the time spanned by each of a collection of trajectories, for
+    finding the trajectories that overlap in time with other trajectories
+    without comparing every pair of them. An indexed trajectory overlaps with
+    an interval either if it starts within the interval, or if it starts
+    before the interval and is still going at its start. The trajectories are
+    sorted by their start time, so that those that start within each interval
+    are a contiguous range of them, and the starts of the intervals are
+    sorted, so that those that each trajectory is still going at are a
+    contiguous range of them. Finding the trajectories that overlap with N
+    intervals is therefore O((N + M) log(N + M)) for M indexed trajectories,
+    plus the number of overlaps found, however long the trajectories are.
+
+    Each trajectory is assumed to have a point at every time between its
+    first and last points, as it does once any gaps have been filled, and so
+    two trajectories overlap if they have at least one time in common.
+
+    :param numpy.ndarray start: The time of the first point of each
+        trajectory, as returned by `time_keys()`.
+    :param numpy.ndarray end: The time of the last point of each trajectory,
+        as returned by `time_keys()`.
+    """
+
+    def __init__(self, start, end):
+        self.start = np.asarray(start, dtype=np.int64)
+        self.end = np.asarray(end, dtype=np.int64)
+        if self.start.shape != self.end.shape:
+            raise ValueError("start and end must have the same number of values")
+        self._order = np.argsort(self.start, kind="stable")
+        self._sorted_start = self.start[self._order]
+
+    @classmethod
+    def from_storms(cls, storms):
+        """
+        Create an index of the times spanned by some trajectories.
+
+        :param storms: The trajectories.
+        :type storms: list or :py:obj:`tempest_helper.TrajectorySet`
+        :returns: The index.
+        :rtype: :py:obj:`tempest_helper.TimeIntervalIndex`
+        """
+        return cls(*time_keys(storms))
+
+    def overlapping(self, start, end):
+        """
+        Find the trajectories that overlap with a single interval.
+
+        :param int start: The first time in the interval.
+        :param int end: The last time in the interval.
+        :returns: The indices of the trajectories that overlap, in the order
+            that they were indexed.
+        :rtype: numpy.ndarray
+        """
+        _query_index, index = self.query([start], [end])
+        return index
+
+    def overlapping_pairs(self, other):
+        """
+        Find all of the pairs of overlapping trajectories from another index
+        and this index.
+
+        :param other: The other trajectories.
+        :type other: :py:obj:`tempest_helper.TimeIntervalIndex`
+        :returns: The indices of the trajectories in the other index and the
+            indices of the trajectories that overlap with them in this index.
+        :rtype: tuple
+        """
+        return self.query(other.start, other.end)
+
+    def query(self, start, end):
+        """
+        Find the trajectories that overlap with each of several intervals.
+
+        :param numpy.ndarray start: The first time in each interval.
+        :param numpy.ndarray end: The last time in each interval.
+        :returns: The index of each interval and of a trajectory that overlaps
+            with it. The pairs are sorted by the interval and then by the
+            order that the trajectories were indexed.
+        :rtype: tuple
+        """
+        start = np.asarray(start, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+        # the trajectories that start within each interval
+        first = np.searchsorted(self._sorted_start, start, side="left")
+        last = np.searchsorted(self._sorted_start, end, side="right")
+        counts = np.maximum(last - first, 0)
+        within_query = np.repeat(np.arange(len(start), dtype=np.int64), counts)
+        within_index = self._order[_ranges(first, counts)]
+
+        # the intervals that start while each trajectory is going, after it
+        # starts
+        query_order = np.argsort(start, kind="stable")
+        sorted_query_start = start[query_order]
+        first = np.searchsorted(sorted_query_start, self.start, side="right")
+        last = np.searchsorted(sorted_query_start, self.end, side="right")
+        counts = np.maximum(last - first, 0)
+        before_index = np.repeat(np.arange(len(self), dtype=np.int64), counts)
+        before_query = query_order[_ranges(first, counts)]
+        # these trajectories also start by the end of each interval, unless
+        # the interval ends before it starts
+        valid = self.start[before_index] <= end[before_query]
+
+        query_index = np.concatenate((within_query, before_query[valid]))
+        index = np.concatenate((within_index, before_index[valid]))
+        order = np.lexsort((index, query_index))
+        return query_index[order], index[order]
+
+    def __len__(self):
+        return len(self.start)
+
+    def __repr__(self):
+        return f"<TimeIntervalIndex: {len(self)} trajectories>"
+
+
+def time_keys(storms):
+    """
+    Find the times of the first and last points of some trajectories as
+    integers that sort in time order and are comparable between track files
+    with different time origins.
+
+    :param storms: The trajectories.
+    :type storms: list or :py:obj:`tempest_helper.TrajectorySet`
+    :returns: The times of the first and last points of each trajectory.
+    :rtype: tuple
+    """
+    components = ("year", "month", "day", "hour")
+    if isinstance(storms, TrajectorySet):
+        start = _date_key(*(storms.first_values(name) for name in components))
+        end = _date_key(*(storms.last_values(name) for name in components))
+    else:
+        start = _date_key(
+            *(np.array([storm[name][0] for storm in storms]) for name in components)
+        )
+        end = _date_key(
+            *(np.array([storm[name][-1] for storm in storms]) for name in components)
+        )
+    return start.astype(np.int64), end.astype(np.int64)
+
+
+class PointIndex:
+    """
+    An index of the positions of trajectory points at each time, for finding
+    the points that are within a distance of other points at the same time
+    without comparing every pair of them. The points are binned into cubic
+    cells of unit-sphere coordinates that are at least as wide as the
+    distance threshold, so only the points in the 27 cells around a point can
+    be close to it, and distances are measured along great circles. This
+    works the same everywhere, including across the 0/360 degree meridian and
+    near the poles.
+
+    :param numpy.ndarray time: The time of each point, as returned by
+        `point_positions()`.
+    :param numpy.ndarray lon: The longitude of each point in degrees.
+    :param numpy.ndarray lat: The latitude of each point in degrees.
+    :param float distance_threshold: The maximum distance between points that
+        are close.
+    :param str units: The units of the distance, either "degrees" of arc along
+        a great circle or "km".
+    """
+
+    def __init__(self, time, lon, lat, distance_threshold, units="degrees"):
+        self.time = np.asarray(time, dtype=np.int64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.distance_threshold = distance_threshold
+        self.units = units
+        angle = _threshold_angle(distance_threshold, units)
+        # the straight line distance between points at the threshold
+        chord = 2 * np.sin(min(angle, np.pi) / 2)
+        self._cell_size = max(chord, MIN_CELL_SIZE)
+        self._n_cells = int(2 / self._cell_size) + 2
+        self._time_origin = int(self.time.min()) if len(self.time) else 0
+        keys = self._cell_keys(self.time, self.lon, self.lat)
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+
+    @classmethod
+    def from_storms(cls, storms, distance_threshold, units="degrees"):
+        """
+        Create an index of all of the points of some trajectories. The points
+        are numbered in the same order as the points in the columns of a
+        `TrajectorySet`.
+
+        :param storms: The trajectories.
+        :type storms: list or :py:obj:`tempest_helper.TrajectorySet`
+        :param float distance_threshold: The maximum distance between points
+            that are close.
+        :param str units: The units of the distance, either "degrees" or "km".
+        :returns: The index.
+        :rtype: :py:obj:`tempest_helper.PointIndex`
+        """
+        return cls(*point_positions(storms), distance_threshold, units)
+
+    def query(self, time, lon, lat):
+        """
+        Find the indexed points that are within the distance threshold of
+        each of several points at the same time.
+
+        :param numpy.ndarray time: The time of each point, as returned by
+            `point_positions()`.
+        :param numpy.ndarray lon: The longitude of each point in degrees.
+        :param numpy.ndarray lat: The latitude of each point in degrees.
+        :returns: The index of each of the points, the index of an indexed
+            point that is close to it and the distance between them in the
+            units of the index. The pairs are sorted by the points and then by
+            the indexed points.
+        :rtype: tuple
+        """
+        time = np.asarray(time, dtype=np.int64)
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        cells = self._cells(lon, lat)
+        query_indices = []
+        indices = []
+        for offset in NEIGHBOUR_OFFSETS:
+            keys = self._combine(
+                time, *(cell + step for cell, step in zip(cells, offset))
+            )
+            first = np.searchsorted(self._sorted_keys, keys, side="left")
+            last = np.searchsorted(self._sorted_keys, keys, side="right")
+            counts = last - first
+            query_indices.append(
+                np.repeat(np.arange(len(time), dtype=np.int64), counts)
+            )
+            indices.append(self._order[_ranges(first, counts)])
+        query_index = np.concatenate(query_indices)
+        index = np.concatenate(indices)
+        distance = great_circle_distance(
+            lon[query_index],
+            lat[query_index],
+            self.lon[index],
+            self.lat[index],
+            self.units,
+        )
+        # neighbouring cells may be out of range and so match other cells
+        close = (time[query_index] == self.time[index]) & (
+            distance <= self.distance_threshold
+        )
+        query_index = query_index[close]
+        index = index[close]
+        distance = distance[close]
+        order = np.lexsort((index, query_index))
+        return query_index[order], index[order], distance[order]
+
+    def _cells(self, lon, lat):
+        """
+        Calculate the cell that contains each point along each of the axes of
+        the unit-sphere coordinates.
+        """
+        lon = np.radians(lon)
+        lat = np.radians(lat)
+        coordinates = (
+            np.cos(lat) * np.cos(lon),
+            np.cos(lat) * np.sin(lon),
+            np.sin(lat),
+        )
+        return tuple(
+            np.floor((values + 1) / self._cell_size).astype(np.int64)
+            for values in coordinates
+        )
+
+    def _combine(self, time, x_cell, y_cell, z_cell):
+        """Combine a time and the cells along each axis into a single key."""
+        key = time - self._time_origin
+        for cell in (x_cell, y_cell, z_cell):
+            key = key * self._n_cells + cell
+        return key
+
+    def _cell_keys(self, time, lon, lat):
+        """Calculate the key of the cell and time of each point."""
+        return self._combine(time, *self._cells(lon, lat))
+
+    def __len__(self):
+        return len(self.time)
+
+    def __repr__(self):
+        return (
+            f"<PointIndex: {len(self)} points within {self.distance_threshold} "
+            f"{self.units}>"
+        )
+
+
+def great_circle_distance(lon1, lat1, lon2, lat2, units="degrees"):
+    """
+    Calculate the distance along a great circle between pairs of points with
+    the haversine formula.
+
+    :param numpy.ndarray lon1: The longitude of the first point of each pair
+        in degrees.
+    :param numpy.ndarray lat1: The latitude of the first point of each pair in
+        degrees.
+    :param numpy.ndarray lon2: The longitude of the second point of each pair
+        in degrees.
+    :param numpy.ndarray lat2: The latitude of the second point of each pair
+        in degrees.
+    :param str units: The units of the distance, either "degrees" of arc or
+        "km".
+    :returns: The distance between each pair of points.
+    :rtype: numpy.ndarray
+    """
+    _check_units(units)
+    lon1, lat1, lon2, lat2 = (
+        np.radians(np.asarray(values, dtype=np.float64))
+        for values in (lon1, lat1, lon2, lat2)
+    )
+    haversine = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    angle = 2 * np.arcsin(np.sqrt(np.minimum(haversine, 1.0)))
+    return angle * DISTANCE_UNITS[units]
+
+
+def point_positions(storms):
+    """
+    Find the time and position of every point of some trajectories, in the
+    same order as the points in the columns of a `TrajectorySet`.
+
+    :param storms: The trajectories.
+    :type storms: list or :py:obj:`tempest_helper.TrajectorySet`
+    :returns: The time, as an integer that sorts in time order and is
+        comparable between track files, longitude and latitude of each point.
+    :rtype: tuple
+    """
+    components = ("year", "month", "day", "hour")
+    if isinstance(storms, TrajectorySet):
+        columns = storms.columns
+    else:
+        columns = {
+            name: np.array(
+                [value for storm in storms for value in storm[name]], dtype=np.float64
+            )
+            for name in components + ("lon", "lat")
+        }
+    time = _date_key(
+        *(np.asarray(columns[name], dtype=np.int64) for name in components)
+    )
+    return time, columns["lon"], columns["lat"]
+
+
+def _threshold_angle(distance, units):
+    """
+    Convert a distance threshold to an angle along a great circle.
+
+    :param float distance: The distance.
+    :param str units: The units of the distance, either "degrees" or "km".
+    :returns: The angle in radians.
+    :rtype: float
+    """
+    _check_units(units)
+    return distance / DISTANCE_UNITS[units]
+
+
+def _check_units(units):
+    """
+    Check that distances can be measured in some units.
+
+    :param str units: The units.
+    :raises ValueError: If the units are not supported.
+    """
+    if units not in DISTANCE_UNITS:
+        raise ValueError(
+            f"Unknown distance units {units}, which must be one of "
+            f"{', '.join(DISTANCE_UNITS)}"
+        )
+
+
+def match_storms(previous, current, distance_threshold=0.5, units="degrees"):
+    """
+    Find the storms from the previous period that are also in the current
+    period, as used by `remove_duplicates_from_track_files()`. This is the
+    equivalent of calling `storms_overlap_in_time()` and then
+    `storm_overlap_in_space()` for every storm in the current period, but all
+    of the storms are compared at once.
+
+    A pair of storms match if they are closer than the distance threshold at
+    their first time in common. Where a storm matches more than one other
+    storm, the storms are paired so that the most storms are matched with the
+    smallest total distance between them, so each storm appears in at most one
+    match.
+
+    :param previous: The storms from the previous period.
+    :type previous: list or :py:obj:`tempest_helper.TrajectorySet`
+    :param current: The storms from the current period.
+    :type current: list or :py:obj:`tempest_helper.TrajectorySet`
+    :param float distance_threshold: The maximum distance for storms to be
+        apart but identified as overlapping in space.
+    :param str units: The units of distance_threshold, either "degrees" of arc
+        or "km".
+    :returns: A dictionary for each match in the same form as returned by
+        `storm_overlap_in_space()`, with the early storm, the late storm, the
+        point of each at their first common time, the offset and the method,
+        and also the distance between them. The matches are in the order of
+        the storms in the current period.
+    :rtype: list
+    """
+    _check_units(units)
+    if len(previous) == 0 or len(current) == 0:
+        return []
+    current_points = _StormPoints(current)
+    previous_points = _StormPoints(previous)
+    late, early = TimeIntervalIndex(previous_points.start, previous_points.end).query(
+        current_points.start, current_points.end
+    )
+
+    common = np.maximum(current_points.start[late], previous_points.start[early])
+    time_c, found_c = current_points.find(late, common)
+    time_p, found_p = previous_points.find(early, common)
+    # storms whose times are on different time axes have no time in common
+    found = found_c & found_p
+    late, early, time_c, time_p = (
+        values[found] for values in (late, early, time_c, time_p)
+    )
+    point_c = current_points.first_pt[late] + time_c
+    point_p = previous_points.first_pt[early] + time_p
+    distance = great_circle_distance(
+        current_points.lon[point_c],
+        current_points.lat[point_c],
+        previous_points.lon[point_p],
+        previous_points.lat[point_p],
+        units,
+    )
+    close = distance < distance_threshold
+    late, early, time_c, time_p, distance = (
+        values[close] for values in (late, early, time_c, time_p, distance)
+    )
+
+    chosen = _assign_pairs(late, early, distance)
+    late, early, time_c, time_p, distance = (
+        values[chosen] for values in (late, early, time_c, time_p, distance)
+    )
+    methods = _overlap_methods(
+        current_points.num_pts[late], previous_points.num_pts[early], time_c, time_p
+    )
+    logger.debug(f"Matched {len(late)} storms")
+    matches = []
+    for number, (late_index, early_index) in enumerate(zip(late, early)):
+        matches.append(
+            {
+                "early": previous[int(early_index)],
+                "late": current[int(late_index)],
+                "time_c": int(time_c[number]),
+                "time_p": int(time_p[number]),
+                "offset": int(time_p[number] - time_c[number]),
+                "method": methods[number],
+                "distance": float(distance[number]),
+            }
+        )
+    return matches
+
+
+class _StormPoints:
+    """
+    The times and positions of all of the points of some storms, with the
+    points of each storm stored contiguously.
+
+    :param storms: The storms.
+    :type storms: list or :py:obj:`tempest_helper.TrajectorySet`
+    """
+
+    def __init__(self, storms):
+        self.time, self.lon, self.lat = point_positions(storms)
+        if isinstance(storms, TrajectorySet):
+            self.num_pts = storms.num_pts
+        else:
+            self.num_pts = np.array([len(storm["lat"]) for storm in storms])
+        self.first_pt = np.concatenate([[0], np.cumsum(self.num_pts)[:-1]])
+        self.start, self.end = time_keys(storms)
+        # the times of the points increase within each storm and so this
+        # increases through all of the points
+        self._time_origin = int(self.time.min())
+        self._span = int(self.time.max()) - self._time_origin + 1
+        track = np.repeat(np.arange(len(self.num_pts), dtype=np.int64), self.num_pts)
+        self._sorted_keys = self._key(track, self.time)
+
+    def find(self, track, time):
+        """
+        Find the point of each of some storms at a time.
+
+        :param numpy.ndarray track: The number of each storm.
+        :param numpy.ndarray time: The time to find in each storm.
+        :returns: The index of the point within each storm and whether the
+            storm has a point at that time.
+        :rtype: tuple
+        """
+        point = np.searchsorted(self._sorted_keys, self._key(track, time))
+        in_range = point < len(self._sorted_keys)
+        found = np.zeros(len(point), dtype=bool)
+        found[in_range] = (
+            self._sorted_keys[point[in_range]] == self._key(track, time)[in_range]
+        )
+        return point - self.first_pt[track], found
+
+    def _key(self, track, time):
+        """Combine the number of a storm and a time into a single key."""
+        return track * self._span + (time - self._time_origin)
+
+
+def _overlap_methods(length_c, length_p, time_c, time_p):
+    """
+    Decide how each pair of matching storms should be merged, in the same way
+    as `storm_overlap_in_space()`.
+
+    :param numpy.ndarray length_c: The number of points in each late storm.
+    :param numpy.ndarray length_p: The number of points in each early storm.
+    :param numpy.ndarray time_c: The point of each late storm at the first
+        common time.
+    :param numpy.ndarray time_p: The point of each early storm at the first
+        common time.
+    :returns: The method for each pair.
+    :rtype: list
+    """
+    # the storms have a point at every time and so overlap until one ends
+    n_overlap = np.minimum(length_c - time_c, length_p - time_p)
+    methods = np.where(time_p > time_c, "extend", "remove").astype(object)
+    odd = (time_c == time_p) & (length_c < length_p)
+    methods[odd] = "extend_odd"
+    methods[(length_c == length_p) & (length_p == n_overlap)] = "remove"
+    return methods.tolist()
+
+
+def _assign_pairs(late, early, cost):
+    """
+    Choose the candidate pairs of storms so that each storm is in at most one
+    pair, the most pairs are chosen and then their total cost is as small as
+    possible. Each connected group of candidates is solved separately.
+
+    :param numpy.ndarray late: The late storm in each candidate pair.
+    :param numpy.ndarray early: The early storm in each candidate pair.
+    :param numpy.ndarray cost: The cost of each candidate pair.
+    :returns: The indices of the chosen pairs in order.
+    :rtype: numpy.ndarray
+    """
+    if len(late) == 0:
+        return np.zeros(0, dtype=np.int64)
+    late_nodes = np.unique(late, return_inverse=True)[1].reshape(-1)
+    early_nodes = np.unique(early, return_inverse=True)[1].reshape(-1)
+    n_late = int(late_nodes.max()) + 1
+    labels = _connected_components(
+        late_nodes, n_late + early_nodes, n_late + int(early_nodes.max()) + 1
+    )[late_nodes]
+
+    group_sizes = np.bincount(labels)
+    chosen = [np.flatnonzero(group_sizes[labels] == 1)]
+    for label in np.flatnonzero(group_sizes > 1).tolist():
+        pairs = np.flatnonzero(labels == label)
+        rows, row_index = np.unique(late_nodes[pairs], return_inverse=True)
+        columns, column_index = np.unique(early_nodes[pairs], return_inverse=True)
+        # forbidding a pair costs more than all of the allowed pairs so that
+        # the most pairs are chosen
+        forbidden = 1.0 + np.sum(cost[pairs]) * 2
+        matrix = np.full((len(rows), len(columns)), forbidden)
+        matrix[row_index.reshape(-1), column_index.reshape(-1)] = cost[pairs]
+        assigned = np.full(matrix.shape, -1, dtype=np.int64)
+        assigned[row_index.reshape(-1), column_index.reshape(-1)] = pairs
+        row_ind, column_ind = _linear_sum_assignment(matrix)
+        selected = assigned[row_ind, column_ind]
+        chosen.append(selected[selected >= 0])
+    return np.sort(np.concatenate(chosen))
+
+
+def _connected_components(nodes_a, nodes_b, n_nodes):
+    """
+    Label the connected components of a graph.
+
+    :param numpy.ndarray nodes_a: The first node of each edge.
+    :param numpy.ndarray nodes_b: The second node of each edge.
+    :param int n_nodes: The number of nodes.
+    :returns: The smallest node in the component that each node belongs to.
+    :rtype: numpy.ndarray
+    """
+    labels = np.arange(n_nodes)
+    while True:
+        edge_labels = np.minimum(labels[nodes_a], labels[nodes_b])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, nodes_a, edge_labels)
+        np.minimum.at(new_labels, nodes_b, edge_labels)
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def _linear_sum_assignment(cost):
+    """
+    Solve the linear sum assignment problem with the Hungarian algorithm,
+    choosing one column for each row, or one row for each column if there are
+    more rows, so that the total cost is as small as possible.
+
+    :param numpy.ndarray cost: The cost of assigning each row to each column.
+    :returns: The chosen rows, in order, and the column for each.
+    :rtype: tuple
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    transpose = cost.shape[0] > cost.shape[1]
+    if transpose:
+        cost = cost.T
+    n_rows, n_columns = cost.shape
+    # the potentials of the rows and columns, and the row assigned to each
+    # column, with row and column 0 as a dummy
+    row_potential = np.zeros(n_rows + 1)
+    column_potential = np.zeros(n_columns + 1)
+    column_row = np.zeros(n_columns + 1, dtype=np.int64)
+    previous_column = np.zeros(n_columns + 1, dtype=np.int64)
+    for row in range(1, n_rows + 1):
+        column_row[0] = row
+        column = 0
+        min_reduced = np.full(n_columns + 1, np.inf)
+        used = np.zeros(n_columns + 1, dtype=bool)
+        while column_row[column] != 0:
+            used[column] = True
+            current_row = column_row[column]
+            free = ~used
+            reduced = (
+                cost[current_row - 1]
+                - row_potential[current_row]
+                - column_potential[1:]
+            )
+            better = free[1:] & (reduced < min_reduced[1:])
+            min_reduced[1:][better] = reduced[better]
+            previous_column[1:][better] = column
+            candidates = np.where(free, min_reduced, np.inf)
+            candidates[0] = np.inf
+            next_column = int(np.argmin(candidates))
+            delta = candidates[next_column]
+            row_potential[column_row[used]] += delta
+            column_potential[used] -= delta
+            min_reduced[free] -= delta
+            column = next_column
+        # follow the augmenting path back to the dummy column
+        while column != 0:
+            before = previous_column[column]
+            column_row[column] = column_row[before]
+            column = before
+
+    columns = np.flatnonzero(column_row[1:])
+    rows = column_row[1:][columns] - 1
+    if transpose:
+        rows, columns = columns, rows
+    order = np.argsort(rows)
+    return rows[order], columns[order]
@@ -0,0 +1,381 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# The columns that every trajectory contains and the types used to store them.
+# Any other column is a variable from the track file and is stored as a float.
+COORDINATE_DTYPES = {
+    "grid_x": np.int32,
+    "grid_y": np.int32,
+    "lon": np.float64,
+    "lat": np.float64,
+    "year": np.int32,
+    "month": np.int32,
+    "day": np.int32,
+    "hour": np.int32,
+    "step": np.int32,
+}
+VARIABLE_DTYPE = np.float64
+
+# The default value that fill_trajectory_gaps() uses for the profile values
+# at the points that it adds, which are masked in a TrajectorySet
+MISSING_VALUE = -99.0
+
+
+class TrajectorySet:
+    """
+    A columnar store of trajectories. All of the points from all of the
+    trajectories are held in flat, typed NumPy arrays, one per column, with the
+    points of each trajectory stored contiguously. The trajectories are indexed
+    by `first_pt` and `num_pts` in the same way as the FIRST_PT and NUM_PTS
+    variables written by `save_trajectories_netcdf()`.
+
+    Profile variables are stored as two-dimensional masked arrays of shape
+    (number of points, number of profile bins), with the points added when
+    filling gaps in a trajectory masked. In storm dictionaries, and when the
+    trajectories are written to a file, these points have the fill value of
+    the masked array, which is the `miss_val` passed to
+    `fill_trajectory_set_gaps()` and otherwise `MISSING_VALUE`.
+
+    Indexing a `TrajectorySet` with an integer, or iterating over it, returns
+    standard `tempest_helper` storm dictionaries and so a `TrajectorySet` can
+    be used wherever a list of storms is expected. Indexing with a slice, or a
+    sequence of integers or booleans, returns a new `TrajectorySet`.
+
+    :param dict columns: The column names and a NumPy array of all of the
+        points in that column.
+    :param first_pt: The index of the first point of each trajectory.
+    :type first_pt: :py:obj:`numpy.ndarray`
+    :param num_pts: The number of points in each trajectory.
+    :type num_pts: :py:obj:`numpy.ndarray`
+    :param length: The number of points in each trajectory in the
+        TempestExtremes file, which can be fewer than `num_pts` if gaps have
+        been filled. Defaults to `num_pts`.
+    :type length: :py:obj:`numpy.ndarray`
+    """
+
+    def __init__(self, columns, first_pt, num_pts, length=None):
+        self.columns = dict(columns)
+        self.first_pt = np.asarray(first_pt, dtype=np.int64)
+        self.num_pts = np.asarray(num_pts, dtype=np.int64)
+        if length is None:
+            self.length = self.num_pts.copy()
+        else:
+            self.length = np.asarray(length, dtype=np.int64)
+        if not len(self.first_pt) == len(self.num_pts) == len(self.length):
+            raise ValueError(
+                "first_pt, num_pts and length must have the same number of tracks"
+            )
+        for name, values in self.columns.items():
+            if len(values) != self.n_points:
+                raise ValueError(
+                    f"Column {name} has {len(values)} points but {self.n_points} "
+                    f"are expected"
+                )
+
+    @classmethod
+    def empty(cls, column_names, n_bins=None):
+        """
+        Create a `TrajectorySet` that contains no trajectories.
+
+        :param list column_names: The names of the columns in the set.
+        :param dict n_bins: The number of bins for each profile variable.
+        :returns: The empty trajectory set.
+        :rtype: :py:obj:`tempest_helper.TrajectorySet`
+        """
+        n_bins = n_bins or {}
+        columns = {}
+        for name in column_names:
+            dtype = COORDINATE_DTYPES.get(name, VARIABLE_DTYPE)
+            if name in n_bins:
+                columns[name] = _masked_profile(
+                    np.empty((0, n_bins[name]), dtype=dtype)
+                )
+            else:
+                columns[name] = np.empty(0, dtype=dtype)
+        return cls(columns, [], [])
+
+    @classmethod
+    def from_storms(cls, storms):
+        """
+        Convert a list of storm dictionaries, as returned by
+        `get_trajectories()`, into a `TrajectorySet`.
+
+        :param list storms: The storm trajectories loaded from TempestExtremes.
+        :returns: The trajectories in columnar form.
+        :rtype: :py:obj:`tempest_helper.TrajectorySet`
+        """
+        if isinstance(storms, TrajectorySet):
+            return storms
+        if len(storms) == 0:
+            return cls({}, [], [])
+        names = [key for key in storms[0] if key != "length"]
+        num_pts = np.array([len(storm["step"]) for storm in storms], dtype=np.int64)
+        length = np.array([storm["length"] for storm in storms], dtype=np.int64)
+        columns = {}
+        for name in names:
+            dtype = COORDINATE_DTYPES.get(name, VARIABLE_DTYPE)
+            values = []
+            for storm in storms:
+                values.extend(storm[name])
+            columns[name] = np.array(values, dtype=dtype)
+            if columns[name].ndim == 2:
+                columns[name] = _masked_profile(
+                    columns[name], columns[name] == MISSING_VALUE
+                )
+        return cls(columns, _offsets(num_pts), num_pts, length)
+
+    @classmethod
+    def concatenate(cls, trajectory_sets):
+        """
+        Join several `TrajectorySet` objects, which must all contain the same
+        columns, into a single set.
+
+        :param list trajectory_sets: The trajectory sets to join in order.
+        :returns: A trajectory set containing all of the trajectories.
+        :rtype: :py:obj:`tempest_helper.TrajectorySet`
+        """
+        trajectory_sets = [
+            trajectory_set for trajectory_set in trajectory_sets if len(trajectory_set)
+        ]
+        if len(trajectory_sets) == 0:
+            return cls({}, [], [])
+        names = list(trajectory_sets[0].columns)
+        for trajectory_set in trajectory_sets[1:]:
+            if list(trajectory_set.columns) != names:
+                raise ValueError("All trajectory sets must have the same columns")
+        columns = {}
+        for name in names:
+            values = [
+                trajectory_set.columns[name] for trajectory_set in trajectory_sets
+            ]
+            masked = [value for value in values if isinstance(value, np.ma.MaskedArray)]
+            if masked:
+                columns[name] = np.ma.concatenate(values)
+                columns[name].fill_value = masked[0].fill_value
+            else:
+                columns[name] = np.concatenate(values)
+        num_pts = np.concatenate(
+            [trajectory_set.num_pts for trajectory_set in trajectory_sets]
+        )
+        length = np.concatenate(
+            [trajectory_set.length for trajectory_set in trajectory_sets]
+        )
+        return cls(columns, _offsets(num_pts), num_pts, length)
+
+    @classmethod
+    def load(cls, file):
+        """
+        Load a `TrajectorySet` saved with `save()`.
+
+        :param file: The path to, or open file object of, the saved set.
+        :type file: str or file object
+        :returns: The trajectory set.
+        :rtype: :py:obj:`tempest_helper.TrajectorySet`
+        """
+        with np.load(file, allow_pickle=False) as arrays:
+            columns = {}
+            for number, name in enumerate(arrays["column_names"].tolist()):
+                values = arrays[f"column_{number}"]
+                if f"mask_{number}" in arrays:
+                    fill_value = MISSING_VALUE
+                    if f"fill_value_{number}" in arrays:
+                        fill_value = arrays[f"fill_value_{number}"]
+                    values = _masked_profile(
+                        values, arrays[f"mask_{number}"], fill_value
+                    )
+                columns[name] = values
+            return cls(columns, arrays["first_pt"], arrays["num_pts"], arrays["length"])
+
+    def save(self, file):
+        """
+        Save the trajectories to an uncompressed NumPy `.npz` file, which can
+        be loaded much more quickly than the TempestExtremes file can be
+        parsed.
+
+        :param file: The path to, or open file object of, the file to save to.
+        :type file: str or file object
+        """
+        arrays = {
+            "column_names": np.array(list(self.columns), dtype=str),
+            "first_pt": self.first_pt,
+            "num_pts": self.num_pts,
+            "length": self.length,
+        }
+        for number, values in enumerate(self.columns.values()):
+            arrays[f"column_{number}"] = np.ma.getdata(values)
+            if isinstance(values, np.ma.MaskedArray):
+                arrays[f"mask_{number}"] = np.ma.getmaskarray(values)
+                arrays[f"fill_value_{number}"] = values.fill_value
+        np.savez(file, **arrays)
+
+    @property
+    def n_points(self):
+        """The total number of points in all of the trajectories."""
+        return int(self.num_pts.sum())
+
+    @property
+    def variables(self):
+        """The names of the columns that are not positions or times."""
+        return [name for name in self.columns if name not in COORDINATE_DTYPES]
+
+    @property
+    def profiles(self):
+        """The names of the profile columns."""
+        return [name for name, values in self.columns.items() if values.ndim == 2]
+
+    @property
+    def track_index(self):
+        """The number of the trajectory that each point belongs to."""
+        return np.repeat(np.arange(len(self), dtype=np.int64), self.num_pts)
+
+    def first_values(self, name):
+        """
+        The value of a column at the first point of every trajectory.
+
+        :param str name: The column name.
+        :returns: One value per trajectory.
+        :rtype: :py:obj:`numpy.ndarray`
+        """
+        return self.columns[name][self.first_pt]
+
+    def last_values(self, name):
+        """
+        The value of a column at the last point of every trajectory.
+
+        :param str name: The column name.
+        :returns: One value per trajectory.
+        :rtype: :py:obj:`numpy.ndarray`
+        """
+        return self.columns[name][self.first_pt + self.num_pts - 1]
+
+    def track(self, index):
+        """
+        The points from a single trajectory as views into the column arrays.
+
+        :param int index: The number of the trajectory.
+        :returns: The column names and the points in the trajectory.
+        :rtype: dict
+        """
+        start = self.first_pt[index]
+        end = start + self.num_pts[index]
+        return {name: values[start:end] for name, values in self.columns.items()}
+
+    def select_columns(self, names):
+        """
+        Select some of the columns into a new `TrajectorySet` containing the
+        same trajectories. The column arrays are shared and not copied.
+
+        :param list names: The names of the columns to select.
+        :returns: The trajectories with just the selected columns.
+        :rtype: :py:obj:`tempest_helper.TrajectorySet`
+        """
+        columns = {name: self.columns[name] for name in names}
+        return TrajectorySet(columns, self.first_pt, self.num_pts, self.length)
+
+    def subset(self, indices):
+        """
+        Select some of the trajectories into a new `TrajectorySet`.
+
+        :param indices: The numbers of the trajectories to select, or a boolean
+            mask with one value per trajectory.
+        :returns: The selected trajectories.
+        :rtype: :py:obj:`tempest_helper.TrajectorySet`
+        """
+        indices = np.arange(len(self))[indices]
+        num_pts = self.num_pts[indices]
+        points = _ranges(self.first_pt[indices], num_pts)
+        columns = {name: values[points] for name, values in self.columns.items()}
+        return TrajectorySet(columns, _offsets(num_pts), num_pts, self.length[indices])
+
+    def to_storms(self):
+        """
+        Convert to a list of the storm dictionaries returned by
+        `get_trajectories()`, with all values as Python ints, floats and lists.
+
+        :returns: The storm trajectories.
+        :rtype: list
+        """
+        return list(self)
+
+    def __len__(self):
+        return len(self.num_pts)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError("TrajectorySet index out of range")
+            storm = {"length": int(self.length[index])}
+            for name, values in self.track(index).items():
+                if isinstance(values, np.ma.MaskedArray):
+                    values = values.filled()
+                storm[name] = values.tolist()
+            return storm
+        return self.subset(index)
+
+    def __repr__(self):
+        return (
+            f"<TrajectorySet: {len(self)} trajectories, {self.n_points} points, "
+            f"columns {', '.join(self.columns)}>"
+        )
+
+
+def _masked_profile(values, mask=False, fill_value=MISSING_VALUE):
+    """
+    Convert the values of a profile variable to a masked array.
+
+    :param numpy.ndarray values: The profile values with shape (number of
+        points, number of profile bins).
+    :param mask: The mask, which is broadcast to the shape of the values.
+    :type mask: bool or numpy.ndarray
+    :param float fill_value: The value of the masked points when the array
+        is filled.
+    :returns: The masked profile values.
+    :rtype: numpy.ma.MaskedArray
+    """
+    mask = np.broadcast_to(mask, values.shape).copy()
+    return np.ma.MaskedArray(values, mask=mask, fill_value=fill_value)
+
+
+def _offsets(num_pts):
+    """
+    Calculate the index of the first point of each trajectory from the number
+    of points in each trajectory.
+
+    :param numpy.ndarray num_pts: The number of points in each trajectory.
+    :returns: The index of the first point in each trajectory.
+    :rtype: numpy.ndarray
+    """
+    first_pt = np.zeros(len(num_pts), dtype=np.int64)
+    np.cumsum(num_pts[:-1], out=first_pt[1:])
+    return first_pt
+
+
+def _ranges(starts, counts):
+    """
+    Concatenate the integer ranges `start` to `start + count` for each pair of
+    values without a Python loop.
+
+    :param numpy.ndarray starts: The first value of each range.
+    :param numpy.ndarray counts: The number of values in each range.
+    :returns: The concatenated ranges.
+    :rtype: numpy.ndarray
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = _offsets(counts)
+    ranges = np.arange(total, dtype=np.int64) - np.repeat(offsets, counts)
+    return ranges + np.repeat(np.asarray(starts, dtype=np.int64), counts)
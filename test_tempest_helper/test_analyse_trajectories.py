@@ -3,7 +3,11 @@
 from unittest import TestCase
 from .utils import make_loaded_trajectories
 
-from tempest_helper import count_trajectories, count_hemispheric_trajectories
+from tempest_helper import (
+    count_trajectories,
+    count_hemispheric_trajectories,
+    TrajectorySet,
+)
 
 
 class TestCountHemispheric(TestCase):
@@ -28,3 +32,13 @@ class TestCountTrajectories(TestCase):
         actual = count_trajectories(storms)
         expected = 0
         self.assertEqual(expected, actual)
+
+
+class TestTrajectorySetAnalysis(TestCase):
+    def test_hemispheric(self):
+        storms = TrajectorySet.from_storms(make_loaded_trajectories())
+        self.assertEqual((1, 2), count_hemispheric_trajectories(storms))
+
+    def test_count(self):
+        storms = TrajectorySet.from_storms(make_loaded_trajectories())
+        self.assertEqual(3, count_trajectories(storms))
@@ -0,0 +1,97 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+from unittest import TestCase
+
+import cftime
+import numpy as np
+
+from tempest_helper import calendars
+from tempest_helper.trajectory_manipulations import DATETIME_TYPES
+
+
+class TestCalendars(TestCase):
+    """Test tempest_helper.calendars against cftime"""
+
+    def setUp(self):
+        # hours either side of the start of the Gregorian calendar and the
+        # turn of a century that is not a leap year in the Gregorian calendar
+        self.hours = np.concatenate(
+            [
+                np.arange(-100000 * 24, -95000 * 24, 61),
+                np.arange(18000 * 24, 19000 * 24, 13),
+            ]
+        ).astype(np.int64)
+        self.units = "hours since 1850-01-01 00:00:00"
+
+    def _cftime_dates(self, calendar):
+        dates = cftime.num2date(
+            self.hours.astype(np.float64), self.units, calendar=calendar
+        )
+        return tuple(
+            np.array([getattr(date, field) for date in dates])
+            for field in ("year", "month", "day", "hour")
+        )
+
+    def test_hours_to_date(self):
+        for calendar in DATETIME_TYPES:
+            with self.subTest(calendar=calendar):
+                epoch = calendars.date_to_hours(calendar, 1850, 1, 1, 0)
+                actual = calendars.hours_to_date(calendar, self.hours + epoch)
+                expected = self._cftime_dates(calendar)
+                for actual_values, expected_values in zip(actual, expected):
+                    np.testing.assert_array_equal(expected_values, actual_values)
+
+    def test_dates_to_num(self):
+        for calendar in DATETIME_TYPES:
+            dates = self._cftime_dates(calendar)
+            for units in (
+                "days since 1869-01-01 00:17:00",
+                "seconds since 2000-03-01 12:00:00.5",
+            ):
+                with self.subTest(calendar=calendar, units=units):
+                    expected = cftime.date2num(
+                        [DATETIME_TYPES[calendar](*date) for date in zip(*dates)],
+                        units,
+                        calendar=calendar,
+                    )
+                    actual = calendars.dates_to_num(*dates, units, calendar)
+                    np.testing.assert_array_equal(expected, actual)
+
+    def test_calendar_alias(self):
+        np.testing.assert_array_equal(
+            calendars.date_to_days("noleap", 2001, 3, 1),
+            calendars.date_to_days("365_day", 2001, 3, 1),
+        )
+
+    def test_invalid_dates(self):
+        invalid = {
+            "360_day": (2000, 1, 31),
+            "noleap": (2000, 2, 29),
+            "julian": (1900, 2, 30),
+            "gregorian": (1582, 10, 10),
+            "proleptic_gregorian": (1900, 2, 29),
+        }
+        for calendar, date in invalid.items():
+            with self.subTest(calendar=calendar):
+                self.assertRaises(ValueError, calendars.date_to_days, calendar, *date)
+
+    def test_unsupported_calendar(self):
+        self.assertRaises(ValueError, calendars.date_to_days, "none", 2000, 1, 1)
+
+    def test_months_only_in_360_day(self):
+        self.assertEqual(
+            [1.0],
+            calendars.dates_to_num(
+                [2000], [2], [1], [0], "months since 2000-01-01", "360_day"
+            ).tolist(),
+        )
+        self.assertRaises(
+            ValueError,
+            calendars.dates_to_num,
+            [2000],
+            [2],
+            [1],
+            [0],
+            "months since 2000-01-01",
+            "noleap",
+        )
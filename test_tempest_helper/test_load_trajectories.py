@@ -1,48 +1,37 @@
 # (C) British Crown Copyright 2022, Met Office.
 # Please see LICENSE for license details.
+import gzip
 import os
 import shutil
 import tempfile
 
 import iris
 from iris.tests.stock import realistic_3d
+import numpy as np
 
-from tempest_helper.load_trajectories import get_trajectories
-from .utils import TempestHelperTestCase, make_loaded_trajectories, make_column_names
+from tempest_helper import TimeAxis, TrackFilter, TrajectorySet
+from tempest_helper.load_trajectories import (
+    get_trajectories,
+    get_trajectories_many,
+    iter_trajectories,
+    _parse_tracks,
+)
+from .utils import TempestHelperTestCase, TrackFileTestCase, make_loaded_trajectories
 
 
-class TestGetTrajectories(TempestHelperTestCase):
-    """Test tempest_helper.load_trajectories.get_trajectories"""
+class NetcdfFileTestCase(TrackFileTestCase):
+    """Create an example track file and data file"""
 
     def setUp(self):
-        # See an unlimited diff in case of error
-        self.maxDiff = None
-        # Create a directory for the input files
-        self.runtime_dir = tempfile.mkdtemp()
-        # Make a track file
-        _fd, self.track_file = tempfile.mkstemp(suffix=".conf", dir=self.runtime_dir)
-        track_file_contents = """start   2  2014    12   21   0
-    67  85  1.0  10.0   9.997331e+04    1.206617e+01    5.092293e+03    0.000000e+00    2014   12  21   0
-    68  86  2.0  11.0   9.978512e+04    1.079898e+01    5.112520e+03    0.000000e+00    2014   12  21   6
-start   2  2014    12   21   0
-    67  85  1.0  -1.0   9.997331e+04    1.206617e+01    5.092293e+03    0.000000e+00    2014   12  21   0
-    68  86  2.0  0.0   9.978512e+04    1.079898e+01    5.112520e+03    0.000000e+00    2014   12  21   6
-start   2  2014    12   21   0
-    67  85  1.0  0.0   9.997331e+04    1.206617e+01    5.092293e+03    0.000000e+00    2014   12  21   0
-    68  86  2.0  1.0   9.978512e+04    1.079898e+01    5.112520e+03    0.000000e+00    2014   12  21   12"""  # noqa: E501
-        with open(self.track_file, "w") as fh:
-            fh.writelines(
-                [line.strip() + "\n" for line in track_file_contents.split("\n")]
-            )
-        self.column_names = make_column_names()
+        super().setUp()
         # Make an example data file
         _fd, self.netcdf_file = tempfile.mkstemp(suffix=".nc", dir=self.runtime_dir)
         cube = realistic_3d()
         iris.save(cube, self.netcdf_file)
 
-    def tearDown(self):
-        if os.path.isdir(self.runtime_dir):
-            shutil.rmtree(self.runtime_dir, ignore_errors=True)
+
+class TestGetTrajectories(NetcdfFileTestCase):
+    """Test tempest_helper.load_trajectories.get_trajectories"""
 
     def test_get_trajectories(self):
         for expected, actual in zip(
@@ -50,3 +39,324 @@ start   2  2014    12   21   0
             get_trajectories(self.track_file, self.netcdf_file, 6, self.column_names),
         ):
             self.assertTempestDictEqual(expected, actual)
+
+    def test_get_trajectories_as_trajectory_set(self):
+        actual = get_trajectories(
+            self.track_file,
+            self.netcdf_file,
+            6,
+            self.column_names,
+            as_trajectory_set=True,
+        )
+        self.assertIsInstance(actual, TrajectorySet)
+        for expected, actual_storm in zip(make_loaded_trajectories(), actual):
+            self.assertTempestDictEqual(expected, actual_storm)
+
+    def test_get_trajectories_compressed(self):
+        compressed_file = self.track_file + ".gz"
+        with open(self.track_file, "rb") as fh_in:
+            with gzip.open(compressed_file, "wb") as fh_out:
+                fh_out.write(fh_in.read())
+        for expected, actual in zip(
+            make_loaded_trajectories(),
+            get_trajectories(compressed_file, self.netcdf_file, 6, self.column_names),
+        ):
+            self.assertTempestDictEqual(expected, actual)
+
+    def test_get_trajectories_time_axis(self):
+        time_axis = TimeAxis((2014, 12, 21, 0), "standard", 11)
+        for expected, actual in zip(
+            make_loaded_trajectories(),
+            get_trajectories(self.track_file, time_axis, 6, self.column_names),
+        ):
+            self.assertTempestDictEqual(expected, actual)
+
+
+class TestGetTrajectoriesSelection(NetcdfFileTestCase):
+    """Test selecting variables and tracks in
+    tempest_helper.load_trajectories.get_trajectories"""
+
+    def test_variables(self):
+        storms = get_trajectories(
+            self.track_file,
+            self.time_axis,
+            6,
+            self.column_names,
+            variables=["psl_min"],
+        )
+        expected = make_loaded_trajectories()
+        for storm in expected:
+            for name in ("sfcWind_max", "zg_avg_250", "orog_max"):
+                del storm[name]
+        self.assertEqual(3, len(storms))
+        for expected_storm, actual_storm in zip(expected, storms):
+            self.assertEqual(set(expected_storm), set(actual_storm))
+            self.assertTempestDictEqual(expected_storm, actual_storm)
+
+    def test_unknown_variable(self):
+        self.assertRaisesRegex(
+            ValueError,
+            "Variables rprof are not in column_names",
+            get_trajectories,
+            self.track_file,
+            self.time_axis,
+            6,
+            self.column_names,
+            variables=["rprof"],
+        )
+
+    def test_track_filter(self):
+        expected = make_loaded_trajectories()
+        track_filter = TrackFilter(
+            time_window=((2014, 12, 21, 6), (2014, 12, 22, 0)),
+            bbox=(0.0, 360.0, -1.0, 0.25),
+        )
+        for as_trajectory_set in (False, True):
+            storms = get_trajectories(
+                self.track_file,
+                self.time_axis,
+                6,
+                self.column_names,
+                as_trajectory_set=as_trajectory_set,
+                track_filter=track_filter,
+            )
+            self.assertEqual(2, len(storms))
+            self.assertTempestDictEqual(expected[1], storms[0])
+            self.assertTempestDictEqual(expected[2], storms[1])
+
+    def test_unknown_threshold(self):
+        self.assertRaisesRegex(
+            ValueError,
+            "Thresholds are given for rprof, which are not in column_names",
+            get_trajectories,
+            self.track_file,
+            self.time_axis,
+            6,
+            self.column_names,
+            track_filter=TrackFilter(thresholds={"rprof": (1.0, None)}),
+        )
+
+    def test_no_tracks_selected(self):
+        storms = get_trajectories(
+            self.track_file,
+            self.time_axis,
+            6,
+            self.column_names,
+            track_filter=TrackFilter(min_length=3),
+        )
+        self.assertEqual([], storms)
+
+
+class TestGetTrajectoriesProfile(TempestHelperTestCase):
+    """Test tempest_helper.load_trajectories.get_trajectories with profiles"""
+
+    def setUp(self):
+        self.runtime_dir = tempfile.mkdtemp()
+        self.track_file = os.path.join(self.runtime_dir, "tracks.txt")
+        with open(self.track_file, "w") as fh:
+            fh.write(
+                "start   2  2014    12   21   0\n"
+                '  67  85  1.0  10.0  9.9e+04  "[1.0,2.0]"  2014  12  21  0\n'
+                '  69  87  3.0  12.0  9.7e+04  "[5.0,6.0]"  2014  12  21  12\n'
+                "start   1  2014    12   21   6\n"
+                '  68  86  2.0  11.0  9.8e+04  "[3.0,4.0]"  2014  12  21  6\n'
+            )
+        self.column_names = {
+            "grid_x": 0,
+            "grid_y": 1,
+            "lon": 2,
+            "lat": 3,
+            "psl_min": 4,
+            "rprof": 5,
+            "year": 6,
+            "month": 7,
+            "day": 8,
+            "hour": 9,
+        }
+        self.time_axis = TimeAxis((2014, 12, 21, 0), "standard", 11)
+
+    def tearDown(self):
+        if os.path.isdir(self.runtime_dir):
+            shutil.rmtree(self.runtime_dir, ignore_errors=True)
+
+    def test_gap_filled_with_missing(self):
+        storms = get_trajectories(self.track_file, self.time_axis, 6, self.column_names)
+        self.assertEqual([[1.0, 2.0], [-99, -99], [5.0, 6.0]], storms[0]["rprof"])
+
+    def test_profile_threshold(self):
+        storms = get_trajectories(
+            self.track_file,
+            self.time_axis,
+            6,
+            self.column_names,
+            track_filter=TrackFilter(thresholds={"rprof": (4.5, 5.5)}),
+        )
+        self.assertEqual(1, len(storms))
+        self.assertEqual([[1.0, 2.0], [-99, -99], [5.0, 6.0]], storms[0]["rprof"])
+
+    def test_masked_array(self):
+        trajectory_set = get_trajectories(
+            self.track_file,
+            self.time_axis,
+            6,
+            self.column_names,
+            as_trajectory_set=True,
+        )
+        rprof = trajectory_set.columns["rprof"]
+        self.assertIsInstance(rprof, np.ma.MaskedArray)
+        self.assertEqual((4, 2), rprof.shape)
+        np.testing.assert_array_equal(
+            [[False] * 2, [True] * 2, [False] * 2, [False] * 2], rprof.mask
+        )
+        np.testing.assert_array_equal([5.0, 6.0], rprof[2])
+        np.testing.assert_array_equal([3.0, 4.0], rprof[3])
+        expected = get_trajectories(
+            self.track_file, self.time_axis, 6, self.column_names
+        )
+        self.assertEqual(list(expected[0]), list(trajectory_set[0]))
+        self.assertEqual(expected, trajectory_set.to_storms())
+
+
+class TestIterTrajectories(NetcdfFileTestCase):
+    """Test tempest_helper.load_trajectories.iter_trajectories"""
+
+    def test_iter_trajectories(self):
+        actual = list(
+            iter_trajectories(self.track_file, self.netcdf_file, 6, self.column_names)
+        )
+        self.assertEqual(3, len(actual))
+        for expected, actual_storm in zip(make_loaded_trajectories(), actual):
+            self.assertTempestDictEqual(expected, actual_storm)
+
+    def test_small_chunks(self):
+        """Test chunks that split the headers and rows"""
+        for chunk_size in (1, 7, 50, 200):
+            actual = list(
+                iter_trajectories(
+                    self.track_file,
+                    self.netcdf_file,
+                    6,
+                    self.column_names,
+                    chunk_size=chunk_size,
+                )
+            )
+            self.assertEqual(3, len(actual))
+            for expected, actual_storm in zip(make_loaded_trajectories(), actual):
+                self.assertTempestDictEqual(expected, actual_storm)
+
+
+class TestGetTrajectoriesMany(NetcdfFileTestCase):
+    """Test tempest_helper.load_trajectories.get_trajectories_many"""
+
+    def setUp(self):
+        super().setUp()
+        # A second track file with just the final track from the first
+        _fd, self.track_file_2 = tempfile.mkstemp(suffix=".txt", dir=self.runtime_dir)
+        with open(self.track_file) as fh:
+            lines = fh.readlines()
+        with open(self.track_file_2, "w") as fh:
+            fh.writelines(lines[-3:])
+
+    def test_processes(self):
+        actual = get_trajectories_many(
+            [self.track_file, self.track_file_2, self.track_file],
+            self.netcdf_file,
+            6,
+            self.column_names,
+            processes=2,
+        )
+        expected = make_loaded_trajectories()
+        self.assertEqual([3, 1, 3], [len(storms) for storms in actual])
+        for expected_storm, actual_storm in zip(expected, actual[2]):
+            self.assertTempestDictEqual(expected_storm, actual_storm)
+        self.assertTempestDictEqual(expected[2], actual[1][0])
+
+    def test_combine(self):
+        actual = get_trajectories_many(
+            [self.track_file_2, self.track_file],
+            [self.netcdf_file, self.netcdf_file],
+            6,
+            self.column_names,
+            processes=1,
+            combine=True,
+        )
+        self.assertIsInstance(actual, TrajectorySet)
+        expected = make_loaded_trajectories()
+        for expected_storm, actual_storm in zip(expected[-1:] + expected, actual):
+            self.assertTempestDictEqual(expected_storm, actual_storm)
+
+    def test_wrong_number_of_nc_files(self):
+        self.assertRaisesRegex(
+            ValueError,
+            "1 netCDF files were given for 2 tracked files",
+            get_trajectories_many,
+            [self.track_file, self.track_file_2],
+            [self.netcdf_file],
+            6,
+            self.column_names,
+        )
+
+
+class TestParseTracks(TempestHelperTestCase):
+    """Test tempest_helper.load_trajectories._parse_tracks"""
+
+    def setUp(self):
+        self.column_names = {
+            "grid_x": 0,
+            "grid_y": 1,
+            "lon": 2,
+            "lat": 3,
+            "psl_min": 4,
+            "rprof": 5,
+            "year": 6,
+            "month": 7,
+            "day": 8,
+            "hour": 9,
+        }
+
+    def test_profile(self):
+        text = (
+            b"start   2  2014    12   21   0\n"
+            b'  67  85  1.0  10.0  9.9e+04  "[1.0,2.0,3.0]"  2014  12  21  0\n'
+            b'  68  86  2.0  11.0  9.8e+04  "[4.0,5.0,6.0]"  2014  12  21  6\n'
+            b"start   1  2014    12   21   6\n"
+            b'  69  87  3.0  12.0  9.7e+04  "[7.0,8.0,9.0]"  2014  12  21  6\n'
+        )
+        track_length, num_rows, columns = _parse_tracks(text, self.column_names)
+        np.testing.assert_array_equal(track_length, [2, 1])
+        np.testing.assert_array_equal(num_rows, [2, 1])
+        np.testing.assert_array_equal(columns["grid_x"], [67, 68, 69])
+        self.assertEqual(np.int32, columns["grid_x"].dtype)
+        np.testing.assert_array_equal(columns["psl_min"], [9.9e04, 9.8e04, 9.7e04])
+        np.testing.assert_array_equal(
+            columns["rprof"], [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0], [7.0, 8.0, 9.0]]
+        )
+        np.testing.assert_array_equal(columns["hour"], [0, 6, 6])
+
+    def test_blank_lines(self):
+        text = (
+            b"start   1  2014    12   21   0\n"
+            b'  67  85  1.0  10.0  9.9e+04  "[1.0]"  2014  12  21  0\n'
+            b"\n"
+            b"start   1  2014    12   21   6\n"
+            b"   \n"
+            b'  69  87  3.0  12.0  9.7e+04  "[7.0]"  2014  12  21  6\n'
+            b"\n"
+        )
+        _track_length, num_rows, columns = _parse_tracks(text, self.column_names)
+        np.testing.assert_array_equal(num_rows, [1, 1])
+        np.testing.assert_array_equal(columns["lat"], [10.0, 12.0])
+
+    def test_bad_row(self):
+        text = (
+            b"start   2  2014    12   21   0\n"
+            b'  67  85  1.0  10.0  9.9e+04  "[1.0]"  2014  12  21  0\n'
+            b'  68  86  2.0  11.0  9.8e+04  "[4.0]"  2014  12  21\n'
+        )
+        self.assertRaisesRegex(
+            ValueError,
+            "2 rows of 10 values were expected",
+            _parse_tracks,
+            text,
+            self.column_names,
+        )
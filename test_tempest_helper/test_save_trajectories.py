@@ -1,9 +1,13 @@
 # (C) British Crown Copyright 2022, Met Office.
 # Please see LICENSE for license details.
 import os
+import shutil
 import tempfile
 
-from tempest_helper import save_trajectories_netcdf
+from netCDF4 import Dataset
+import numpy as np
+
+from tempest_helper import TrajectorySet, save_trajectories_netcdf
 from .utils import TempestHelperTestCase, make_loaded_trajectories, make_column_names
 
 
@@ -30,6 +34,9 @@ class TestSaveTrajectoriesNetcdf(TempestHelperTestCase):
             "wibble",
             "wobble",
             column_names,
+            # the expected CDL shows the storage of uncompressed variables
+            complevel=0,
+            record_chunksize=None,
         )
 
     def tearDown(self):
@@ -158,3 +165,228 @@ data:
 }
 """  # noqa
         self.assertNetcdfEqual(self.track_file, expected_cdl)
+
+    def test_no_storms(self):
+        save_trajectories_netcdf(
+            os.path.dirname(self.track_file),
+            os.path.basename(self.track_file),
+            [],
+            "360_day",
+            "days since 1869-01-01 00:00:00",
+            {},
+            "6hr",
+            "u-ax358",
+            "N96",
+            "wibble",
+            "wobble",
+            make_column_names(),
+        )
+        with Dataset(self.track_file) as dataset:
+            self.assertEqual(0, len(dataset.dimensions["tracks"]))
+            self.assertEqual(0, len(dataset.dimensions["record"]))
+            self.assertIn("psl_min", dataset.variables)
+
+
+class TestSaveTrajectoriesNetcdfProfile(TempestHelperTestCase):
+    """Test tempest_helper.save_trajectories.save_trajectories_netcdf with a
+    profile variable"""
+
+    def setUp(self):
+        storms = make_loaded_trajectories()
+        for storm in storms:
+            storm["rprof"] = [[1.0, 2.0]] + [[-99, -99]] * (len(storm["step"]) - 1)
+        self.storms = storms
+        self.column_names = make_column_names()
+        self.column_names["rprof"] = len(self.column_names)
+        _fd, self.track_file = tempfile.mkstemp(suffix=".nc")
+
+    def tearDown(self):
+        os.remove(self.track_file)
+
+    def _save(self, storms):
+        save_trajectories_netcdf(
+            os.path.dirname(self.track_file),
+            os.path.basename(self.track_file),
+            storms,
+            "360_day",
+            "days since 1869-01-01 00:00:00",
+            {},
+            "6hr",
+            "u-ax358",
+            "N96",
+            "wibble",
+            "wobble",
+            self.column_names,
+        )
+        with Dataset(self.track_file) as dataset:
+            return dataset.variables["rprof"][:]
+
+    def test_trajectory_set(self):
+        expected = [[1.0, 2.0], [-99.0, -99.0]] * 3
+        np.testing.assert_array_equal(expected, self._save(self.storms))
+        trajectory_set = TrajectorySet.from_storms(self.storms)
+        self.assertIsInstance(trajectory_set.columns["rprof"], np.ma.MaskedArray)
+        np.testing.assert_array_equal(expected, self._save(trajectory_set))
+
+    def test_dimensions(self):
+        self._save(self.storms)
+        with Dataset(self.track_file) as dataset:
+            self.assertEqual(
+                ("record", "rprof_bins"), dataset.variables["rprof"].dimensions
+            )
+            self.assertEqual(2, len(dataset.dimensions["rprof_bins"]))
+            self.assertEqual([6, 2], dataset.variables["rprof"].chunking())
+
+
+class TestSaveTrajectoriesNetcdfStorage(TempestHelperTestCase):
+    """Test the compression and chunking options of
+    tempest_helper.save_trajectories.save_trajectories_netcdf"""
+
+    def setUp(self):
+        self.storms = make_loaded_trajectories()
+        _fd, self.track_file = tempfile.mkstemp(suffix=".nc")
+
+    def tearDown(self):
+        os.remove(self.track_file)
+
+    def _save(self, **kwargs):
+        save_trajectories_netcdf(
+            os.path.dirname(self.track_file),
+            os.path.basename(self.track_file),
+            self.storms,
+            "360_day",
+            "days since 1869-01-01 00:00:00",
+            {},
+            "6hr",
+            "u-ax358",
+            "N96",
+            "wibble",
+            "wobble",
+            make_column_names(),
+            **kwargs,
+        )
+        return Dataset(self.track_file)
+
+    def test_defaults(self):
+        with self._save() as dataset:
+            for name in ("FIRST_PT", "time", "psl_min"):
+                self.assertTrue(dataset.variables[name].filters()["zlib"])
+                self.assertTrue(dataset.variables[name].filters()["shuffle"])
+            # the chunks are limited to the size of the dimensions
+            self.assertEqual([3], dataset.variables["FIRST_PT"].chunking())
+            self.assertEqual([6], dataset.variables["psl_min"].chunking())
+
+    def test_uncompressed(self):
+        with self._save(complevel=0, record_chunksize=None) as dataset:
+            self.assertFalse(dataset.variables["psl_min"].filters()["zlib"])
+            self.assertEqual("contiguous", dataset.variables["psl_min"].chunking())
+
+    def test_chunksize(self):
+        with self._save(record_chunksize=4) as dataset:
+            self.assertEqual([4], dataset.variables["lat"].chunking())
+
+    def test_least_significant_digit(self):
+        with self._save(least_significant_digit={"psl_min": 0}) as dataset:
+            psl_min = dataset.variables["psl_min"][:]
+            self.assertEqual(0, dataset.variables["psl_min"].least_significant_digit)
+        expected = [99973.31, 99785.12, 99973.31, 99785.12, 99973.31, 99879.215]
+        np.testing.assert_allclose(expected, psl_min, atol=1.0)
+        # the values have been quantised
+        self.assertFalse(np.array_equal(expected, psl_min))
+
+    def test_unknown_variable(self):
+        self.assertRaises(ValueError, self._save, significant_digits={"pr": 3})
+
+
+class TestSaveTrajectoriesNetcdfAppend(TempestHelperTestCase):
+    """Test appending to a file with
+    tempest_helper.save_trajectories.save_trajectories_netcdf"""
+
+    def setUp(self):
+        self.storms = make_loaded_trajectories()
+        for storm in self.storms:
+            storm["rprof"] = [[1.0, 2.0]] + [[-99, -99]] * (len(storm["step"]) - 1)
+        self.column_names = make_column_names()
+        self.column_names["rprof"] = len(self.column_names)
+        self.runtime_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.runtime_dir)
+
+    def _save(self, filename, storms, calendar="360_day", **kwargs):
+        save_trajectories_netcdf(
+            self.runtime_dir,
+            filename,
+            storms,
+            calendar,
+            "days since 1869-01-01 00:00:00",
+            {},
+            "6hr",
+            "u-ax358",
+            "N96",
+            "wibble",
+            "wobble",
+            self.column_names,
+            **kwargs,
+        )
+        return os.path.join(self.runtime_dir, filename)
+
+    def test_matches_single_save(self):
+        expected = self._save("expected.nc", self.storms)
+        actual = self._save("actual.nc", self.storms[:1], append=True)
+        self._save("actual.nc", [], append=True)
+        self._save("actual.nc", self.storms[1:], append=True, endperiod="2000")
+        with Dataset(expected) as expected_dataset:
+            with Dataset(actual) as actual_dataset:
+                self.assertTrue(actual_dataset.dimensions["record"].isunlimited())
+                self.assertEqual("2000", actual_dataset.end_date)
+                for name, variable in expected_dataset.variables.items():
+                    np.testing.assert_array_equal(
+                        variable[:], actual_dataset.variables[name][:]
+                    )
+
+    def test_empty_first(self):
+        expected = self._save("expected.nc", self.storms)
+        actual = self._save("actual.nc", [], append=True)
+        self._save("actual.nc", [], append=True)
+        self._save("actual.nc", self.storms, append=True)
+        with Dataset(expected) as expected_dataset:
+            with Dataset(actual) as actual_dataset:
+                self.assertEqual(
+                    ("record", "rprof_bins"),
+                    actual_dataset.variables["rprof"].dimensions,
+                )
+                for name, variable in expected_dataset.variables.items():
+                    np.testing.assert_array_equal(
+                        variable[:], actual_dataset.variables[name][:]
+                    )
+                    self.assertEqual(
+                        variable.ncattrs(), actual_dataset.variables[name].ncattrs()
+                    )
+
+    def test_not_appendable(self):
+        path = self._save("tracks.nc", self.storms[:1])
+        self.assertRaises(
+            ValueError, self._save, "tracks.nc", self.storms[1:], append=True
+        )
+        with Dataset(path) as dataset:
+            self.assertEqual(1, len(dataset.dimensions["tracks"]))
+
+    def test_different_calendar(self):
+        self._save("tracks.nc", self.storms[:1], append=True)
+        self.assertRaises(
+            ValueError,
+            self._save,
+            "tracks.nc",
+            self.storms[1:],
+            calendar="noleap",
+            append=True,
+        )
+
+    def test_different_bins(self):
+        self._save("tracks.nc", self.storms[:1], append=True)
+        for storm in self.storms[1:]:
+            storm["rprof"] = [[1.0, 2.0, 3.0]] * len(storm["step"])
+        self.assertRaises(
+            ValueError, self._save, "tracks.nc", self.storms[1:], append=True
+        )
@@ -0,0 +1,91 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import os
+import shutil
+import tempfile
+
+import cf_units
+import cftime
+import iris
+from iris.tests.stock import realistic_3d
+
+from tempest_helper import TimeAxis
+from tempest_helper.trajectory_manipulations import (
+    convert_date_to_step,
+    fill_trajectory_gaps,
+)
+from .utils import TempestHelperTestCase
+
+
+class TestTimeAxis(TempestHelperTestCase):
+    """Test tempest_helper.time_axis.TimeAxis"""
+
+    def setUp(self):
+        self.runtime_dir = tempfile.mkdtemp()
+        _fd, self.netcdf_file = tempfile.mkstemp(suffix=".nc", dir=self.runtime_dir)
+        self.cube = realistic_3d()
+        iris.save(self.cube, self.netcdf_file)
+
+    def tearDown(self):
+        if os.path.isdir(self.runtime_dir):
+            shutil.rmtree(self.runtime_dir, ignore_errors=True)
+
+    def test_from_netcdf(self):
+        actual = TimeAxis.from_netcdf(self.netcdf_file)
+        self.assertEqual(cftime.DatetimeGregorian(2014, 12, 21), actual.origin)
+        self.assertEqual("standard", actual.calendar)
+        self.assertEqual(self.cube.shape[-1], actual.nx)
+
+    def test_from_cube(self):
+        expected = TimeAxis.from_netcdf(self.netcdf_file)
+        actual = TimeAxis.from_cube(self.cube)
+        self.assertEqual(expected, actual)
+
+    def test_from_values(self):
+        actual = TimeAxis((2015, 8, 16, 0), "360_day", 11)
+        self.assertEqual(cftime.Datetime360Day(2015, 8, 16), actual.origin)
+        self.assertEqual(11, actual.nx)
+
+    def test_calendar_alias(self):
+        self.cube.coord("time").units = cf_units.Unit(
+            "hours since 1970-01-01 00:00:00", calendar="365_day"
+        )
+        actual = TimeAxis.from_cube(self.cube)
+        self.assertEqual("noleap", actual.calendar)
+
+    def test_convert_date_to_step(self):
+        time_axis = TimeAxis((2014, 12, 21, 0), "standard")
+        actual = convert_date_to_step(time_axis, 2014, 12, 22, 0, 12)
+        self.assertEqual(3, actual)
+
+    def test_fill_trajectory_gaps(self):
+        storm = {
+            "length": 2,
+            "step": [1],
+            "grid_y": [0],
+            "grid_x": [9],
+            "lat": [0.0],
+            "lon": [358.0],
+            "year": [2000],
+            "month": [2],
+            "day": [30],
+            "hour": [18],
+            "psl_min": [100000.0],
+        }
+        expected = {
+            "length": 2,
+            "step": [1, 2],
+            "grid_y": [0, 1],
+            "grid_x": [9, 0],
+            "lat": [0.0, 1.0],
+            "lon": [358.0, 0.0],
+            "year": [2000, 2000],
+            "month": [2, 3],
+            "day": [30, 1],
+            "hour": [18, 0],
+            "psl_min": [100000.0, 99999.0],
+        }
+        time_axis = TimeAxis((2000, 1, 1, 0), "360_day", 10)
+        new_var = {"psl_min": 99998.0}
+        fill_trajectory_gaps(storm, 3, 2.0, 2.0, 11, 2, time_axis, 6, new_var)
+        self.assertTempestDictEqual(expected, storm)
@@ -0,0 +1,81 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from tempest_helper.track_files import (
+    copy_track_file,
+    detect_compression,
+    open_track_file,
+)
+
+
+class TrackFilesTestCase(TestCase):
+    """Create a directory for the files"""
+
+    def setUp(self):
+        self.runtime_dir = tempfile.mkdtemp()
+        self.contents = "start   1  2014    12   21   0\n    67  85  1.0  10.0\n"
+
+    def tearDown(self):
+        if os.path.isdir(self.runtime_dir):
+            shutil.rmtree(self.runtime_dir, ignore_errors=True)
+
+
+class TestDetectCompression(TrackFilesTestCase):
+    """Test tempest_helper.track_files.detect_compression"""
+
+    def test_magic_bytes(self):
+        # The file names don't have the usual extensions
+        for compression, opener in (("gzip", gzip), ("bz2", bz2), ("xz", lzma)):
+            path = os.path.join(self.runtime_dir, f"tracks_{compression}.txt")
+            with opener.open(path, "wt") as fh:
+                fh.write(self.contents)
+            self.assertEqual(compression, detect_compression(path))
+
+    def test_uncompressed(self):
+        path = os.path.join(self.runtime_dir, "tracks.gz")
+        with open(path, "w") as fh:
+            fh.write(self.contents)
+        self.assertIsNone(detect_compression(path))
+
+    def test_extension(self):
+        self.assertEqual("gzip", detect_compression("tracks.txt.gz", "w"))
+        self.assertEqual("bz2", detect_compression("tracks.txt.bz2", "w"))
+        self.assertEqual("xz", detect_compression("tracks.txt.xz", "w"))
+        self.assertIsNone(detect_compression("tracks.txt", "w"))
+
+
+class TestOpenTrackFile(TrackFilesTestCase):
+    """Test tempest_helper.track_files.open_track_file"""
+
+    def test_round_trip(self):
+        for extension in ("", ".gz", ".bz2", ".xz"):
+            path = os.path.join(self.runtime_dir, "tracks.txt" + extension)
+            with open_track_file(path, "w") as fh:
+                fh.write(self.contents)
+            with open_track_file(path) as fh:
+                self.assertEqual(self.contents, fh.read())
+            with open_track_file(path, "rb") as fh:
+                self.assertEqual(self.contents.encode(), fh.read())
+
+
+class TestCopyTrackFile(TrackFilesTestCase):
+    """Test tempest_helper.track_files.copy_track_file"""
+
+    def test_compress_and_decompress(self):
+        source = os.path.join(self.runtime_dir, "tracks.txt")
+        with open(source, "w") as fh:
+            fh.write(self.contents)
+        compressed = os.path.join(self.runtime_dir, "tracks.txt.xz")
+        copy_track_file(source, compressed)
+        self.assertEqual("xz", detect_compression(compressed))
+        destination = os.path.join(self.runtime_dir, "tracks_copy.txt")
+        copy_track_file(compressed, destination)
+        with open(destination) as fh:
+            self.assertEqual(self.contents, fh.read())
@@ -0,0 +1,76 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+from unittest import TestCase
+
+import numpy as np
+
+from tempest_helper import TrackFilter
+
+
+class TestTrackFilter(TestCase):
+    """Test tempest_helper.track_filter.TrackFilter"""
+
+    def setUp(self):
+        self.length = np.array([2, 5, 8])
+        self.first_date = np.array(
+            [[2000, 1, 1, 0], [2000, 1, 30, 18], [2000, 2, 10, 0]]
+        )
+        self.last_date = np.array([[2000, 1, 1, 6], [2000, 2, 1, 0], [2000, 2, 12, 0]])
+        self.num_rows = np.array([2, 1, 3])
+        self.columns = {
+            "lon": np.array([350.0, 355.0, 90.0, 5.0, 180.0, 181.0]),
+            "lat": np.array([10.0, 12.0, 20.0, -5.0, 15.0, 16.0]),
+            "psl_min": np.array([1000.0, 990.0, 1005.0, 1010.0, 995.0, 985.0]),
+        }
+
+    def test_min_length(self):
+        track_filter = TrackFilter(min_length=5)
+        np.testing.assert_array_equal(
+            [False, True, True],
+            track_filter.select_headers(self.length, self.first_date, self.last_date),
+        )
+
+    def test_time_window(self):
+        track_filter = TrackFilter(time_window=((2000, 1, 31, 0), (2000, 2, 10, 0)))
+        np.testing.assert_array_equal(
+            [False, True, True],
+            track_filter.select_headers(self.length, self.first_date, self.last_date),
+        )
+
+    def test_bbox_across_meridian(self):
+        track_filter = TrackFilter(bbox=(340.0, 10.0, 0.0, 30.0))
+        np.testing.assert_array_equal(
+            [True, False, False],
+            track_filter.select_tracks(self.columns, self.num_rows),
+        )
+
+    def test_thresholds(self):
+        track_filter = TrackFilter(
+            bbox=(0.0, 360.0, -90.0, 90.0), thresholds={"psl_min": (None, 990.0)}
+        )
+        np.testing.assert_array_equal(
+            [True, False, True],
+            track_filter.select_tracks(self.columns, self.num_rows),
+        )
+        self.assertTrue(track_filter.uses_rows)
+        self.assertFalse(TrackFilter(min_length=2).uses_rows)
+
+    def test_profile_thresholds(self):
+        columns = {
+            "rprof": np.ma.masked_array(
+                [
+                    [1.0, 2.0],
+                    [5.0, 1.0],
+                    [3.0, 3.0],
+                    [9.0, 0.0],
+                    [2.0, 2.0],
+                    [3.0, 4.0],
+                ],
+                mask=[[0, 0], [0, 0], [0, 0], [1, 0], [0, 0], [0, 1]],
+            )
+        }
+        # a profile is in range if any bin that isn't masked is in range
+        track_filter = TrackFilter(thresholds={"rprof": (4.0, None)})
+        np.testing.assert_array_equal(
+            [True, False, False], track_filter.select_tracks(columns, self.num_rows)
+        )
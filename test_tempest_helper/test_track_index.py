@@ -0,0 +1,105 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import gzip
+import os
+
+import numpy as np
+
+from tempest_helper import (
+    TrackFileReader,
+    TrackIndex,
+    build_track_index,
+    load_track_index,
+)
+from .utils import TrackFileTestCase, make_loaded_trajectories
+
+
+class TestBuildTrackIndex(TrackFileTestCase):
+    """Test tempest_helper.track_index.build_track_index"""
+
+    def test_index(self):
+        index = build_track_index(self.track_file)
+        self.assertEqual(3, len(index))
+        line_bytes = np.array([len(line) for line in self.lines])
+        track_bytes = line_bytes.reshape(3, 3).sum(axis=1)
+        np.testing.assert_array_equal(
+            [0, track_bytes[0], track_bytes[:2].sum()], index.offsets
+        )
+        np.testing.assert_array_equal(track_bytes, index.nbytes)
+        np.testing.assert_array_equal([2, 2, 2], index.length)
+        np.testing.assert_array_equal([[2014, 12, 21, 0]] * 3, index.start_date)
+        self.assertTrue(index.is_current(self.track_file))
+
+    def test_save_and_load(self):
+        index_file = os.path.join(self.runtime_dir, "tracks.idx.npz")
+        expected = build_track_index(self.track_file, index_file)
+        actual = TrackIndex.load(index_file)
+        np.testing.assert_array_equal(expected.offsets, actual.offsets)
+        np.testing.assert_array_equal(expected.start_date, actual.start_date)
+        self.assertEqual(expected.file_mtime, actual.file_mtime)
+
+    def test_compressed(self):
+        compressed_file = self.track_file + ".gz"
+        with gzip.open(compressed_file, "wt") as fh:
+            fh.writelines(self.lines)
+        self.assertRaisesRegex(
+            ValueError,
+            "is gzip compressed and so cannot be indexed",
+            build_track_index,
+            compressed_file,
+        )
+
+
+class TestLoadTrackIndex(TrackFileTestCase):
+    """Test tempest_helper.track_index.load_track_index"""
+
+    def test_creates_sidecar(self):
+        load_track_index(self.track_file)
+        self.assertTrue(os.path.exists(self.track_file + ".idx.npz"))
+
+    def test_rebuilds_out_of_date(self):
+        load_track_index(self.track_file)
+        with open(self.track_file, "w") as fh:
+            fh.writelines(self.lines[:6])
+        actual = load_track_index(self.track_file)
+        self.assertEqual(2, len(actual))
+
+
+class TestTrackFileReader(TrackFileTestCase):
+    """Test tempest_helper.track_index.TrackFileReader"""
+
+    def test_single_track(self):
+        expected = make_loaded_trajectories()
+        with TrackFileReader(
+            self.track_file, self.time_axis, 6, self.column_names
+        ) as reader:
+            self.assertEqual(3, len(reader))
+            self.assertTempestDictEqual(expected[2], reader[2])
+            self.assertTempestDictEqual(expected[0], reader[-3])
+
+    def test_ranges(self):
+        expected = make_loaded_trajectories()
+        with TrackFileReader(
+            self.track_file, self.time_axis, 6, self.column_names
+        ) as reader:
+            for selection in (slice(1, 3), [2, 0], slice(None, None, -1)):
+                actual = reader[selection]
+                expected_storms = np.array(expected, dtype=object)[selection]
+                self.assertEqual(len(expected_storms), len(actual))
+                for expected_storm, actual_storm in zip(expected_storms, actual):
+                    self.assertTempestDictEqual(expected_storm, actual_storm)
+
+    def test_out_of_date(self):
+        index = build_track_index(self.track_file)
+        with open(self.track_file, "a") as fh:
+            fh.writelines(self.lines[:3])
+        self.assertRaisesRegex(
+            ValueError,
+            "The index does not match",
+            TrackFileReader,
+            self.track_file,
+            self.time_axis,
+            6,
+            self.column_names,
+            index,
+        )
@@ -0,0 +1,229 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase, mock
+
+import numpy as np
+
+from tempest_helper import (
+    DeduplicationPipeline,
+    TimeAxis,
+    get_trajectories,
+    match_storms,
+    remove_duplicate_storms_many,
+    remove_duplicates_from_track_files,
+    write_track_line,
+)
+from tempest_helper.track_pipeline import PENDING_SUFFIX
+from .utils import make_storm
+
+COLUMN_NAMES = {
+    "grid_x": 0,
+    "grid_y": 1,
+    "lon": 2,
+    "lat": 3,
+    "psl_min": 4,
+    "year": 5,
+    "month": 6,
+    "day": 7,
+    "hour": 8,
+}
+
+# The first and last six hourly step since 2000-01-01 00:00 and the
+# longitude of each storm in each period. The storms that continue past
+# the end of a period are also in the next period, starting a few steps
+# before its start, and one of them continues for all three periods.
+PERIOD_STORMS = [
+    [(0, 9, 10.0), (12, 19, 50.0)],
+    [(16, 39, 50.0), (30, 39, 100.0), (22, 28, 200.0)],
+    [(36, 45, 50.0), (34, 44, 100.0), (41, 50, 300.0)],
+]
+
+PERIOD_LENGTH = 20
+
+
+class TestDeduplicationPipeline(TestCase):
+    """Test tempest_helper.DeduplicationPipeline"""
+
+    def setUp(self):
+        self.maxDiff = None
+        self.directory = tempfile.mkdtemp()
+        self.tracked_files = []
+        self.time_axes = []
+        for period, storms in enumerate(PERIOD_STORMS):
+            path = os.path.join(self.directory, f"track_{period}.txt")
+            with open(path, "w") as file_handle:
+                for first, last, lon in storms:
+                    # a storm that moves north by one grid cell each step
+                    steps = np.arange(first, last + 1)
+                    storm = make_storm(
+                        first,
+                        len(steps),
+                        grid_x=[int(lon)] * len(steps),
+                        grid_y=steps.tolist(),
+                        lon=[lon] * len(steps),
+                        lat=(0.5 * steps).tolist(),
+                        psl_min=(100000.0 - 10.0 * steps).tolist(),
+                    )
+                    header, lines = write_track_line(
+                        storm, len(steps), len(steps), COLUMN_NAMES
+                    )
+                    file_handle.write(header + "".join(lines))
+            self.tracked_files.append(path)
+            self.time_axes.append(
+                TimeAxis((2000, 1, 1 + 5 * period, 0), "standard", PERIOD_LENGTH)
+            )
+        self.output_files = [
+            os.path.join(self.directory, f"track_{period}_adjust.txt")
+            for period in range(len(PERIOD_STORMS))
+        ]
+        self.checkpoint_file = os.path.join(self.directory, "checkpoint.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _expected(self):
+        """Run the steps of the pipeline one pair of files at a time."""
+        expected_files = [
+            os.path.join(self.directory, f"expected_{period}.txt")
+            for period in range(len(PERIOD_STORMS))
+        ]
+        shutil.copyfile(self.tracked_files[0], expected_files[-1])
+        for period in range(1, len(PERIOD_STORMS)):
+            previous_file = os.path.join(self.directory, "previous.txt")
+            shutil.move(expected_files[-1], previous_file)
+            matches = match_storms(
+                get_trajectories(
+                    previous_file, self.time_axes[period - 1], 6, COLUMN_NAMES
+                ),
+                get_trajectories(
+                    self.tracked_files[period], self.time_axes[period], 6, COLUMN_NAMES
+                ),
+            )
+            self.assertTrue(matches)
+            remove_duplicates_from_track_files(
+                previous_file,
+                self.tracked_files[period],
+                expected_files[period - 1],
+                expected_files[-1],
+                matches,
+                COLUMN_NAMES,
+            )
+        contents = []
+        for path in expected_files:
+            with open(path) as file_handle:
+                contents.append(file_handle.read())
+        return contents
+
+    def _actual(self):
+        contents = []
+        for path in self.output_files:
+            with open(path) as file_handle:
+                contents.append(file_handle.read())
+        return contents
+
+    def _pipeline(self):
+        return DeduplicationPipeline(
+            self.tracked_files,
+            self.time_axes,
+            6,
+            COLUMN_NAMES,
+            self.output_files,
+            checkpoint_file=self.checkpoint_file,
+        )
+
+    def test_matches_pairwise(self):
+        self.assertEqual(self.output_files, self._pipeline().run())
+        # the pending files and the checkpoint have been removed
+        self.assertEqual(
+            sorted(
+                os.path.basename(path)
+                for path in self.tracked_files + self.output_files
+            ),
+            sorted(os.listdir(self.directory)),
+        )
+        self.assertEqual(self._expected(), self._actual())
+
+    def test_resume(self):
+        calls = []
+
+        def fail_second(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("interrupted")
+            return match_storms(*args)
+
+        with mock.patch("tempest_helper.track_pipeline.match_storms", fail_second):
+            self.assertRaises(RuntimeError, self._pipeline().run)
+        with open(self.checkpoint_file) as file_handle:
+            self.assertEqual(1, json.load(file_handle)["completed"])
+
+        self._pipeline().run()
+        self.assertFalse(os.path.exists(self.checkpoint_file))
+        self.assertEqual(self._expected(), self._actual())
+
+    def test_resume_before_pending_removed(self):
+        remove_pending = DeduplicationPipeline._remove_pending
+
+        def fail_first(pipeline, period):
+            if period == 0:
+                raise RuntimeError("interrupted")
+            remove_pending(pipeline, period)
+
+        with mock.patch.object(DeduplicationPipeline, "_remove_pending", fail_first):
+            self.assertRaises(RuntimeError, self._pipeline().run)
+        with open(self.checkpoint_file) as file_handle:
+            self.assertEqual(1, json.load(file_handle)["completed"])
+        self.assertTrue(os.path.exists(self.output_files[0] + PENDING_SUFFIX))
+
+        self._pipeline().run()
+        self.assertFalse(os.path.exists(self.output_files[0] + PENDING_SUFFIX))
+        self.assertEqual(self._expected(), self._actual())
+
+    def test_resume_before_checkpoint_written(self):
+        write_checkpoint = DeduplicationPipeline._write_checkpoint
+
+        def fail_second(pipeline, completed):
+            if completed == 2:
+                raise RuntimeError("interrupted")
+            write_checkpoint(pipeline, completed)
+
+        with mock.patch.object(DeduplicationPipeline, "_write_checkpoint", fail_second):
+            self.assertRaises(RuntimeError, self._pipeline().run)
+        with open(self.checkpoint_file) as file_handle:
+            self.assertEqual(1, json.load(file_handle)["completed"])
+        # the pending file of the last completed pair is still there
+        self.assertTrue(os.path.exists(self.output_files[1] + PENDING_SUFFIX))
+
+        self._pipeline().run()
+        self.assertEqual(self._expected(), self._actual())
+
+    def test_matches_in_memory(self):
+        self._pipeline().run()
+        expected = [
+            get_trajectories(path, time_axis, 6, COLUMN_NAMES)
+            for path, time_axis in zip(self.output_files, self.time_axes)
+        ]
+        actual = remove_duplicate_storms_many(
+            [
+                get_trajectories(path, time_axis, 6, COLUMN_NAMES)
+                for path, time_axis in zip(self.tracked_files, self.time_axes)
+            ],
+            self.time_axes,
+            6,
+        )
+        self.assertEqual(expected, actual)
+
+    def test_different_lengths(self):
+        self.assertRaises(
+            ValueError,
+            DeduplicationPipeline,
+            self.tracked_files,
+            self.time_axes[:2],
+            6,
+            COLUMN_NAMES,
+            self.output_files,
+        )
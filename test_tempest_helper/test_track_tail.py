@@ -0,0 +1,52 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+from tempest_helper import TrackFileTail
+from .utils import TrackFileTestCase, make_loaded_trajectories
+
+
+class TestTrackFileTail(TrackFileTestCase):
+    """Test tempest_helper.track_tail.TrackFileTail"""
+
+    def setUp(self):
+        super().setUp()
+        self.expected = make_loaded_trajectories()
+        self.tail = TrackFileTail(self.track_file, self.time_axis, 6, self.column_names)
+
+    def _write(self, text, mode="a"):
+        with open(self.track_file, mode) as fh:
+            fh.write(text)
+
+    def test_growing_file(self):
+        # the first track and part of the second
+        self._write("".join(self.lines[:5]), "w")
+        tracks = self.tail.read()
+        self.assertEqual([0, 1], list(tracks))
+        self.assertTempestDictEqual(self.expected[0], tracks[0])
+        self.assertEqual(1, len(tracks[1]["lat"]))
+        # nothing new
+        self.assertEqual({}, self.tail.read())
+        # finish the second track and write part of a line
+        self._write(self.lines[5] + self.lines[6][:10])
+        tracks = self.tail.read()
+        self.assertEqual([1], list(tracks))
+        self.assertTempestDictEqual(self.expected[1], tracks[1])
+        # finish the file
+        self._write("".join(self.lines[6:])[10:])
+        tracks = self.tail.read()
+        self.assertEqual([2], list(tracks))
+        self.assertTempestDictEqual(self.expected[2], tracks[2])
+        self.assertEqual(3, self.tail.n_complete)
+
+    def test_header_only(self):
+        self._write("".join(self.lines[:4]), "w")
+        self.assertEqual([0], list(self.tail.read()))
+        self._write(self.lines[4])
+        self.assertEqual([1], list(self.tail.read()))
+
+    def test_replaced_file(self):
+        self._write("".join(self.lines), "w")
+        self.assertEqual([0, 1, 2], list(self.tail.read()))
+        self._write("".join(self.lines[:3]), "w")
+        tracks = self.tail.read()
+        self.assertEqual([0], list(tracks))
+        self.assertTempestDictEqual(self.expected[0], tracks[0])
@@ -0,0 +1,125 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from tempest_helper import (
+    TimeAxis,
+    TrackFileWriter,
+    TrajectorySet,
+    fill_trajectory_set_gaps,
+    get_trajectories,
+    open_track_file,
+    write_track_line,
+)
+from .utils import make_storm
+
+COLUMN_NAMES = {
+    "grid_x": 0,
+    "grid_y": 1,
+    "lon": 2,
+    "lat": 3,
+    "psl_min": 4,
+    "rprof": 5,
+    "year": 6,
+    "month": 7,
+    "day": 8,
+    "hour": 9,
+}
+
+
+def _make_storm(start, length, missing=()):
+    """Make a storm with a pressure and a profile variable."""
+    steps = range(start, start + length)
+    return make_storm(
+        start,
+        length,
+        missing=missing,
+        psl_min=[99000.0 + step for step in steps],
+        rprof=[[1.5 * step, 2.0, 3.0] for step in steps],
+    )
+
+
+class TestTrackFileWriter(TestCase):
+    """Test tempest_helper.TrackFileWriter"""
+
+    def setUp(self):
+        self.runtime_dir = tempfile.mkdtemp()
+        self.storms = [_make_storm(0, 3), _make_storm(2, 5), _make_storm(5, 1)]
+        self.expected = ""
+        for storm in self.storms:
+            header, lines = write_track_line(
+                storm, len(storm["step"]), storm["length"], COLUMN_NAMES
+            )
+            self.expected += header + "".join(lines)
+
+    def tearDown(self):
+        shutil.rmtree(self.runtime_dir, ignore_errors=True)
+
+    def _write(self, path, *trajectories, **kwargs):
+        with TrackFileWriter(path, COLUMN_NAMES, **kwargs) as writer:
+            for part in trajectories:
+                writer.write(part)
+        with open_track_file(path) as file_handle:
+            return file_handle.read()
+
+    def test_matches_write_track_line(self):
+        path = os.path.join(self.runtime_dir, "tracks.txt")
+        self.assertEqual(self.expected, self._write(path, self.storms))
+
+    def test_trajectory_set(self):
+        path = os.path.join(self.runtime_dir, "tracks.txt")
+        trajectory_set = TrajectorySet.from_storms(self.storms)
+        self.assertEqual(
+            self.expected,
+            self._write(path, trajectory_set[:1], trajectory_set[1:], buffer_size=1),
+        )
+
+    def test_compressed(self):
+        path = os.path.join(self.runtime_dir, "tracks.txt.gz")
+        self.assertEqual(self.expected, self._write(path, self.storms))
+
+    def test_round_trip(self):
+        path = os.path.join(self.runtime_dir, "tracks.txt")
+        self._write(path, self.storms)
+        storms = get_trajectories(
+            path, TimeAxis((2000, 1, 1, 0), "standard", 10), 6, COLUMN_NAMES
+        )
+        self.assertEqual(self.storms, storms)
+
+    def test_missing_column(self):
+        path = os.path.join(self.runtime_dir, "tracks.txt")
+        storms = [
+            {name: values for name, values in storm.items() if name != "psl_min"}
+            for storm in self.storms
+        ]
+        with TrackFileWriter(path, COLUMN_NAMES) as writer:
+            self.assertRaises(ValueError, writer.write, storms)
+
+    def test_gaps_filled(self):
+        path = os.path.join(self.runtime_dir, "tracks.txt")
+        time_axis = TimeAxis((2000, 1, 1, 0), "standard", 360)
+        filled = fill_trajectory_set_gaps(
+            TrajectorySet.from_storms(
+                [
+                    _make_storm(0, 5, [2, 3]),
+                    _make_storm(2, 4, [1]),
+                    _make_storm(5, 1),
+                ]
+            ),
+            time_axis,
+            6,
+            miss_val=-999.0,
+        )
+        self._write(path, filled)
+        # the header of each track gives the number of rows that follow it and
+        # the profiles at the added points have the missing value
+        expected = filled.to_storms()
+        for storm in expected:
+            storm["length"] = len(storm["step"])
+        self.assertEqual([5, 4, 1], [storm["length"] for storm in expected])
+        self.assertEqual([-999.0] * 3, expected[0]["rprof"][2])
+        storms = get_trajectories(path, time_axis, 6, COLUMN_NAMES)
+        self.assertEqual(expected, storms)
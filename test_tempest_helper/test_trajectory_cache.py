@@ -0,0 +1,108 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import os
+
+from tempest_helper import TimeAxis, TrajectoryCache, TrajectorySet, get_trajectories
+from .utils import TrackFileTestCase, make_loaded_trajectories
+
+
+class TestTrajectoryCache(TrackFileTestCase):
+    """Test tempest_helper.trajectory_cache.TrajectoryCache"""
+
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = os.path.join(self.runtime_dir, "cache")
+
+    def _entries(self):
+        return sorted(
+            name for name in os.listdir(self.cache_dir) if name.endswith(".npz")
+        )
+
+    def test_get_trajectories(self):
+        cache = TrajectoryCache(self.cache_dir)
+        for _ in range(2):
+            storms = get_trajectories(
+                self.track_file, self.time_axis, 6, self.column_names, cache=cache
+            )
+            for expected, actual in zip(make_loaded_trajectories(), storms):
+                self.assertTempestDictEqual(expected, actual)
+        self.assertEqual(1, len(self._entries()))
+        trajectory_set = get_trajectories(
+            self.track_file,
+            self.time_axis,
+            6,
+            self.column_names,
+            as_trajectory_set=True,
+            cache=self.cache_dir,
+        )
+        self.assertIsInstance(trajectory_set, TrajectorySet)
+        self.assertEqual(1, len(self._entries()))
+
+    def test_key_changes(self):
+        cache = TrajectoryCache(self.cache_dir)
+        key = cache.key(self.track_file, self.time_axis, 6, self.column_names)
+        self.assertEqual(
+            key, cache.key(self.track_file, self.time_axis, 6, self.column_names)
+        )
+        other_axis = TimeAxis((2014, 12, 21, 6), "standard", 11)
+        self.assertNotEqual(
+            key, cache.key(self.track_file, other_axis, 6, self.column_names)
+        )
+        column_names = dict(self.column_names, orog_max=8)
+        self.assertNotEqual(
+            key, cache.key(self.track_file, self.time_axis, 6, column_names)
+        )
+        with open(self.track_file, "a") as fh:
+            fh.write("\n")
+        self.assertNotEqual(
+            key, cache.key(self.track_file, self.time_axis, 6, self.column_names)
+        )
+
+    def test_eviction(self):
+        cache = TrajectoryCache(self.cache_dir)
+        trajectory_set = TrajectorySet.from_storms(make_loaded_trajectories())
+        cache.save("first", trajectory_set)
+        cache.max_size = os.path.getsize(os.path.join(self.cache_dir, "first.npz"))
+        cache.save("second", trajectory_set)
+        self.assertEqual(["second.npz"], self._entries())
+        cache.max_size *= 2
+        cache.save("third", trajectory_set)
+        # loading an entry makes it the most recently used
+        os.utime(os.path.join(self.cache_dir, "second.npz"), ns=(0, 0))
+        self.assertIsNotNone(cache.load("second"))
+        cache.save("fourth", trajectory_set)
+        self.assertEqual(["fourth.npz", "second.npz"], self._entries())
+        self.assertIsNone(cache.load("third"))
+
+    def test_file_hash_recorded(self):
+        key = TrajectoryCache(self.cache_dir).key(
+            self.track_file, self.time_axis, 6, self.column_names
+        )
+        self.assertIn("file_hashes.json", os.listdir(self.cache_dir))
+        # change the contents of the track file without changing its size or
+        # modification time, which a new cache in the same directory only
+        # notices if it hashes the file again
+        file_stat = os.stat(self.track_file)
+        with open(self.track_file, "r+") as fh:
+            fh.write("x")
+        os.utime(self.track_file, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns))
+        self.assertEqual(
+            key,
+            TrajectoryCache(self.cache_dir).key(
+                self.track_file, self.time_axis, 6, self.column_names
+            ),
+        )
+
+    def test_corrupt_entry(self):
+        cache = TrajectoryCache(self.cache_dir)
+        trajectory_set = TrajectorySet.from_storms(make_loaded_trajectories())
+        cache.save("entry", trajectory_set)
+        path = os.path.join(self.cache_dir, "entry.npz")
+        with open(path, "r+b") as fh:
+            fh.truncate(os.path.getsize(path) // 2)
+        self.assertIsNone(cache.load("entry"))
+        self.assertFalse(os.path.exists(path))
+        with open(path, "wb") as fh:
+            fh.write(b"not an npz file")
+        self.assertIsNone(cache.load("entry"))
+        self.assertFalse(os.path.exists(path))
@@ -1,23 +1,30 @@
 # (C) British Crown Copyright 2022, Met Office.
 # Please see LICENSE for license details.
+import io
 import os
 import tempfile
 
 import cf_units
 from iris.tests.stock import realistic_3d
+import numpy as np
 
 
 from .utils import make_column_names, TempestHelperTestCase
+from tempest_helper import TimeAxis, TrajectorySet
 from tempest_helper.trajectory_manipulations import (
     _calculate_gap_time,
     convert_date_to_step,
+    convert_dates_to_steps,
     fill_trajectory_gaps,
+    fill_trajectory_set_gaps,
     storms_overlap_in_time,
     storm_overlap_in_space,
     write_track_line,
+    remove_duplicate_storms,
     remove_duplicates_from_track_files,
 )
 from tempest_helper.save_trajectories import save_trajectories_netcdf
+from tempest_helper.track_files import copy_track_file, open_track_file
 
 
 class TestConvertDateToStep(TempestHelperTestCase):
@@ -53,6 +60,51 @@ class TestConvertDateToStep(TempestHelperTestCase):
         self.assertEqual(expected, actual)
 
 
+class TestConvertDatesToSteps(TempestHelperTestCase):
+    """Test tempest_helper.trajectory_manipulations.convert_dates_to_steps"""
+
+    def test_conversion(self):
+        """Test standard conversion"""
+        cube = realistic_3d()
+        # realistic_3d()'s first time point is 2014-12-21 00:00:00
+        actual = convert_dates_to_steps(
+            cube,
+            [2014, 2014, 2014, 2015],
+            [12, 12, 12, 1],
+            [21, 22, 21, 1],
+            [0, 0, 6, 0],
+            6,
+        )
+        np.testing.assert_array_equal([1, 5, 2, 45], actual)
+
+    def test_different_calendar(self):
+        """Test a different calendar"""
+        cube = realistic_3d()
+        cal_360day = cf_units.Unit(
+            "hours since 1970-01-01 00:00:00",
+            calendar=cf_units.CALENDAR_360_DAY,
+        )
+        # realistic_3d() in 360_day starts at 2015-08-16 00:00:00
+        cube.coord("time").units = cal_360day
+        actual = convert_dates_to_steps(
+            cube, np.array([2015, 2015]), [8, 9], [16, 1], [6, 0], 6
+        )
+        np.testing.assert_array_equal([2, 61], actual)
+
+    def test_matches_convert_date_to_step(self):
+        """Test against the single point conversion in a leap year"""
+        cube = realistic_3d()
+        dates = [(2016, 2, 28, 18), (2016, 2, 29, 0), (2016, 3, 1, 0), (2014, 1, 1, 3)]
+        expected = [convert_date_to_step(cube, *date, 3) for date in dates]
+        actual = convert_dates_to_steps(cube, *np.array(dates).T, 3)
+        np.testing.assert_array_equal(expected, actual)
+
+    def test_empty(self):
+        """Test no points"""
+        actual = convert_dates_to_steps(realistic_3d(), [], [], [], [], 6)
+        self.assertEqual((0,), actual.shape)
+
+
 class TestFillTrajectoryGaps(TempestHelperTestCase):
     """Test tempest_helper.trajectory_manipulations.fill_trajectory_gaps()"""
 
@@ -236,6 +288,143 @@ class TestFillTrajectoryGaps(TempestHelperTestCase):
         self.assertTempestDictEqual(expected, storm)
 
 
+class TestFillTrajectorySetGaps(TempestHelperTestCase):
+    """Test tempest_helper.trajectory_manipulations.fill_trajectory_set_gaps()"""
+
+    def setUp(self):
+        self.time_axis = TimeAxis((2000, 1, 1, 0), "360_day", 10)
+        # the points of each track, with gaps in the steps and longitudes and
+        # grid x indices that wrap around
+        self.tracks = [
+            [
+                (1, 8, 2, 355.0, -10.0, 1000.0, [1.0, 2.0]),
+                (4, 1, 5, 5.0, -12.5, 990.0, [3.0, 4.0]),
+                (5, 2, 6, 6.0, -13.0, 985.0, [5.0, 6.0]),
+                (9, 5, 1, 1.3, -11.1, 1001.7, [7.0, 8.0]),
+            ],
+            [(2, 3, 3, 100.0, 20.0, 1010.0, [0.5, 0.5])],
+            [
+                (3, 0, 9, 10.0, 30.0, 1005.0, [1.5, 2.5]),
+                (6, 9, 3, 351.2, 31.7, 998.3, [3.5, 4.5]),
+            ],
+        ]
+
+    def _storm(self, points):
+        names = ("step", "grid_x", "grid_y", "lon", "lat", "psl", "rprof")
+        storm = {"length": len(points)}
+        for name in names + ("year", "month", "day", "hour"):
+            storm[name] = []
+        for point in points:
+            for name, value in zip(names, point):
+                storm[name].append(value)
+            date = _calculate_gap_time(self.time_axis, 1999, 12, 30, 18, 6 * point[0])
+            for name, value in zip(("year", "month", "day", "hour"), date):
+                storm[name].append(value)
+        return storm
+
+    def _fill_storms(self, **kwargs):
+        """Fill the gaps in each track with fill_trajectory_gaps()."""
+        expected = []
+        for points in self.tracks:
+            storm = self._storm(points[:1])
+            for point in points[1:]:
+                new_storm = self._storm([point])
+                if point[0] - storm["step"][-1] > 1:
+                    fill_trajectory_gaps(
+                        storm,
+                        point[0],
+                        point[3],
+                        point[4],
+                        point[1],
+                        point[2],
+                        self.time_axis,
+                        6,
+                        {"psl": point[5], "rprof": point[6]},
+                        **kwargs,
+                    )
+                for name in new_storm:
+                    if name != "length":
+                        storm[name].extend(new_storm[name])
+            storm["length"] = len(points)
+            expected.append(storm)
+        return expected
+
+    def test_matches_fill_trajectory_gaps(self):
+        expected = self._fill_storms()
+        trajectory_set = TrajectorySet.from_storms(
+            [self._storm(points) for points in self.tracks]
+        )
+        actual = fill_trajectory_set_gaps(trajectory_set, self.time_axis, 6)
+        np.testing.assert_array_equal([0, 9, 10], actual.first_pt)
+        np.testing.assert_array_equal([9, 1, 4], actual.num_pts)
+        np.testing.assert_array_equal([4, 1, 2], actual.length)
+        self.assertEqual(expected, actual.to_storms())
+        np.testing.assert_array_equal(
+            [False, True, True, False, False, True, True, True, False],
+            actual.columns["rprof"].mask[:9, 0],
+        )
+
+    def test_miss_val(self):
+        expected = self._fill_storms(miss_val=-999.0)
+        trajectory_set = TrajectorySet.from_storms(
+            [self._storm(points) for points in self.tracks]
+        )
+        actual = fill_trajectory_set_gaps(
+            trajectory_set, self.time_axis, 6, miss_val=-999.0
+        )
+        self.assertEqual(expected, actual.to_storms())
+        # the missing value is kept when the set is split, joined and saved
+        actual = TrajectorySet.concatenate([actual[:1], actual[1:]])
+        self.assertEqual(expected, actual.to_storms())
+        file_handle = io.BytesIO()
+        actual.save(file_handle)
+        file_handle.seek(0)
+        self.assertEqual(expected, TrajectorySet.load(file_handle).to_storms())
+
+    def test_no_gaps(self):
+        trajectory_set = TrajectorySet.from_storms(
+            [self._storm(self.tracks[1]), self._storm(self.tracks[1])]
+        )
+        actual = fill_trajectory_set_gaps(trajectory_set, self.time_axis, 6)
+        self.assertEqual(trajectory_set.to_storms(), actual.to_storms())
+
+    def test_no_nx(self):
+        time_axis = TimeAxis((2000, 1, 1, 0), "360_day")
+        trajectory_set = TrajectorySet.from_storms(
+            [self._storm(points) for points in self.tracks]
+        )
+        self.assertRaisesRegex(
+            ValueError,
+            "number of points along the longitude axis",
+            fill_trajectory_set_gaps,
+            trajectory_set,
+            time_axis,
+            6,
+        )
+        # the number of points isn't needed if there are no gaps
+        trajectory_set = TrajectorySet.from_storms([self._storm(self.tracks[1])])
+        actual = fill_trajectory_set_gaps(trajectory_set, time_axis, 6)
+        self.assertEqual(trajectory_set.to_storms(), actual.to_storms())
+
+    def test_fill_trajectory_gaps_no_nx(self):
+        storm = self._storm(self.tracks[0][:1])
+        point = self.tracks[0][1]
+        self.assertRaisesRegex(
+            ValueError,
+            "number of points along the longitude axis",
+            fill_trajectory_gaps,
+            storm,
+            point[0],
+            point[3],
+            point[4],
+            point[1],
+            point[2],
+            TimeAxis((2000, 1, 1, 0), "360_day"),
+            6,
+            {"psl": point[5], "rprof": point[6]},
+        )
+
+
 class TestCalculateGapTime(TempestHelperTestCase):
     """Test tempest_helper.trajectory_manipulations._calculate_gap_time()"""
 
@@ -333,6 +522,37 @@ class TestStormsOverlapInTime(TempestHelperTestCase):
         for exp_storm, act_storm in zip(expected_storms, actual):
             self.assertTempestDictEqual(exp_storm, act_storm)
 
+    def test_gaps(self):
+        """Storms that are interleaved in time but have no times in common"""
+        storm = {
+            "length": 2,
+            "step": [1, 4],
+            "grid_y": [0, 3],
+            "grid_x": [0, 3],
+            "lat": [0.0, 3.0],
+            "lon": [0.0, 3.0],
+            "year": [2000, 2000],
+            "month": [1, 1],
+            "day": [1, 1],
+            "hour": [0, 18],
+            "psl_min": [100000.0, 99997.0],
+        }
+        storm1 = {
+            "length": 2,
+            "step": [2, 3],
+            "grid_y": [1, 2],
+            "grid_x": [1, 2],
+            "lat": [1.0, 2.0],
+            "lon": [1.0, 2.0],
+            "year": [2000, 2000],
+            "month": [1, 1],
+            "day": [1, 1],
+            "hour": [6, 12],
+            "psl_min": [99999.0, 99998.0],
+        }
+        self.assertEqual([], storms_overlap_in_time(storm, [storm1]))
+        self.assertIsNone(storm_overlap_in_space(storm, [storm1]))
+
 
 class TestStormOverlapInSpace(TempestHelperTestCase):
     """Test tempest_helper.trajectory_manipulations.storms_overlap_in_space()"""
@@ -469,6 +689,19 @@ class TestStormOverlapInSpace(TempestHelperTestCase):
         actual = storm_overlap_in_space(self.storm, storms)
         self.assertTempestDictSubdictEqual(expected_storms, actual)
 
+    def test_overlap_across_meridian(self):
+        """Test for storms either side of the 0/360 degree meridian"""
+        storm = dict(self.storm1, lon=[359.8, 0.8])
+        actual = storm_overlap_in_space(self.storm, [storm])
+        self.assertEqual("remove", actual["method"])
+
+    def test_threshold_in_km(self):
+        """Test for a distance threshold in km"""
+        storm = dict(self.storm1, lat=[0.3, 1.3])
+        self.assertIsNone(storm_overlap_in_space(self.storm, [storm], 30.0, "km"))
+        actual = storm_overlap_in_space(self.storm, [storm], 40.0, "km")
+        self.assertEqual("remove", actual["method"])
+
 
 class TestWriteTrackLine(TempestHelperTestCase):
     """Test tempest_helper.trajectory_manipulations.write_track_line()"""
@@ -570,16 +803,6 @@ class TestRemoveDuplicatesFromTrackFiles(TempestHelperTestCase):
         with open(self.tracked_file_T_adjust, "w") as fh:
             fh.write(tracked_file_T_adjust_txt)
 
-    def tearDown(self):
-        # Remove the temporary files
-        os.remove(self.tracked_file_Tm1_adjust_test)
-        os.remove(self.tracked_file_T_adjust_test)
-        os.remove(self.tracked_file_Tm1)
-        os.remove(self.tracked_file_T)
-        os.remove(self.tracked_file_Tm1_adjust)
-        os.remove(self.tracked_file_T_adjust)
-
-    def test_simple(self):
         storm_previous = {
             "length": 3,
             "step": [1, 2, 3],
@@ -613,7 +836,7 @@ class TestRemoveDuplicatesFromTrackFiles(TempestHelperTestCase):
             "orog_max": [8.0, 6.0, 4.0],
         }
 
-        column_names = {
+        self.column_names = {
             "grid_x": 0,
             "grid_y": 1,
             "lon": 2,
@@ -630,7 +853,7 @@ class TestRemoveDuplicatesFromTrackFiles(TempestHelperTestCase):
 
         # This is the storm matching output for the above storms
         # (which are also in the input files)
-        storms_match = [
+        self.storms_match = [
             {
                 "early": storm_previous,
                 "late": storm_current,
@@ -641,14 +864,24 @@ class TestRemoveDuplicatesFromTrackFiles(TempestHelperTestCase):
             }
         ]
 
+    def tearDown(self):
+        # Remove the temporary files
+        os.remove(self.tracked_file_Tm1_adjust_test)
+        os.remove(self.tracked_file_T_adjust_test)
+        os.remove(self.tracked_file_Tm1)
+        os.remove(self.tracked_file_T)
+        os.remove(self.tracked_file_Tm1_adjust)
+        os.remove(self.tracked_file_T_adjust)
+
+    def test_simple(self):
         # Rewrite the files
         remove_duplicates_from_track_files(
             self.tracked_file_Tm1,
             self.tracked_file_T,
             self.tracked_file_Tm1_adjust_test,
             self.tracked_file_T_adjust_test,
-            storms_match,
-            column_names,
+            self.storms_match,
+            self.column_names,
         )
 
         # Read the adjusted file contents from the files
@@ -663,3 +896,123 @@ class TestRemoveDuplicatesFromTrackFiles(TempestHelperTestCase):
 
         self.assertEqual(exp_tm1, act_tm1)
         self.assertEqual(exp_t, act_t)
+
+    def test_compressed(self):
+        """Test compressed input and output files"""
+        tracked_file_Tm1_gz = self.tracked_file_Tm1 + ".gz"
+        tracked_file_T_bz2 = self.tracked_file_T + ".bz2"
+        tracked_file_T_adjust_xz = self.tracked_file_T_adjust_test + ".xz"
+        copy_track_file(self.tracked_file_Tm1, tracked_file_Tm1_gz)
+        copy_track_file(self.tracked_file_T, tracked_file_T_bz2)
+        try:
+            remove_duplicates_from_track_files(
+                tracked_file_Tm1_gz,
+                tracked_file_T_bz2,
+                self.tracked_file_Tm1_adjust_test,
+                tracked_file_T_adjust_xz,
+                self.storms_match,
+                self.column_names,
+            )
+            with open(self.tracked_file_T_adjust) as fh:
+                exp_t = fh.read()
+            with open_track_file(tracked_file_T_adjust_xz) as fh:
+                act_t = fh.read()
+            self.assertEqual(exp_t, act_t)
+        finally:
+            for path in (
+                tracked_file_Tm1_gz,
+                tracked_file_T_bz2,
+                tracked_file_T_adjust_xz,
+            ):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+class TestRemoveDuplicateStorms(TempestHelperTestCase):
+    """Test tempest_helper.trajectory_manipulations.remove_duplicate_storms()"""
+
+    def setUp(self):
+        self.storm_previous = {
+            "length": 3,
+            "step": [1, 2, 3],
+            "lat": [0.0, 1.0, 2.0],
+            "lon": [0.0, 1.0, 2.0],
+            "year": [2000, 2000, 2000],
+            "month": [1, 1, 1],
+            "day": [1, 1, 1],
+            "hour": [6, 12, 18],
+            "psl_min": [100000.0, 99999.0, 99998.0],
+        }
+        self.storm_current = {
+            "length": 3,
+            "step": [1, 2, 3],
+            "lat": [1.0, 2.0, 3.0],
+            "lon": [1.0, 2.0, 3.0],
+            "year": [2000, 2000, 2000],
+            "month": [1, 1, 1],
+            "day": [1, 1, 2],
+            "hour": [12, 18, 0],
+            "psl_min": [99999.0, 99998.0, 99997.0],
+        }
+        self.storm_other = {
+            "length": 1,
+            "step": [1],
+            "lat": [50.0],
+            "lon": [50.0],
+            "year": [2000],
+            "month": [1],
+            "day": [1],
+            "hour": [12],
+            "psl_min": [99000.0],
+        }
+        self.time_axis = TimeAxis((2000, 1, 1, 12), "standard", 10)
+
+    def _match(self, method):
+        return {
+            "early": self.storm_previous,
+            "late": self.storm_current,
+            "time_c": 0,
+            "time_p": 1,
+            "offset": 1,
+            "method": method,
+        }
+
+    def test_extend(self):
+        previous, current = remove_duplicate_storms(
+            [self.storm_previous, self.storm_other],
+            [self.storm_current],
+            [self._match("extend")],
+            self.time_axis,
+            6,
+        )
+        expected = {
+            "length": 4,
+            "step": [0, 1, 2, 3],
+            "lat": [0.0, 1.0, 2.0, 3.0],
+            "lon": [0.0, 1.0, 2.0, 3.0],
+            "year": [2000, 2000, 2000, 2000],
+            "month": [1, 1, 1, 1],
+            "day": [1, 1, 1, 2],
+            "hour": [6, 12, 18, 0],
+            "psl_min": [100000.0, 99999.0, 99998.0, 99997.0],
+        }
+        self.assertEqual([self.storm_other], previous)
+        self.assertEqual([expected], current)
+
+    def test_remove_only(self):
+        previous, current = remove_duplicate_storms(
+            [self.storm_previous, self.storm_other],
+            [self.storm_current],
+            [self._match("remove")],
+            self.time_axis,
+            6,
+        )
+        self.assertEqual([self.storm_other], previous)
+        self.assertEqual([self.storm_current], current)
+
+    def test_no_matches(self):
+        previous, current = remove_duplicate_storms(
+            [self.storm_previous], [self.storm_current], [], self.time_axis, 6
+        )
+        self.assertEqual([self.storm_previous], previous)
+        self.assertEqual([self.storm_current], current)
@@ -0,0 +1,265 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+from unittest import TestCase, mock
+
+import numpy as np
+
+from tempest_helper import (
+    PointIndex,
+    TimeAxis,
+    TimeIntervalIndex,
+    TrajectorySet,
+    great_circle_distance,
+    match_storms,
+    storm_overlap_in_space,
+    storms_overlap_in_time,
+)
+from tempest_helper.trajectory_set import _ranges
+from .utils import make_storm
+
+
+def _make_storms(calendar, starts, lengths):
+    """Make storms that stay at the origin, with a point every six hours."""
+    return [
+        make_storm(start, length, calendar, lon=[0.0] * length, lat=[0.0] * length)
+        for start, length in zip(starts, lengths)
+    ]
+
+
+def _storm_dates(storm):
+    return set(zip(storm["year"], storm["month"], storm["day"], storm["hour"]))
+
+
+class TestTimeIntervalIndex(TestCase):
+    """Test tempest_helper.trajectory_matching.TimeIntervalIndex"""
+
+    def setUp(self):
+        time_axis = TimeAxis((2000, 1, 1, 0), "standard")
+        rng = np.random.default_rng(1)
+        self.storms_x = _make_storms(
+            time_axis.calendar, rng.integers(0, 400, 50), rng.integers(1, 40, 50)
+        )
+        self.storms_y = _make_storms(
+            time_axis.calendar, rng.integers(0, 400, 60), rng.integers(1, 40, 60)
+        )
+
+    def test_overlapping_pairs(self):
+        expected = [
+            (i, j)
+            for i, storm_x in enumerate(self.storms_x)
+            for j, storm_y in enumerate(self.storms_y)
+            if _storm_dates(storm_x) & _storm_dates(storm_y)
+        ]
+        index_x = TimeIntervalIndex.from_storms(self.storms_x)
+        index_y = TimeIntervalIndex.from_storms(self.storms_y)
+        actual = index_y.overlapping_pairs(index_x)
+        self.assertEqual(expected, list(zip(*(values.tolist() for values in actual))))
+
+    def test_trajectory_set(self):
+        index = TimeIntervalIndex.from_storms(self.storms_y)
+        set_index = TimeIntervalIndex.from_storms(
+            TrajectorySet.from_storms(self.storms_y)
+        )
+        np.testing.assert_array_equal(index.start, set_index.start)
+        np.testing.assert_array_equal(index.end, set_index.end)
+
+    def test_overlapping(self):
+        index = TimeIntervalIndex([0, 10, 5, 30], [4, 20, 12, 31])
+        np.testing.assert_array_equal([1, 2], index.overlapping(11, 15))
+        np.testing.assert_array_equal([0], index.overlapping(4, 4))
+        self.assertEqual(0, len(index.overlapping(21, 29)))
+
+    def test_empty(self):
+        index = TimeIntervalIndex([], [])
+        self.assertEqual(0, len(index.overlapping(0, 10)))
+
+    def test_long_trajectory(self):
+        # many short trajectories and one that spans all of them
+        start = np.append(np.arange(0, 10000, 10), 0)
+        end = np.append(start[:-1] + 2, 10000)
+        index = TimeIntervalIndex(start, end)
+        query_start = np.arange(5, 9990, 10)
+        ranges = []
+
+        def record_ranges(starts, counts):
+            values = _ranges(starts, counts)
+            ranges.append(values)
+            return values
+
+        with mock.patch(
+            "tempest_helper.trajectory_matching._ranges", side_effect=record_ranges
+        ):
+            query_index, indices = index.query(query_start, query_start + 6)
+        # each interval overlaps with the trajectory that starts in it and
+        # the long trajectory
+        np.testing.assert_array_equal(np.repeat(np.arange(999), 2), query_index)
+        np.testing.assert_array_equal(
+            np.column_stack((np.arange(1, 1000), np.full(999, 1000))).ravel(),
+            indices,
+        )
+        # only the overlaps are compared, however long the trajectories are
+        self.assertEqual(len(query_index), sum(len(values) for values in ranges))
+
+
+class TestPointIndex(TestCase):
+    """Test tempest_helper.trajectory_matching.PointIndex"""
+
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        # points clustered near the poles and the 0/360 degree meridian
+        self.time = rng.integers(0, 3, 400)
+        self.lon = rng.choice([0.0, 90.0, 359.0], 400) + rng.uniform(-3, 3, 400)
+        self.lon %= 360
+        self.lat = rng.choice([-89.0, 0.0, 89.0], 400) + rng.uniform(-1, 1, 400)
+
+    def _brute_force(self, threshold, units):
+        pairs = []
+        for i in range(len(self.time)):
+            distance = great_circle_distance(
+                self.lon[i], self.lat[i], self.lon, self.lat, units
+            )
+            close = (self.time == self.time[i]) & (distance <= threshold)
+            pairs.extend((i, j) for j in np.flatnonzero(close))
+        return pairs
+
+    def test_query(self):
+        for threshold, units in ((2.0, "degrees"), (150.0, "km")):
+            with self.subTest(units=units):
+                index = PointIndex(self.time, self.lon, self.lat, threshold, units)
+                query_index, point_index, distance = index.query(
+                    self.time, self.lon, self.lat
+                )
+                self.assertEqual(
+                    self._brute_force(threshold, units),
+                    list(zip(query_index.tolist(), point_index.tolist())),
+                )
+                self.assertTrue(np.all(distance <= threshold))
+
+    def test_from_storms(self):
+        storms = [
+            {
+                "year": [2000, 2000],
+                "month": [1, 1],
+                "day": [1, 1],
+                "hour": [0, 6],
+                "lon": [359.9, 0.5],
+                "lat": [10.0, 10.5],
+            },
+            {
+                "year": [2000],
+                "month": [1],
+                "day": [1],
+                "hour": [6],
+                "lon": [0.1],
+                "lat": [10.0],
+            },
+        ]
+        index = PointIndex.from_storms(storms, 100.0, "km")
+        query_index, point_index, _distance = index.query(
+            index.time, [0.0] * 3, [10.0] * 3
+        )
+        np.testing.assert_array_equal([0, 1, 1, 2, 2], query_index)
+        np.testing.assert_array_equal([0, 1, 2, 1, 2], point_index)
+
+
+class TestGreatCircleDistance(TestCase):
+    """Test tempest_helper.trajectory_matching.great_circle_distance()"""
+
+    def test_across_meridian(self):
+        np.testing.assert_allclose(
+            [0.5, 90.0],
+            great_circle_distance([359.75, 0.0], [0.0, 0.0], [0.25, 0.0], [0.0, 90.0]),
+        )
+
+    def test_km(self):
+        np.testing.assert_allclose(
+            np.pi * 6371.0, great_circle_distance(0.0, 0.0, 180.0, 0.0, "km")
+        )
+
+    def test_unknown_units(self):
+        self.assertRaises(ValueError, great_circle_distance, 0, 0, 0, 0, "miles")
+
+
+class TestMatchStorms(TestCase):
+    """Test tempest_helper.trajectory_matching.match_storms()"""
+
+    def setUp(self):
+        self.time_axis = TimeAxis((2000, 1, 1, 0), "360_day")
+
+    def _storm(self, start, lons, lats):
+        storm = _make_storms(self.time_axis.calendar, [start], [len(lons)])[0]
+        storm["lon"] = list(lons)
+        storm["lat"] = list(lats)
+        return storm
+
+    def test_methods(self):
+        late = self._storm(1, [0.0, 1.0, 2.0], [0.0, 1.0, 2.0])
+        previous = [
+            self._storm(0, [-1.0, 0.0], [-1.0, 0.0]),
+            self._storm(1, [0.0, 1.0, 2.0, 3.0], [0.0, 1.0, 2.0, 3.0]),
+            self._storm(1, [0.0, 1.0, 2.0], [0.0, 1.0, 2.0]),
+        ]
+        for early, method, time_p in zip(
+            previous, ("extend", "extend_odd", "remove"), (1, 0, 0)
+        ):
+            with self.subTest(method=method):
+                matches = match_storms([early], [late])
+                self.assertEqual(1, len(matches))
+                self.assertIs(early, matches[0]["early"])
+                self.assertIs(late, matches[0]["late"])
+                self.assertEqual(method, matches[0]["method"])
+                self.assertEqual(time_p, matches[0]["time_p"])
+                self.assertEqual(time_p, matches[0]["offset"])
+
+    def test_optimal_assignment(self):
+        previous = [
+            self._storm(0, [0.0, 0.0], [0.0, 0.0]),
+            self._storm(0, [0.0, 0.0], [0.4, 0.4]),
+        ]
+        current = [
+            self._storm(1, [0.0], [0.1]),
+            self._storm(1, [0.0], [0.2]),
+        ]
+        matches = match_storms(previous, current)
+        self.assertEqual(
+            [(0, 0), (1, 1)],
+            [
+                (current.index(match["late"]), previous.index(match["early"]))
+                for match in matches
+            ],
+        )
+
+    def test_matches_pairwise_functions(self):
+        rng = np.random.default_rng(3)
+        previous = _make_storms(
+            self.time_axis.calendar, rng.integers(0, 100, 40), rng.integers(1, 20, 40)
+        )
+        for storm in previous:
+            steps = np.arange(len(storm["lat"]))
+            storm["lon"] = (rng.uniform(0, 360) + 0.3 * steps).tolist()
+            storm["lat"] = (rng.uniform(-60, 60) + 0.1 * steps).tolist()
+        current = []
+        for storm in previous[:30]:
+            start = int(rng.integers(0, len(storm["lat"])))
+            current.append(
+                {
+                    name: values[start:] if isinstance(values, list) else values
+                    for name, values in storm.items()
+                }
+            )
+        expected = []
+        for storm in current:
+            overlap = storm_overlap_in_space(
+                storm, storms_overlap_in_time(storm, previous)
+            )
+            if overlap:
+                expected.append(overlap)
+        actual = match_storms(TrajectorySet.from_storms(previous), current)
+        self.assertEqual(len(expected), len(actual))
+        for expected_match, actual_match in zip(expected, actual):
+            for name in ("time_c", "time_p", "offset", "method"):
+                self.assertEqual(expected_match[name], actual_match[name])
+            self.assertEqual(expected_match["early"], actual_match["early"])
+
+    def test_no_storms(self):
+        self.assertEqual([], match_storms([], [self._storm(0, [0.0], [0.0])]))
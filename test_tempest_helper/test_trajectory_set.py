@@ -0,0 +1,118 @@
+# (C) British Crown Copyright 2022, Met Office.
+# Please see LICENSE for license details.
+import io
+
+import numpy as np
+
+from tempest_helper import TrajectorySet
+from .utils import TempestHelperTestCase, make_loaded_trajectories
+
+
+class TestTrajectorySet(TempestHelperTestCase):
+    """Test tempest_helper.trajectory_set.TrajectorySet"""
+
+    def setUp(self):
+        self.storms = make_loaded_trajectories()
+        self.trajectory_set = TrajectorySet.from_storms(self.storms)
+
+    def test_index(self):
+        np.testing.assert_array_equal(self.trajectory_set.first_pt, [0, 2, 4])
+        np.testing.assert_array_equal(self.trajectory_set.num_pts, [2, 2, 3])
+        np.testing.assert_array_equal(self.trajectory_set.length, [2, 2, 2])
+        self.assertEqual(7, self.trajectory_set.n_points)
+
+    def test_column_types(self):
+        self.assertEqual(np.int32, self.trajectory_set.columns["grid_x"].dtype)
+        self.assertEqual(np.int32, self.trajectory_set.columns["step"].dtype)
+        self.assertEqual(np.float64, self.trajectory_set.columns["lat"].dtype)
+        self.assertEqual(np.float64, self.trajectory_set.columns["psl_min"].dtype)
+
+    def test_variables(self):
+        expected = ["psl_min", "sfcWind_max", "zg_avg_250", "orog_max"]
+        self.assertEqual(expected, self.trajectory_set.variables)
+
+    def test_round_trip(self):
+        self.assertEqual(3, len(self.trajectory_set))
+        for expected, actual in zip(self.storms, self.trajectory_set.to_storms()):
+            self.assertTempestDictEqual(expected, actual)
+
+    def test_getitem_negative(self):
+        self.assertTempestDictEqual(self.storms[-1], self.trajectory_set[-1])
+
+    def test_subset(self):
+        subset = self.trajectory_set[[2, 0]]
+        self.assertIsInstance(subset, TrajectorySet)
+        np.testing.assert_array_equal(subset.first_pt, [0, 3])
+        self.assertTempestDictEqual(self.storms[2], subset[0])
+        self.assertTempestDictEqual(self.storms[0], subset[1])
+
+    def test_subset_mask(self):
+        subset = self.trajectory_set[self.trajectory_set.first_values("lat") >= 0.0]
+        self.assertEqual(2, len(subset))
+        self.assertTempestDictEqual(self.storms[2], subset[1])
+
+    def test_concatenate(self):
+        joined = TrajectorySet.concatenate(
+            [self.trajectory_set[:1], self.trajectory_set[1:]]
+        )
+        np.testing.assert_array_equal(joined.first_pt, [0, 2, 4])
+        for expected, actual in zip(self.storms, joined):
+            self.assertTempestDictEqual(expected, actual)
+
+    def test_profile_column(self):
+        storms = self.storms[:2]
+        for storm in storms:
+            storm["rprof"] = [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]
+        trajectory_set = TrajectorySet.from_storms(storms)
+        self.assertEqual((4, 3), trajectory_set.columns["rprof"].shape)
+        self.assertEqual([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]], trajectory_set[1]["rprof"])
+
+    def test_profile_missing_masked(self):
+        storms = self.storms[:2]
+        for storm in storms:
+            storm["rprof"] = [[1.0, 2.0], [-99, -99]]
+        trajectory_set = TrajectorySet.from_storms(storms)
+        rprof = trajectory_set.columns["rprof"]
+        np.testing.assert_array_equal([False, True, False, True], rprof.mask[:, 0])
+        joined = TrajectorySet.concatenate([trajectory_set[1:], trajectory_set[:1]])
+        np.testing.assert_array_equal(
+            [False, True, False, True], joined.columns["rprof"].mask[:, 0]
+        )
+        self.assertEqual([[1.0, 2.0], [-99, -99]], joined[0]["rprof"])
+
+    def test_select_columns(self):
+        selected = self.trajectory_set.select_columns(["lat", "step"])
+        self.assertEqual(["lat", "step"], list(selected.columns))
+        np.testing.assert_array_equal(self.trajectory_set.length, selected.length)
+
+    def test_save_and_load(self):
+        storms = self.storms[:2]
+        for storm in storms:
+            storm["rprof"] = [[1.0, 2.0], [-99, -99]]
+        trajectory_set = TrajectorySet.from_storms(storms)
+        buffer = io.BytesIO()
+        trajectory_set.save(buffer)
+        buffer.seek(0)
+        loaded = TrajectorySet.load(buffer)
+        self.assertEqual(list(trajectory_set.columns), list(loaded.columns))
+        np.testing.assert_array_equal(
+            trajectory_set.columns["rprof"].mask, loaded.columns["rprof"].mask
+        )
+        self.assertEqual(trajectory_set.to_storms(), loaded.to_storms())
+
+    def test_empty(self):
+        trajectory_set = TrajectorySet.empty(["lat", "rprof"], {"rprof": 3})
+        self.assertEqual(0, len(trajectory_set))
+        self.assertEqual((0, 3), trajectory_set.columns["rprof"].shape)
+
+    def test_mismatched_column(self):
+        columns = self.trajectory_set.columns.copy()
+        columns["lat"] = columns["lat"][:-1]
+        self.assertRaisesRegex(
+            ValueError,
+            "Column lat has 6 points but 7 are expected",
+            TrajectorySet,
+            columns,
+            self.trajectory_set.first_pt,
+            self.trajectory_set.num_pts,
+        )
@@ -1,11 +1,17 @@
 # (C) British Crown Copyright 2021, Met Office.
 # Please see LICENSE for license details.
+from datetime import timedelta
 from math import isclose
+import os
 import re
+import shutil
 import subprocess
+import tempfile
 from typing import Any, ClassVar, Dict, List, Optional
 from unittest import TestCase
 
+import cftime
+
 # Earlier versions of netCDF4 (prior to 1.5.6 didn't include the tocdl() method
 import netCDF4
 
@@ -37,6 +43,8 @@ if not hasattr(netCDF4.Dataset, "tocdl"):
 else:
     from netCDF4 import Dataset  # noqa
 
+from tempest_helper import TimeAxis
+
 
 class TempestHelperTestCase(TestCase):
     """
@@ -228,6 +236,52 @@ class TempestHelperTestCase(TestCase):
                 self.fail(f"{key} no test for type {type(expected[key]).__name__}")
 
 
+class TrackFileTestCase(TempestHelperTestCase):
+    """
+    A subclass of :py:obj:`TempestHelperTestCase` that writes the example track
+    file from `make_track_file_lines()` to `self.track_file` in a temporary
+    directory, `self.runtime_dir`, which is removed after each test. The lines
+    of the file are in `self.lines` and its column names and time axis are in
+    `self.column_names` and `self.time_axis`.
+    """
+
+    def setUp(self):
+        # See an unlimited diff in case of error
+        self.maxDiff = None
+        self.runtime_dir = tempfile.mkdtemp()
+        self.track_file = os.path.join(self.runtime_dir, "tracks.txt")
+        self.lines = make_track_file_lines()
+        with open(self.track_file, "w") as fh:
+            fh.writelines(self.lines)
+        self.column_names = make_column_names()
+        self.time_axis = TimeAxis((2014, 12, 21, 0), "standard", 11)
+
+    def tearDown(self):
+        if os.path.isdir(self.runtime_dir):
+            shutil.rmtree(self.runtime_dir, ignore_errors=True)
+
+
+def make_track_file_lines():
+    """
+    Make the lines of an example TempestExtremes track file, which contains the
+    trajectories returned by `make_loaded_trajectories()` and has the columns
+    returned by `make_column_names()`.
+
+    :returns: The lines of the track file.
+    :rtype: list
+    """
+    track_file_contents = """start   2  2014    12   21   0
+    67  85  1.0  10.0   9.997331e+04    1.206617e+01    5.092293e+03    0.000000e+00    2014   12  21   0
+    68  86  2.0  11.0   9.978512e+04    1.079898e+01    5.112520e+03    0.000000e+00    2014   12  21   6
+start   2  2014    12   21   0
+    67  85  1.0  -1.0   9.997331e+04    1.206617e+01    5.092293e+03    0.000000e+00    2014   12  21   0
+    68  86  2.0  0.0   9.978512e+04    1.079898e+01    5.112520e+03    0.000000e+00    2014   12  21   6
+start   2  2014    12   21   0
+    67  85  1.0  0.0   9.997331e+04    1.206617e+01    5.092293e+03    0.000000e+00    2014   12  21   0
+    68  86  2.0  1.0   9.978512e+04    1.079898e+01    5.112520e+03    0.000000e+00    2014   12  21   12"""  # noqa: E501
+    return [line.strip() + "\n" for line in track_file_contents.split("\n")]
+
+
 def make_loaded_trajectories():
     """
     Make an example structure of trajectories as returned by
@@ -291,6 +345,45 @@ def make_loaded_trajectories():
     return storms
 
 
+def make_storm(start, length, calendar="standard", missing=(), **columns):
+    """
+    Make a storm dictionary with a point every six hours, starting `start`
+    six hourly steps after 00:00 on 1 January 2000. The grid indices,
+    longitude and latitude increase by one at each step unless other values
+    are given.
+
+    :param int start: The number of six hourly steps before the first point.
+    :param int length: The number of points.
+    :param str calendar: The calendar of the dates.
+    :param list missing: The positions of points to leave out of the storm,
+        leaving gaps in it.
+    :param columns: The values of other columns, or to replace the default
+        grid indices and positions, each as a list with a value for every
+        point.
+    :returns: The storm.
+    :rtype: dict
+    """
+    steps = list(range(start, start + length))
+    origin = cftime.datetime(2000, 1, 1, calendar=calendar)
+    dates = [origin + timedelta(hours=6 * step) for step in steps]
+    storm = {
+        "step": [step + 1 for step in steps],
+        "grid_x": [10 + step for step in steps],
+        "grid_y": [20 + step for step in steps],
+        "lon": [10.25 + step for step in steps],
+        "lat": [-20.125 + step for step in steps],
+        "year": [date.year for date in dates],
+        "month": [date.month for date in dates],
+        "day": [date.day for date in dates],
+        "hour": [date.hour for date in dates],
+    }
+    storm.update(columns)
+    kept = [index for index in range(length) if index not in missing]
+    storm = {name: [values[index] for index in kept] for name, values in storm.items()}
+    storm["length"] = len(kept)
+    return storm
+
+
 def make_column_names():
     """
     Make an example column names dictionary for